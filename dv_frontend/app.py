@@ -1,6 +1,34 @@
+import time
+
+_t0 = time.perf_counter()
+
 import streamlit as st
 from routes.index import get_nav 
+from utils.column_access import enable_copy_on_write
+from utils.lazy_imports import record_timing
+from utils.memory_budget import render_memory_panel
+from utils.perf import HISTORY_KEY, begin_run, end_run, render_perf_panel
+
+record_timing("app: imports", time.perf_counter() - _t0)
 
+# Pages share column views of the session frame instead of copying them
+enable_copy_on_write()
+
+_t1 = time.perf_counter()
 pg = get_nav()
+record_timing("app: get_nav", time.perf_counter() - _t1)
+
+# Time every rerun of the page; st.stop()/st.rerun() end the run with their exception name
+history = st.session_state.setdefault(HISTORY_KEY, [])
+run = begin_run(pg.title)
+outcome = "ok"
+try:
+    pg.run()
+except BaseException as e:
+    outcome = type(e).__name__
+    raise
+finally:
+    end_run(run, outcome, history)
 
-pg.run()
\ No newline at end of file
+render_perf_panel(history)
+render_memory_panel(st.session_state)
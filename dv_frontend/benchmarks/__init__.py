@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Headless benchmarks for the compute paths behind each page (see run.py).
@@ -0,0 +1,68 @@
+# benchmarks/generators.py
+from __future__ import annotations
+
+import io
+
+import numpy as np
+import pandas as pd
+
+# Synthetic datasets for the benchmarks.
+#
+# Columns cycle through the kinds the pages care about (numeric, categorical,
+# datetime); `datetime_share` sets the fraction of datetime columns, and the
+# remaining columns alternate numeric / categorical. The first three columns are
+# always "date", "category" and "value" so every benchmark has an X, a group and
+# a Y to work with.
+
+
+def synthetic_frame(
+    rows: int = 100_000,
+    cols: int = 10,
+    *,
+    cardinality: int = 50,
+    null_rate: float = 0.05,
+    datetime_share: float = 0.2,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """A reproducible mixed-type frame of `rows` x max(cols, 3)."""
+    rng = np.random.default_rng(seed)
+    cols = max(int(cols), 3)
+    n_dt = max(1, int(round(cols * datetime_share)))
+
+    def numeric() -> np.ndarray:
+        return rng.normal(100.0, 25.0, rows)
+
+    def categorical() -> np.ndarray:
+        labels = np.array([f"c{i:04d}" for i in range(max(int(cardinality), 1))], dtype=object)
+        # skewed (Zipf-like) frequencies, like real categories
+        p = 1.0 / np.arange(1, len(labels) + 1)
+        return labels[rng.choice(len(labels), rows, p=p / p.sum())]
+
+    def datetimes() -> pd.DatetimeIndex:
+        start = pd.Timestamp("2020-01-01")
+        return start + pd.to_timedelta(rng.integers(0, 3 * 365 * 24 * 60, rows), unit="min")
+
+    data: dict[str, object] = {"date": datetimes(), "category": categorical(), "value": numeric()}
+    kinds = ["datetime"] * (n_dt - 1) + ["numeric", "categorical"] * cols
+    for i, kind in enumerate(kinds[: cols - 3]):
+        name = f"{kind[:3]}_{i}"
+        data[name] = {"datetime": datetimes, "numeric": numeric, "categorical": categorical}[kind]()
+    df = pd.DataFrame(data)
+
+    if null_rate > 0:
+        for c in df.columns:
+            if c == "date":
+                continue  # keep the main X complete, like a typical time-series extract
+            mask = rng.random(rows) < null_rate
+            df[c] = df[c].mask(mask)
+    return df
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def to_excel_bytes(df: pd.DataFrame) -> bytes:
+    bio = io.BytesIO()
+    df.to_excel(bio, index=False)
+    return bio.getvalue()
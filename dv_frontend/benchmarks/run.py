@@ -0,0 +1,269 @@
+# benchmarks/run.py
+"""
+Headless benchmarks for each page's compute path.
+
+    cd dv_frontend
+    python -m benchmarks.run --rows 200000 --cols 12 --repeat 3
+    python -m benchmarks.run --only bar_aggregate,line_pipeline --engine polars
+    python -m benchmarks.run --compare benchmarks/results/A.json benchmarks/results/B.json
+
+Each case runs `--repeat` timed iterations (on a fresh shallow copy of the
+dataset, so per-dataset caches start cold) plus one tracemalloc iteration for
+the peak memory (Python/NumPy allocations only: tracemalloc does not see
+Polars or DuckDB native memory). Results go to
+benchmarks/results/<timestamp>-<commit>.json.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generators import synthetic_frame, to_csv_bytes, to_excel_bytes  # noqa: E402
+from utils import compute_engine as engine_mod  # noqa: E402
+from utils.compute_engine import compute_engine  # noqa: E402
+from utils.ingest import infer_datetime_columns, read_dataset_bytes  # noqa: E402
+from utils.lazy_imports import is_installed  # noqa: E402
+from utils.line_prep import prepare_line_data  # noqa: E402
+from utils.report import DEFAULT_SECTIONS, create_pdf_report  # noqa: E402
+from utils.scatter_prep import prepare_scatter_data  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+REGRESSION_THRESHOLD = 1.10  # flag cases >10% slower in --compare
+
+
+# -------- cases --------
+# Each case factory gets the dataset and returns a zero-argument callable.
+# `fresh(df)` gives an identical frame with cold per-dataset caches.
+def fresh(df: pd.DataFrame) -> pd.DataFrame:
+    return df.copy(deep=False)
+
+
+def case_ingest_csv(df, args):
+    data = to_csv_bytes(df)
+
+    def run():
+        out = read_dataset_bytes(data, is_csv=True)
+        infer_datetime_columns(out)
+        return len(data)
+    return run
+
+
+def case_ingest_csv_pyarrow(df, args):
+    if not is_installed("pyarrow"):
+        return None
+    data = to_csv_bytes(df)
+
+    def run():
+        out = read_dataset_bytes(data, is_csv=True, engine="pyarrow")
+        infer_datetime_columns(out)
+        return len(data)
+    return run
+
+
+def case_ingest_csv_usecols(df, args):
+    # the two-phase ingest's full parse: half the columns (the text ones first)
+    data = to_csv_bytes(df)
+    text = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]
+    keep = [c for c in df.columns if c not in text[: max(1, df.shape[1] // 2)]]
+
+    def run():
+        out = read_dataset_bytes(data, is_csv=True, usecols=keep)
+        infer_datetime_columns(out)
+        return len(data)
+    return run
+
+
+def case_ingest_excel(df, args):
+    if not is_installed("openpyxl"):
+        return None
+    data = to_excel_bytes(df.head(args.excel_rows))
+
+    def run():
+        out = read_dataset_bytes(data, is_csv=False)
+        infer_datetime_columns(out)
+        return len(data)
+    return run
+
+
+def case_profile(df, args):
+    def run():
+        d, engine = fresh(df), compute_engine()
+        num = d.select_dtypes("number").columns.tolist()
+        engine.null_counts(d)
+        engine.nunique(d)
+        engine.duplicated_count(d)
+        engine.describe_numeric(d, num)
+    return run
+
+
+def case_pdf_report(df, args):
+    return lambda: len(create_pdf_report(fresh(df), DEFAULT_SECTIONS))
+
+
+def case_bar_aggregate(df, args):
+    def run():
+        d, engine = fresh(df), compute_engine()
+        for agg in ("count", "sum", "mean", "median", "nunique(y)"):
+            engine.aggregate_for_bar(d, "category", "value", agg, True)
+    return run
+
+
+def case_line_pipeline(df, args):
+    return lambda: len(prepare_line_data(
+        fresh(df), "date", ["value"], group_col="category", is_time=True, freq="D", agg="sum",
+        missing="ffill", rolling=7, normalize=True, top_n_groups=10,
+    ))
+
+
+def case_scatter_prep(df, args):
+    def run():
+        d = fresh(df)
+        prepare_scatter_data(d, "value", "value", sample_n=5000, jitter=True)
+        prepare_scatter_data(d, "value", "value", facet_col="category", facet_budget=1000)
+        prepare_scatter_data(d, "value", "value", facet_col="category", facet_agg=True, facet_bins=30)
+    return run
+
+
+def case_altair_to_png(df, args):
+    if not (is_installed("altair") and is_installed("vl_convert")):
+        return None
+    import altair as alt
+    from utils.image_export import altair_to_png
+
+    grouped = compute_engine().aggregate_for_bar(df, "category", "value", "sum", True)
+    chart = alt.Chart(grouped).mark_bar().encode(x="category:N", y="value:Q").properties(width=800, height=400)
+    return lambda: len(altair_to_png(chart, scale=2.0))
+
+
+CASES: dict[str, Callable] = {
+    "ingest_csv": case_ingest_csv,
+    "ingest_csv_pyarrow": case_ingest_csv_pyarrow,
+    "ingest_csv_usecols": case_ingest_csv_usecols,
+    "ingest_excel": case_ingest_excel,
+    "profile": case_profile,
+    "pdf_report": case_pdf_report,
+    "bar_aggregate": case_bar_aggregate,
+    "line_pipeline": case_line_pipeline,
+    "scatter_prep": case_scatter_prep,
+    "altair_to_png": case_altair_to_png,
+}
+
+
+# -------- measurement --------
+def measure(fn: Callable[[], object], repeat: int) -> dict:
+    fn()  # warm-up (imports, first-call setup)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times.sort()
+    return {"min_s": round(times[0], 5), "median_s": round(times[len(times) // 2], 5),
+            "peak_mb": round(peak / 1024 ** 2, 2)}
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def run_suite(args) -> dict:
+    if args.engine:
+        os.environ[engine_mod.ENGINE_ENV] = args.engine
+        engine_mod._engine = None  # re-read the configuration
+    df = synthetic_frame(args.rows, args.cols, cardinality=args.cardinality, null_rate=args.null_rate,
+                         datetime_share=args.datetime_share, seed=args.seed)
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(CASES)
+    results = {}
+    for name in names:
+        fn = CASES[name](df, args)
+        if fn is None:
+            print(f"{name:<16} skipped (dependency not installed)")
+            continue
+        r = measure(fn, args.repeat)
+        results[name] = r
+        print(f"{name:<16} min {r['min_s']:>9.4f}s  median {r['median_s']:>9.4f}s  peak {r['peak_mb']:>9.2f} MB")
+    return {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "engine": compute_engine().name,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "params": {k: getattr(args, k) for k in ("rows", "cols", "cardinality", "null_rate", "datetime_share", "seed", "repeat")},
+        "results": results,
+    }
+
+
+def compare(path_a: str, path_b: str) -> int:
+    """Print B relative to A; returns 1 if any case regressed beyond the threshold."""
+    with open(path_a) as fa, open(path_b) as fb:
+        a, b = json.load(fa), json.load(fb)
+    if a["params"] != b["params"]:
+        print("warning: runs used different parameters")
+    if a["engine"] != b["engine"]:
+        print(f"note: comparing engines {a['engine']} -> {b['engine']}")
+    print(f"{'case':<16} {a['commit']:>10} {b['commit']:>10}  ratio")
+    regressed = False
+    for name in sorted(set(a["results"]) & set(b["results"])):
+        ta, tb = a["results"][name]["median_s"], b["results"][name]["median_s"]
+        ratio = tb / ta if ta else float("inf")
+        flag = "  REGRESSION" if ratio > REGRESSION_THRESHOLD else ""
+        regressed |= bool(flag)
+        print(f"{name:<16} {ta:>9.4f}s {tb:>9.4f}s  {ratio:5.2f}x{flag}")
+    return 1 if regressed else 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark the page compute paths on synthetic data.")
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--cols", type=int, default=10)
+    p.add_argument("--cardinality", type=int, default=50, help="distinct values per categorical column")
+    p.add_argument("--null-rate", type=float, default=0.05)
+    p.add_argument("--datetime-share", type=float, default=0.2, help="fraction of datetime columns")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--excel-rows", type=int, default=20_000, help="row cap for the Excel ingest case")
+    p.add_argument("--engine", choices=sorted(engine_mod._ENGINES), help="compute engine (default: DV_COMPUTE_ENGINE)")
+    p.add_argument("--only", help="comma-separated cases: " + ", ".join(CASES))
+    p.add_argument("--out", default=RESULTS_DIR, help="results directory ('' = don't save)")
+    p.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files and exit")
+    args = p.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    report = run_suite(args)
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(args.out, f"{stamp}-{report['commit']}.json")
+        with open(path, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"saved {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+# dv_core/__init__.py
+# Headless compute used by the Streamlit pages, importable without a session:
+# dataset parsing, chart data and chart builders, the profile PDF report and
+# PNG export. `python -m dv_core` (see dv_core.batch) renders them for many datasets at once.
+#
+#     import sys; sys.path.insert(0, "dv_frontend")
+#     from dv_core import read_dataset, aggregate_for_bar, build_altair_bar, altair_to_png
+
+from dv_core.charts import (
+    aggregate_for_bar,
+    bar_defaults,
+    build_altair_bar,
+    build_histogram,
+    build_line_chart,
+    build_timeline_chart,
+    build_value_counts_chart,
+    histogram_bins,
+    top_bars,
+    value_counts_frame,
+)
+from dv_core.batch import load_config, prepare_dataset, read_dataset, run_batch
+from utils.image_export import altair_to_png, png_spec, submit_png
+from utils.ingest import infer_datetime_columns, read_dataset_bytes
+from utils.line_prep import prepare_line_data, resample_if_needed
+from utils.render_pool import render_pool
+from utils.report import DEFAULT_SECTIONS, create_pdf_report
+from utils.scatter_prep import prepare_scatter_data
+
+__all__ = [
+    "DEFAULT_SECTIONS",
+    "aggregate_for_bar",
+    "altair_to_png",
+    "bar_defaults",
+    "build_altair_bar",
+    "build_histogram",
+    "build_line_chart",
+    "build_timeline_chart",
+    "build_value_counts_chart",
+    "create_pdf_report",
+    "histogram_bins",
+    "infer_datetime_columns",
+    "load_config",
+    "png_spec",
+    "prepare_dataset",
+    "prepare_line_data",
+    "prepare_scatter_data",
+    "read_dataset",
+    "read_dataset_bytes",
+    "render_pool",
+    "resample_if_needed",
+    "run_batch",
+    "submit_png",
+    "top_bars",
+    "value_counts_frame",
+]
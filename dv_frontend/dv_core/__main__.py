@@ -0,0 +1,56 @@
+# dv_core/__main__.py
+"""Command-line entry point: `python -m dv_core --config CONFIG [--out DIR] DATASET ...` (see dv_core.batch)."""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+from dv_core import batch
+from utils.compute_engine import ENGINE_ENV
+from utils.render_pool import WORKERS_ENV, render_pool_metrics
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m dv_core", description=batch.__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("datasets", nargs="+", help="CSV/Excel files or directories")
+    ap.add_argument("--config", required=True, help="YAML or JSON chart/report config")
+    ap.add_argument("--out", default="reports", help="output directory")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    ap.add_argument("--render-workers", type=int, default=None,
+                    help=f"PNG renderer processes (sets {WORKERS_ENV}; default: up to 4, one per core)")
+    ap.add_argument("--engine", choices=["pandas", "polars"], help=f"compute engine (sets {ENGINE_ENV})")
+    args = ap.parse_args(argv)
+
+    if args.engine:
+        os.environ[ENGINE_ENV] = args.engine  # inherited by the workers
+    if args.render_workers is not None:
+        os.environ[WORKERS_ENV] = str(args.render_workers)
+    config = batch.load_config(args.config)
+    paths = batch.expand_paths(args.datasets)
+    if not paths:
+        ap.error("no datasets found")
+    try:
+        batch.output_names(paths)
+    except ValueError as e:
+        ap.error(str(e))
+
+    def report(res):
+        status = "FAILED" if res["error"] else "ok"
+        detail = res["error"] or f"{len(res['outputs'])} files"
+        print(f"{status:6} {res['dataset']}  ({detail}, {res['seconds']:.2f} s)", flush=True)
+
+    t0 = time.perf_counter()
+    results = batch.run_batch(paths, config, args.out, workers=args.workers, on_result=report)
+    failed = sum(1 for r in results if r["error"])
+    print(f"{len(results) - failed}/{len(results)} datasets in {time.perf_counter() - t0:.1f} s -> {args.out}")
+    metrics = render_pool_metrics()
+    if metrics:
+        print("renderer: " + ", ".join(f"{k}={v}" for k, v in metrics.items()))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
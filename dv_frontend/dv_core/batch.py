@@ -0,0 +1,286 @@
+# dv_core/batch.py
+"""
+Batch PDF reports and chart PNGs for many datasets, without Streamlit.
+
+    cd dv_frontend
+    python -m dv_core --config nightly.yaml --out reports/ extracts/*.csv
+    python -m dv_core --config nightly.json --out reports/ extracts/ --workers 8
+
+Datasets are CSV or Excel files (directories are expanded to the files they
+contain). Each dataset is read, profiled and charted in a worker process; the
+chart PNGs are rendered on the shared renderer pool (utils.render_pool,
+DV_RENDER_WORKERS processes). Outputs are written to <out>/<dataset name>/:
+report.pdf and one <chart name>.png per configured chart. The dataset name is the
+file stem; datasets sharing a stem (a/data.csv and b/data.csv, data.csv and
+data.xlsx) get their path relative to a common root instead (a/data, data.xlsx).
+A failing dataset is reported and does not stop the others;
+the exit status is 1 if any dataset failed.
+
+The config is YAML (needs PyYAML) or JSON:
+
+    report:                    # omit to skip the PDF
+      title: Nightly profile
+      sections: {correlations: false}   # overrides of utils.report.DEFAULT_SECTIONS
+    png: {scale: 2.0}
+    charts:
+      - kind: bar              # options as on the Bar Chart page (dv_core.charts.bar_defaults)
+        x_col: region
+        y_col: revenue
+        agg: mean
+      - kind: line             # options of utils.line_prep.prepare_line_data and build_line_chart
+        x_col: date
+        y_cols: [revenue]
+        freq: M
+      - kind: distribution     # value counts or histogram, chosen like the Distribution page
+        column: revenue
+        name: revenue-hist     # file name (default: <index>-<kind>)
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed, wait
+from typing import Any
+
+import pandas as pd
+
+from dv_core.charts import (
+    aggregate_for_bar, bar_defaults, bar_value_label, build_altair_bar, build_histogram, build_line_chart,
+    build_value_counts_chart, default_bins, histogram_bins, is_categorical, top_bars, value_counts_frame,
+)
+from utils.image_export import png_spec
+from utils.ingest import infer_datetime_columns, read_dataset_bytes
+from utils.lazy_imports import lazy_import
+from utils.line_prep import NO_RESAMPLE, prepare_line_data
+from utils.render_pool import render_pool
+from utils.report import DEFAULT_SECTIONS, create_pdf_report
+from utils.sampling import sample_positions
+
+yaml = lazy_import("yaml")
+
+DATASET_EXTENSIONS = (".csv", ".xlsx", ".xls")
+# Histogram density/rug layers are computed by the renderer from at most this many values
+LAYER_SAMPLE_ROWS = 5000
+
+
+# -------- config --------
+def load_config(path: str) -> dict[str, Any]:
+    """Read a YAML (.yaml/.yml) or JSON batch config."""
+    with open(path, encoding="utf-8") as fh:
+        text = fh.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise RuntimeError("PyYAML is not installed. Run: pip install pyyaml (or use a JSON config)")
+        config = yaml.safe_load(text) or {}
+    else:
+        config = json.loads(text)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: expected a mapping at the top level")
+    for i, spec in enumerate(config.get("charts") or []):
+        if spec.get("kind") not in CHART_BUILDERS:
+            raise ValueError(f"{path}: chart {i + 1} has unknown kind {spec.get('kind')!r}; "
+                             f"expected one of {sorted(CHART_BUILDERS)}")
+    return config
+
+
+def read_dataset(path: str) -> pd.DataFrame:
+    """Parse a CSV/Excel file the way the upload page does (incl. datetime inference)."""
+    with open(path, "rb") as fh:
+        df = read_dataset_bytes(fh.read(), is_csv=path.lower().endswith(".csv"))
+    infer_datetime_columns(df)
+    return df
+
+
+def expand_paths(paths: list[str]) -> list[str]:
+    """Dataset files from files and directories (directory entries sorted by name)."""
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out += [os.path.join(p, f) for f in sorted(os.listdir(p)) if f.lower().endswith(DATASET_EXTENSIONS)]
+        else:
+            out.append(p)
+    return out
+
+
+def output_names(paths: list[str]) -> list[str]:
+    """
+    Output folder name per dataset: the file stem, or for datasets sharing a
+    stem their path relative to the common root of those datasets (keeping the
+    extension if that still collides).
+    """
+    def stem(p: str) -> str:
+        return os.path.splitext(os.path.basename(p))[0]
+
+    full = [os.path.abspath(p) for p in paths]
+    dup = [p for p in dict.fromkeys(full) if full.count(p) > 1]
+    if dup:
+        raise ValueError(f"dataset given more than once: {dup[0]}")
+    names = [stem(p) for p in full]
+    for s in {n for n in names if names.count(n) > 1}:
+        clash = [i for i, n in enumerate(names) if n == s]
+        root = os.path.commonpath([os.path.dirname(full[i]) for i in clash])
+        rel = {i: os.path.relpath(full[i], root) for i in clash}
+        bare = [os.path.splitext(r)[0] for r in rel.values()]
+        for i in clash:
+            without_ext = os.path.splitext(rel[i])[0]
+            names[i] = without_ext if bare.count(without_ext) == 1 else rel[i]
+    clash = [n for n in dict.fromkeys(names) if names.count(n) > 1]
+    if clash:
+        raise ValueError(f"datasets map to the same output folder: {clash[0]}")
+    return names
+
+
+# -------- charts --------
+def bar_chart(df: pd.DataFrame, spec: dict):
+    cfg = {**bar_defaults(None, None), **spec}
+    grouped = aggregate_for_bar(df, cfg["x_col"], None if cfg["agg"] == "count" else cfg["y_col"],
+                                cfg["agg"], cfg["remove_nulls"])
+    grouped = top_bars(grouped, cfg["x_col"], sort_by=cfg["sort_by"], ascending=cfg["ascending"], top_n=cfg["top_n"])
+    y_label_default = bar_value_label(cfg["agg"], cfg["y_col"])
+    return build_altair_bar(
+        grouped,
+        x_col=cfg["x_col"],
+        y_label=cfg["y_label"] or y_label_default,
+        title=cfg["title"] or f"{y_label_default} by {cfg['x_col']} (Top {cfg['top_n']})",
+        orientation=cfg["orientation"],
+        show_labels=cfg["show_labels"],
+        x_label_angle=int(cfg["x_label_angle"]),
+        log_scale=bool(cfg["log_scale"]),
+        color_mode=cfg["color_mode"],
+        single_color=cfg["single_color"],
+        palette=cfg["palette"],
+        reverse_palette=bool(cfg["reverse_palette"]),
+        show_legend=bool(cfg["show_legend"]),
+    )
+
+
+def line_chart(df: pd.DataFrame, spec: dict):
+    spec = dict(spec)
+    x_col = spec.pop("x_col")
+    y_cols = list(spec.pop("y_cols"))
+    is_time = spec.pop("is_time", pd.api.types.is_datetime64_any_dtype(df[x_col]))
+    prep = {k: spec.pop(k) for k in ("group_col", "freq", "agg", "missing", "rolling", "normalize", "top_n_groups")
+            if k in spec}
+    prep.setdefault("freq", NO_RESAMPLE)
+    work = prepare_line_data(df, x_col, y_cols, is_time=is_time, **prep)
+    chart, _ = build_line_chart(work, x_col, y_cols, group_col=prep.get("group_col"), is_time=is_time,
+                                x_numeric=pd.api.types.is_numeric_dtype(df[x_col]), **spec)
+    return chart
+
+
+def distribution_chart(df: pd.DataFrame, spec: dict):
+    spec = dict(spec)
+    col = spec.pop("column")
+    x = df[col].dropna() if spec.pop("drop_na", True) else df[col]
+    if is_categorical(df[col], int(spec.pop("low_card_threshold", 30))):
+        counts = value_counts_frame(x, col)
+        counts = counts.sort_values("count", ascending=False).head(int(spec.pop("top_n", 20)))
+        return build_value_counts_chart(counts, col, **spec)
+    spec.setdefault("bins", default_bins(x.nunique(dropna=True)))
+    if pd.api.types.is_numeric_dtype(x):
+        # Bin here so the spec carries the bins, not every value; density/rug use a sample
+        spec["binned"] = histogram_bins(x, spec["bins"])
+        if len(x) > LAYER_SAMPLE_ROWS:
+            spec["layer_data"] = df.iloc[sample_positions(df, LAYER_SAMPLE_ROWS, valid=[col])][[col]]
+    return build_histogram(x, col, **spec)
+
+
+CHART_BUILDERS = {"bar": bar_chart, "line": line_chart, "distribution": distribution_chart}
+
+
+# -------- jobs --------
+def prepare_dataset(path: str, config: dict, out_dir: str, name: str | None = None) -> dict[str, Any]:
+    """
+    Write the report of one dataset to <out_dir>/<name> (default: the file
+    stem, see output_names) and build its chart specs (runs in a dataset
+    worker). Returns the job result; "charts" holds (png path, Vega-Lite spec)
+    pairs for the renderer pool.
+    """
+    t0 = time.perf_counter()
+    result: dict[str, Any] = {"dataset": path, "outputs": [], "charts": [], "error": None}
+    step = "read"
+    try:
+        df = read_dataset(path)
+        target = os.path.join(out_dir, name or output_names([path])[0])
+        os.makedirs(target, exist_ok=True)
+
+        report = config.get("report")
+        if report is not None:
+            step = "report"
+            sections = {**DEFAULT_SECTIONS, **(report.get("sections") or {})}
+            pdf = create_pdf_report(df, sections, report.get("title") or "Dataset Profile Report")
+            result["outputs"].append(_write(os.path.join(target, "report.pdf"), pdf))
+
+        png = {k: v for k, v in (config.get("png") or {}).items() if k != "scale"}
+        for i, spec in enumerate(config.get("charts") or [], start=1):
+            spec = dict(spec)
+            kind = spec.pop("kind")
+            name = spec.pop("name", None) or f"{i:02d}-{kind}"
+            step = f"chart {name}"
+            chart = CHART_BUILDERS[kind](df, spec)
+            result["charts"].append((os.path.join(target, f"{name}.png"), png_spec(chart, **png)))
+    except Exception as e:
+        result["error"] = f"{step}: {type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - t0, 3)
+    return result
+
+
+def _write(path: str, data: bytes) -> str:
+    with open(path, "wb") as fh:
+        fh.write(data)
+    return path
+
+
+def _render_charts(res: dict, scale: float, on_result) -> Future:
+    """Submit the chart specs of a prepared dataset to the renderer pool; resolves when all PNGs are written."""
+    charts = res.pop("charts")
+    complete: Future = Future()
+    lock = threading.Lock()
+    remaining = len(charts)
+
+    def finish():
+        if on_result is not None:
+            on_result(res)
+        complete.set_result(res)
+
+    def written(fut: Future, path: str):
+        nonlocal remaining
+        try:
+            _write(path, fut.result())
+            error = None
+        except Exception as e:
+            error = f"png {os.path.basename(path)}: {type(e).__name__}: {e}"
+        with lock:
+            if error is None:
+                res["outputs"].append(path)
+            elif res["error"] is None:
+                res["error"] = error
+            remaining -= 1
+            last = remaining == 0
+        if last:
+            finish()
+
+    if not charts:
+        finish()
+    for path, spec in charts:
+        render_pool().submit(spec, scale=scale).add_done_callback(lambda f, path=path: written(f, path))
+    return complete
+
+
+def run_batch(paths: list[str], config: dict, out_dir: str, *, workers: int | None = None, on_result=None) -> list[dict]:
+    """
+    Process `paths` on a pool of `workers` dataset processes (default: one per
+    core); their charts are rendered on the shared renderer pool as soon as a
+    dataset's specs are ready. Results are returned in input order.
+    """
+    scale = float((config.get("png") or {}).get("scale", 2.0))
+    names = output_names(paths)
+    rendered = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(prepare_dataset, p, config, out_dir, n) for p, n in zip(paths, names)]
+        for fut in as_completed(futures):
+            rendered.append(_render_charts(fut.result(), scale, on_result))
+    wait(rendered)
+    return [fut.result() for fut in futures]  # in input order
@@ -0,0 +1,411 @@
+# dv_core/charts.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from utils.incremental import cached_bar_aggregate
+from utils.lazy_imports import lazy_import
+from utils.perf import timer
+
+alt = lazy_import("altair")  # imported on first use; None if not installed
+
+# Chart data and Altair chart builders shared by the visualization pages and batch
+# jobs. Builders only return charts; pages render them with `render_altair_chart`.
+
+
+# -------------------- Bar --------------------
+def bar_defaults(x_col: str | None, y_col: str | None) -> dict:
+    """A bar chart config with the default aggregation and appearance."""
+    return {
+        "x_col": x_col,
+        "y_col": y_col,
+        "agg": "sum",
+        "sort_by": "value",
+        "ascending": False,
+        "top_n": 20,
+        "remove_nulls": True,
+        "title": "",
+        "x_label": "",
+        "y_label": "",
+        "orientation": "Vertical",   # or "Horizontal"
+        "show_labels": False,
+        "x_label_angle": 0,
+        "log_scale": False,
+        # --- new color controls defaults ---
+        "color_mode": "Single",         # "Single", "By X category", "By value"
+        "single_color": "#4C78A8",      # matches Altair default blue
+        "palette": "tableau10",         # discrete default
+        "reverse_palette": False,
+        "show_legend": True,
+    }
+
+
+def aggregate_for_bar(data: pd.DataFrame, x_col: str, y_col: str | None, agg: str, remove_nulls: bool) -> pd.DataFrame:
+    """
+    `agg` of `y_col` per `x_col` value on the compute engine (columns: x_col, value).
+    Cached per dataset, and merged rather than recomputed when rows are appended.
+    """
+    with timer("aggregate_for_bar", rows=len(data)):
+        return cached_bar_aggregate(data, x_col, y_col, agg, remove_nulls)
+
+
+def top_bars(grouped: pd.DataFrame, x_col: str, *, sort_by: str = "value", ascending: bool = False,
+             top_n: int = 20) -> pd.DataFrame:
+    """Sort by value (or by X, as text) and keep the first `top_n` bars."""
+    if sort_by == "value":
+        grouped = grouped.sort_values("value", ascending=bool(ascending))
+    else:
+        grouped = grouped.sort_values(x_col, ascending=bool(ascending), key=lambda s: s.astype(str))
+    return grouped.head(int(top_n))
+
+
+def bar_value_label(agg: str, y_col: str | None) -> str:
+    if agg == "count":
+        return "count"
+    if agg == "nunique(y)":
+        return "nunique"
+    return f"{agg}({y_col})"
+
+
+# NEW: color-aware bar builder
+def build_altair_bar(
+    grouped: pd.DataFrame,
+    x_col: str,
+    y_label: str,
+    title: str,
+    orientation: str,
+    show_labels: bool,
+    x_label_angle: int,
+    log_scale: bool,
+    # --- color controls ---
+    color_mode: str,            # "Single", "By X category", "By value"
+    single_color: str | None,   # hex string like "#4C78A8"
+    palette: str | None,        # e.g., "tableau10", "viridis"
+    reverse_palette: bool,
+    show_legend: bool,
+):
+    # orientation encodings
+    if orientation == "Vertical":
+        x_enc = alt.X(f"{x_col}:N", title=x_col, axis=alt.Axis(labelAngle=x_label_angle))
+        y_enc = alt.Y("value:Q", title=y_label, scale=alt.Scale(type="log") if log_scale else alt.Scale())
+    else:
+        x_enc = alt.X("value:Q", title=y_label, scale=alt.Scale(type="log") if log_scale else alt.Scale())
+        y_enc = alt.Y(f"{x_col}:N", title=x_col)
+
+    # base encodings
+    base = alt.Chart(grouped).encode(
+        x=x_enc,
+        y=y_enc,
+        tooltip=[alt.Tooltip(f"{x_col}:N", title=x_col), alt.Tooltip("value:Q", title=y_label)],
+    )
+
+    # color encodings
+    if color_mode == "Single":
+        # apply a single bar color via mark_bar(color=...)
+        bars = base.mark_bar(color=single_color or "#4C78A8")
+    elif color_mode == "By X category":
+        # color by the category on x-axis (nominal)
+        c = alt.Color(
+            f"{x_col}:N",
+            legend=alt.Legend() if show_legend else None,
+            scale=alt.Scale(scheme=palette or "tableau10", reverse=reverse_palette),
+        )
+        bars = base.mark_bar().encode(color=c)
+    else:  # "By value"
+        c = alt.Color(
+            "value:Q",
+            legend=alt.Legend() if show_legend else None,
+            scale=alt.Scale(scheme=palette or "viridis", reverse=reverse_palette),
+        )
+        bars = base.mark_bar().encode(color=c)
+
+    chart = bars
+
+    if show_labels:
+        if orientation == "Vertical":
+            text = base.mark_text(dy=-6).encode(text="value:Q")
+        else:
+            text = base.mark_text(dx=6, align="left").encode(text="value:Q")
+        # Keep text uncolored for readability
+        chart = bars + text
+
+    return chart.properties(height=360, title=title).interactive()
+
+
+# -------------------- Line --------------------
+def series_label_categorical(long: pd.DataFrame, group_col: str | None, y_cols: list[str]) -> pd.Categorical:
+    """Build the series label from category codes instead of per-row string concatenation."""
+    s_codes = pd.Categorical(long["series"], categories=y_cols).codes.astype(np.int64)
+    s_labels = [str(y) for y in y_cols]
+    if not group_col:
+        return pd.Categorical.from_codes(s_codes, categories=s_labels)
+
+    g = long[group_col].astype("category")
+    g_codes = g.cat.codes.to_numpy().astype(np.int64)
+    g_labels = [str(v) for v in g.cat.categories]
+    if (g_codes < 0).any():
+        # nulls get their own group, labelled like astype(str) would
+        g_codes = np.where(g_codes < 0, len(g_labels), g_codes)
+        g_labels.append("nan")
+
+    codes = g_codes * len(s_labels) + s_codes
+    categories = [f"{gl} · {sl}" for gl in g_labels for sl in s_labels]
+    return pd.Categorical.from_codes(codes, categories=categories).remove_unused_categories()
+
+
+def build_line_chart(
+    work: pd.DataFrame,
+    x_col: str,
+    y_cols: list[str],
+    *,
+    group_col: str | None = None,
+    is_time: bool = False,
+    x_numeric: bool = False,
+    layout: str = "Wide (fold in chart)",
+    orientation: str = "Vertical (time on X)",
+    show_markers: bool = False,
+    area_fill: bool = False,
+    log_scale: bool = False,
+    palette: str = "tableau10",
+    reverse_palette: bool = False,
+    show_legend: bool = True,
+    title: str = "Line Chart",
+):
+    """Line chart of prepared line data. Returns (chart, frame sent to the chart)."""
+    id_vars = [x_col] + ([group_col] if group_col else [])
+    if layout.startswith("Wide"):
+        # Keep the compact wide frame; Vega-Lite folds the Y columns into series/value
+        plot_df = work[id_vars + y_cols]
+        base = alt.Chart(plot_df).transform_fold(y_cols, as_=["series", "value"])
+        if group_col:
+            base = base.transform_calculate(
+                series_label=f"toString(datum[{group_col!r}]) + ' · ' + datum.series"
+            )
+        else:
+            base = base.transform_calculate(series_label="datum.series")
+    else:
+        # Melt to long form: columns -> series per Y (and optionally group)
+        plot_df = work.melt(id_vars=id_vars, value_vars=y_cols, var_name="series", value_name="value")
+        plot_df["series"] = pd.Categorical(plot_df["series"], categories=y_cols)
+        # Combine group + series if grouping to color lines distinctly
+        plot_df["series_label"] = series_label_categorical(plot_df, group_col, y_cols)
+        base = alt.Chart(plot_df)
+
+    # Encodings
+    if is_time:
+        x_enc = alt.X(f"{x_col}:T", title=x_col)
+    else:
+        # numeric or category
+        x_type = "Q" if x_numeric else "N"
+        x_enc = alt.X(f"{x_col}:{x_type}", title=x_col, sort=None)
+
+    y_scale = alt.Scale(type="log") if log_scale else alt.Scale()
+    y_enc = alt.Y("value:Q", title=", ".join(y_cols) if len(y_cols) > 1 else y_cols[0], scale=y_scale)
+
+    color = alt.Color(
+        "series_label:N",
+        legend=alt.Legend() if show_legend else None,
+        scale=alt.Scale(scheme=palette, reverse=reverse_palette),
+        title="Series"
+    )
+
+    mark_kwargs = {}
+    if show_markers:
+        mark_kwargs["point"] = True
+
+    line = base.mark_line(**mark_kwargs)
+    if area_fill:
+        area = base.mark_area(opacity=0.2)
+        chart = (area.encode(x=x_enc, y=y_enc, color=color) + line.encode(x=x_enc, y=y_enc, color=color))
+    else:
+        chart = line.encode(x=x_enc, y=y_enc, color=color)
+
+    # Orientation swap (horizontal)
+    if orientation.startswith("Horizontal"):
+        chart = chart.encode(x=y_enc, y=x_enc)
+
+    return chart.properties(height=420, title=title).interactive(), plot_df
+
+
+# -------------------- Distribution --------------------
+CAT_INCLUDE_DTYPES = ["object", "category", "bool"]
+
+
+def is_categorical(series: pd.Series, low_card_threshold: int) -> bool:
+    if str(series.dtype) in CAT_INCLUDE_DTYPES:
+        return True
+    if pd.api.types.is_numeric_dtype(series):
+        return series.nunique(dropna=True) <= low_card_threshold
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.nunique(dropna=True) <= low_card_threshold
+    return False
+
+
+def default_bins(n_unique: int) -> int:
+    return min(30, max(10, int(np.sqrt(max(n_unique, 1)))))
+
+
+def histogram_bins(x: pd.Series, bins: int) -> pd.DataFrame:
+    """Equal-width bins of a numeric series (nulls ignored): bin_start, bin_end, count."""
+    v = x.dropna().to_numpy(dtype=float)
+    if len(v) == 0:
+        return pd.DataFrame({"bin_start": [], "bin_end": [], "count": []})
+    counts, edges = np.histogram(v, bins=int(bins))
+    return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": counts})
+
+
+def value_counts_frame(x: pd.Series, target_col: str) -> pd.DataFrame:
+    """Counts per value (nulls included) with their percentage (columns: target_col, count, percent)."""
+    counts = x.value_counts(dropna=False).rename_axis(target_col).reset_index(name="count")
+    return with_percent(counts)
+
+
+def with_percent(counts: pd.DataFrame) -> pd.DataFrame:
+    total = counts["count"].sum()
+    counts["percent"] = (counts["count"] / total * 100).round(2)
+    return counts
+
+
+def build_value_counts_chart(
+    counts: pd.DataFrame,
+    target_col: str,
+    *,
+    color_mode: str = "Single",         # "Single", "By category"
+    single_color: str | None = "#4C78A8",
+    palette: str | None = None,
+    reverse_palette: bool = False,
+    show_legend: bool = False,
+):
+    x_enc = alt.X(f"{target_col}:N", title=target_col, axis=alt.Axis(labelAngle=0))
+    y_enc = alt.Y("count:Q", title="Count")
+    base = alt.Chart(counts).encode(
+        x=x_enc, y=y_enc,
+        tooltip=[
+            alt.Tooltip(f"{target_col}:N", title=target_col),
+            alt.Tooltip("count:Q", title="Count"),
+            alt.Tooltip("percent:Q", title="Percent"),
+        ]
+    )
+    if color_mode == "Single":
+        bars = base.mark_bar(color=single_color)
+    else:
+        bars = base.mark_bar().encode(
+            color=alt.Color(
+                f"{target_col}:N",
+                legend=alt.Legend() if show_legend else None,
+                scale=alt.Scale(scheme=palette, reverse=reverse_palette),
+            )
+        )
+    title = f"Value counts of {target_col}"
+    return bars.properties(height=360, title=title).interactive()
+
+
+def build_histogram(
+    x: pd.Series,
+    target_col: str,
+    *,
+    bins: int = 30,
+    norm: str = "count",                # "count", "density", "percent"
+    bar_color: str = "#4C78A8",
+    binned: pd.DataFrame | None = None,
+    layer_data: pd.DataFrame | None = None,
+    show_density: bool = True,
+    density_color: str = "#333333",
+    show_rug: bool = False,
+):
+    """
+    Histogram of `x` with optional density (KDE) and rug layers.
+    `binned` (bin_start, bin_end, count) replaces the in-chart binning with bins
+    computed elsewhere; `layer_data` (a sample) feeds the density and rug layers.
+    """
+    hist_df = pd.DataFrame({target_col: x})
+    base = alt.Chart(hist_df)
+
+    # Histogram layer (handle normalization)
+    y_title = {"count": "Count", "density": "Density", "percent": "Percent"}[norm]
+
+    if binned is not None:
+        bins_df = binned.assign(percent=binned["count"] / max(int(binned["count"].sum()), 1) * 100)
+        y_field = "percent" if norm == "percent" else "count"
+        hist = (
+            alt.Chart(bins_df).mark_bar(color=bar_color)
+            .encode(
+                x=alt.X("bin_start:Q", bin="binned", title=target_col),
+                x2="bin_end:Q",
+                y=alt.Y(f"{y_field}:Q", title=y_title),
+                tooltip=[
+                    alt.Tooltip("bin_start:Q", title="From"),
+                    alt.Tooltip("bin_end:Q", title="To"),
+                    alt.Tooltip("count:Q", title="Count"),
+                ],
+            )
+        )
+    elif norm == "count":
+        hist = (
+            base.mark_bar(color=bar_color)
+            .encode(
+                x=alt.X(f"{target_col}:Q", bin=alt.Bin(maxbins=int(bins)), title=target_col),
+                y=alt.Y("count()", title=y_title),
+                tooltip=[
+                    alt.Tooltip(f"{target_col}:Q", bin=alt.Bin(maxbins=int(bins)), title="Range"),
+                    alt.Tooltip("count():Q", title="Count"),
+                ],
+            )
+        )
+    elif norm == "percent":
+        hist = (
+            base.transform_bin("binned", field=target_col, maxbins=int(bins))
+                .transform_aggregate(count="count()", groupby=["binned"])
+                .transform_joinaggregate(total="sum(count)")
+                .transform_calculate(percent="100 * datum.count / datum.total")
+                .mark_bar(color=bar_color)
+                .encode(
+                    x=alt.X("binned:Q", bin=alt.Bin(maxbins=int(bins)), title=target_col),
+                    y=alt.Y("percent:Q", title=y_title),
+                )
+        )
+    else:  # density (keep bar counts for shape; density line overlays)
+        hist = (
+            base.mark_bar(color=bar_color)
+            .encode(
+                x=alt.X(f"{target_col}:Q", bin=alt.Bin(maxbins=int(bins)), title=target_col),
+                y=alt.Y("count()", title=y_title),
+            )
+        )
+
+    layers = [hist]
+    layer_base = alt.Chart(layer_data) if layer_data is not None else base
+
+    if show_density:
+        dens = (
+            layer_base.transform_density(target_col, as_=[target_col, 'density'])
+                .mark_line(stroke=density_color, strokeWidth=2)
+                .encode(
+                    x=f"{target_col}:Q",
+                    y="density:Q",
+                    tooltip=[alt.Tooltip("density:Q", title="Density")]
+                )
+        )
+        layers.append(dens)
+
+    if show_rug:
+        rug = layer_base.mark_tick(opacity=0.35, thickness=1).encode(x=f"{target_col}:Q", y=alt.value(0))
+        layers.append(rug)
+
+    return alt.layer(*layers).properties(height=360, title=f"Histogram of {target_col}").interactive()
+
+
+# -------------------- Dashboard --------------------
+def build_timeline_chart(rows: pd.DataFrame, time_col: str, unit: str, *, color: str = "#4C78A8"):
+    """Area chart of rows per period (columns: period, rows)."""
+    return (
+        alt.Chart(rows).mark_area(line={"color": color}, color=color, opacity=0.35)
+        .encode(
+            x=alt.X("period:T", title=time_col),
+            y=alt.Y("rows:Q", title=f"Rows per {unit}"),
+            tooltip=[alt.Tooltip("period:T", title=unit.capitalize()), alt.Tooltip("rows:Q", title="Rows", format=",")],
+        )
+        .properties(height=360, title=f"Rows over time ({time_col})")
+        .interactive()
+    )
@@ -1,26 +1,133 @@
 import streamlit as st
+import pandas as pd
 
-st.set_page_config(page_title="Dashboard", page_icon=":material/dashboard:")
+from utils.lazy_imports import is_installed, lazy_import, prewarm
+from utils.render_pool import render_pool
+from utils.duckdb_backend import session_backend
+from utils.summary import dataset_summary, materialize_summary
+from utils.visual_components import render_altair_chart
+from dv_core.charts import build_histogram, build_timeline_chart, build_value_counts_chart
 
-# --- Welcome Header ---
-st.title("👋 Welcome to the Data Insight App")
+alt = lazy_import("altair")  # imported on first use; None if not installed
 
-st.markdown(
-    """
-    ### 🚀 Get Started
-    This application helps you **analyze your datasets instantly**.
+st.set_page_config(page_title="Dashboard", page_icon=":material/dashboard:", layout="wide")
 
-    You can:
-    - 📂 **Upload your dataset** (CSV or Excel)
-    - 📊 **View your data** in a clean, interactive table
-    - 📈 **Generate an initial data analysis report** automatically — including insights like missing values, column types, and summary statistics
+# Import the chart/export libraries in the background while the user reads this page
+prewarm()
+# ... and start the PNG renderer processes
+if is_installed("vl_convert"):
+    render_pool().warm()
 
-    ---
-    #### 💡 Why use this app?
-    Whether you’re a **data analyst**, **researcher**, or **student**, this platform gives you a quick start for exploring your data before deeper analysis or modeling.
+df: pd.DataFrame | None = st.session_state.get("uploaded_df")
 
-    Navigate to the **Data section** from the sidebar to upload and explore your dataset.
-    """
+if df is None:
+    # --- Welcome Header ---
+    st.title("👋 Welcome to the Data Insight App")
+
+    st.markdown(
+        """
+        ### 🚀 Get Started
+        This application helps you **analyze your datasets instantly**.
+
+        You can:
+        - 📂 **Upload your dataset** (CSV or Excel)
+        - 📊 **View your data** in a clean, interactive table
+        - 📈 **Generate an initial data analysis report** automatically — including insights like missing values, column types, and summary statistics
+
+        ---
+        #### 💡 Why use this app?
+        Whether you’re a **data analyst**, **researcher**, or **student**, this platform gives you a quick start for exploring your data before deeper analysis or modeling.
+
+        Navigate to the **Data section** from the sidebar to upload and explore your dataset.
+        """
+    )
+
+    st.info("➡️ Go to the **Data → Upload Dataset** page to begin your analysis.")
+    st.stop()
+
+# -------------------- Summary --------------------
+# Everything below reads the summary materialized in the background after upload;
+# rendering never scans the dataset itself
+st.title("📊 Dashboard")
+backend = session_backend(st.session_state)
+try:
+    summary = dataset_summary(df, backend)
+except Exception as e:  # the next visit computes the summary again
+    st.error(f"❌ {e} Open the Dashboard again to retry.")
+    st.stop()
+
+if summary is None:
+    future = materialize_summary(df, backend)
+
+    @st.fragment(run_every=0.5)
+    def wait_for_summary():
+        if future.done():
+            st.rerun()
+        st.info("⏳ Summarizing the dataset in the background…")
+
+    wait_for_summary()
+    st.stop()
+
+st.caption(f"Summary of the full dataset{' (on disk)' if summary.on_disk else ''}, "
+           f"computed in {summary.seconds:,.2f} s after upload; global filters do not apply here.")
+
+# -------------------- Key metrics --------------------
+m1, m2, m3, m4, m5 = st.columns(5)
+m1.metric("Rows", f"{summary.n_rows:,}")
+m2.metric("Columns", f"{summary.n_cols:,}")
+m3.metric("On disk" if summary.on_disk else "Memory", f"{summary.memory_bytes / 1024 ** 2:,.1f} MB")
+m4.metric("Missing cells", f"{summary.total_missing:,}",
+          help=f"{summary.total_missing / max(summary.n_rows * summary.n_cols, 1):.2%} of all cells")
+m5.metric("Duplicated rows", f"{summary.duplicated:,}")
+
+# -------------------- Auto-selected charts --------------------
+charts = summary.auto_charts()
+if charts and alt:
+    st.subheader("Highlights")
+    slots = st.columns(2)
+    for i, (kind, col) in enumerate(charts):
+        with slots[i % 2]:
+            if kind == "timeline":
+                rows, unit = summary.timelines[col]
+                chart = build_timeline_chart(rows, str(col), unit)
+            elif kind == "categories":
+                top = summary.top_values[col].copy()
+                top[col] = top[col].map(lambda v: "(missing)" if pd.isna(v) else str(v))
+                chart = build_value_counts_chart(top, str(col))
+            else:
+                chart = build_histogram(pd.Series(dtype=float), str(col), binned=summary.histograms[col],
+                                        show_density=False)
+            render_altair_chart(chart, use_container_width=True)
+
+# -------------------- Column health --------------------
+st.subheader("Column Health")
+flagged = summary.health[summary.health["status"] != "ok"]
+if flagged.empty:
+    st.success("✅ No empty, constant or mostly-missing columns.")
+else:
+    st.warning(f"⚠️ {len(flagged)} column(s) need attention: "
+               + ", ".join(f"**{c}** ({s})" for c, s in zip(flagged["column"], flagged["status"])))
+st.dataframe(
+    summary.health,
+    use_container_width=True,
+    hide_index=True,
+    column_config={
+        "missing_pct": st.column_config.ProgressColumn("missing %", min_value=0, max_value=100, format="%.2f%%"),
+    },
 )
 
-st.info("➡️ Go to the **Data → Upload Dataset** page to begin your analysis.")
+# -------------------- Top categories / numeric stats --------------------
+left, right = st.columns(2)
+with left:
+    st.subheader("Top Categories")
+    if summary.top_values:
+        pick = st.selectbox("Column", list(summary.top_values), key="dash_top_col")
+        st.dataframe(summary.top_values[pick], use_container_width=True, hide_index=True)
+    else:
+        st.caption("No categorical columns.")
+with right:
+    st.subheader("Numeric Columns")
+    if not summary.numeric.empty:
+        st.dataframe(summary.numeric.round(3), use_container_width=True)
+    else:
+        st.caption("No numeric columns.")
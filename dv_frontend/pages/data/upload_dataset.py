@@ -1,7 +1,24 @@
+import os
+import time
+
 import streamlit as st
 import pandas as pd
-import io
-import csv
+
+from utils.dataset_store import attach_session_dataset, content_key, dataset_store
+from utils.duckdb_backend import COMPRESSED_SUFFIXES, DuckDBDataset, duckdb_available, session_backend
+from utils.incremental import extend_caches
+from utils.memory_budget import BudgetExceeded, admit, admit_frame, enforce_budgets, forget, recall, remember
+from utils.perf import timer
+from utils.summary import materialize_summary
+from utils.ingest import (
+    EXCEL_SUFFIXES, HINT_TYPES, PREVIEW_ROWS, append_rows, estimate_frame_bytes, infer_datetime_columns,
+    load_options_form, parse_options_tag, parse_schema_hints, read_compressed, read_dataset_bytes,
+    split_compression, zip_dataset_members,
+)
+from utils.lazy_imports import is_installed
+from utils.local_files import (
+    DATA_DIRS_ENV, allowed_roots, file_kind, local_file_picker, local_files_key, read_local_files,
+)
 
 st.set_page_config(page_title="Upload Dataset", page_icon="📂", layout="wide")
 st.title("📂 Upload Dataset")
@@ -21,71 +38,367 @@ if "uploader_key" not in st.session_state:
 if st.session_state.get("just_uploaded"):
     st.success("✅ Dataset is ready and stored in session.")
     st.session_state.pop("just_uploaded", None)
+    if st.session_state.get("parse_report"):
+        st.caption(st.session_state.pop("parse_report"))
 
-def _read_csv_with_sniff(file_bytes: bytes) -> pd.DataFrame:
-    """Try reading CSV with delimiter sniffing fallback."""
-    bio = io.BytesIO(file_bytes)
-    try:
-        return pd.read_csv(bio)
-    except Exception:
-        pass
+storage = st.radio(
+    "Storage",
+    ["In memory (pandas)", "On disk (DuckDB)"],
+    index=0,
+    horizontal=True,
+    key="upload_storage",
+    disabled=not duckdb_available(),
+    help="On disk keeps the full CSV in a DuckDB table and runs aggregations as SQL; "
+         "pages only hold a sample in memory. Use it for files larger than RAM (requires duckdb).",
+)
+on_disk = storage.startswith("On disk")
 
-    bio.seek(0)
-    head = bio.read(4096).decode(errors="ignore")
-    sniffer = csv.Sniffer()
+# Append adds the file's rows to the in-memory dataset; cached stats are merged, not recomputed
+current_df = st.session_state.get("uploaded_df")
+can_append = current_df is not None and not on_disk and session_backend(st.session_state) is None
+mode = st.radio(
+    "Mode",
+    ["Replace dataset", "Append to current dataset"],
+    index=0,
+    horizontal=True,
+    key="upload_mode",
+    disabled=not can_append,
+    help="Append adds the new file's rows to the dataset in session (in memory only). Columns are "
+         "matched by name; new columns are added and missing ones left empty.",
+)
+append = can_append and mode.startswith("Append")
+
+# CSV parser and optional schema hints (on-disk storage parses with DuckDB instead)
+with st.expander("⚙️ CSV parsing", expanded=False):
+    engine = st.radio(
+        "Parse engine",
+        ["pandas", "pyarrow"],
+        index=0,
+        horizontal=True,
+        key="upload_engine",
+        format_func={"pandas": "pandas (C parser)", "pyarrow": "pyarrow (multithreaded)"}.get,
+        disabled=not is_installed("pyarrow"),
+        help="pyarrow parses on all cores and keeps strings Arrow-backed (requires pyarrow).",
+    )
+    hints_text = st.text_area(
+        "Schema hints (optional, one `column: type` per line)",
+        key="upload_hints",
+        placeholder="region: category\nqty: int\norder_date: datetime %d/%m/%Y",
+        help=f"Types: {', '.join(HINT_TYPES)}. Datetimes may add a strptime format. "
+             "Hinted columns skip type inference.",
+    )
+    compare = st.checkbox("Also time the pandas parser (parses the file twice)", value=False,
+                          key="upload_compare", disabled=engine == "pandas")
     try:
-        dialect = sniffer.sniff(head, delimiters=[",", ";", "|", "\t"])
-        delim = dialect.delimiter
-    except Exception:
-        delim = ","
-    bio.seek(0)
-    return pd.read_csv(bio, sep=delim)
-
-# Use a versioned key so we can "clear" the uploader by bumping the key
-uploaded_file = st.file_uploader(
-    "Upload CSV or Excel file",
-    type=["csv", "xlsx", "xls"],
-    key=f"uploader_{st.session_state['uploader_key']}"
+        hints = parse_schema_hints(hints_text or "")
+    except ValueError as e:
+        st.error(f"Schema hints: {e}")
+        st.stop()
+
+# Two-phase ingest: parse the first rows, then fully parse only the chosen columns/rows
+preview_first = st.checkbox(
+    "Preview before loading",
+    value=True,
+    key="upload_preview",
+    help=f"Parses the first {PREVIEW_ROWS:,} rows to show the schema; choose the columns, types, a row limit "
+         "or a sample fraction, and the full parse skips everything else. Not used for on-disk storage.",
 )
 
+# -------------------- Ingest steps (browser uploads and server files) --------------------
+def parse_with_engine(status, label: str, read, *, nbytes: int, is_csv: bool = True) -> pd.DataFrame:
+    """Run `read(engine)`, reporting its time (next to the pandas parser's when comparing)."""
+    label = label if engine == "pandas" or not is_csv else f"{label} ({engine})"
+    t0 = time.perf_counter()
+    with timer(label, nbytes=nbytes) as rec:
+        df = read(engine)
+        rec["rows"] = len(df)
+    seconds = time.perf_counter() - t0
+    if not is_csv:
+        return df
+    if compare and engine != "pandas":
+        status.update(label="Timing the pandas parser…")
+        t0 = time.perf_counter()
+        with timer(f"{label} vs pandas", nbytes=nbytes):
+            read("pandas")
+        baseline = time.perf_counter() - t0
+        report = (f"⏱️ Parse time: **{engine} {seconds:,.2f} s** vs pandas {baseline:,.2f} s "
+                  f"(**{baseline / max(seconds, 1e-9):,.1f}×**)")
+    else:
+        report = f"⏱️ Parsed **{len(df):,} rows** with {engine} in **{seconds:,.2f} s**"
+    st.write(f"• {report}")
+    st.session_state["parse_report"] = report  # shown again after the rerun
+    return df
+
+
+def preview_and_choose(token, read_preview, *, key: str, source_bytes: int | None = None) -> dict | None:
+    """
+    Preview parse (kept while `token` is unchanged) and the load options chosen on
+    it, checked against the memory budget when the CSV size is known; None if unusable.
+    """
+    cached = recall(st.session_state, "upload_preview")
+    if cached is None or cached[0] != token:
+        try:
+            with st.spinner(f"Parsing the first {PREVIEW_ROWS:,} rows…"), timer("preview parse"):
+                cached = (token, read_preview())
+        except Exception as e:
+            st.error(f"Could not preview the file: {type(e).__name__}: {e}")
+            return None
+        remember(st.session_state, "upload_preview", cached, label="upload preview")
+    preview = cached[1]
+    st.subheader("🔎 Preview")
+    st.caption(f"Schema of the first {len(preview):,} rows. Choose what the full parse loads.")
+    load = load_options_form(preview, hints=hints, key=key)
+    if load is None or not source_bytes:
+        return load
+
+    # admission control before parsing: shrink the sample (or refuse) if the load would not fit
+    estimate = estimate_frame_bytes(preview, source_bytes, usecols=load["usecols"], nrows=load["nrows"],
+                                    fraction=load["fraction"])
+    admission = admit(st.session_state, estimate, replacing=not append)
+    if not admission.allowed:
+        st.error(f"⛔ {admission.message}")
+        return None
+    if admission.fraction is not None:
+        st.warning(f"⚠️ {admission.message}")
+        return dict(load, fraction=(load["fraction"] or 1.0) * admission.fraction)
+    st.caption(f"Estimated size in memory: about **{estimate / 1024 ** 2:,.0f} MB**.")
+    return load
+
+
+def fit_budget(df: pd.DataFrame, key: str, *, replacing: bool) -> tuple[pd.DataFrame, str]:
+    """Admission control after parsing: downsample `df` to the memory budget (the key then names the sample)."""
+    df, admission = admit_frame(st.session_state, df, replacing=replacing)
+    if admission.fraction is not None:
+        st.write(f"• ⚠️ {admission.message}")
+        key = f"{key}-sample{admission.fraction:.4f}"
+    return df, key
+
+
+def append_to_current(status, new_df: pd.DataFrame, key: str, *, hinted=()) -> None:
+    """Append parsed rows to the session dataset, merging its cached stats."""
+    new_df, key = fit_budget(new_df, key, replacing=False)
+    with timer("datetime inference", rows=len(new_df)):
+        infer_datetime_columns(new_df, exclude=hinted)
+
+    status.update(label="Appending rows…")
+    with timer("append rows", rows=len(new_df)):
+        df, notes = append_rows(current_df, new_df)
+    for note in notes:
+        st.write(f"• {note}")
+    combined_key = content_key(f"{st.session_state.get('dataset_key')}+{key}".encode(), kind="append")
+    with timer("store dataset", rows=len(df)):
+        stored = attach_session_dataset(st.session_state, combined_key, df)
+    if stored is df:
+        with timer("incremental stats", rows=len(new_df)):
+            carried = extend_caches(current_df, df)
+        if carried:
+            st.write(f"• Updated cached stats: {', '.join(carried)}")
+    st.write(f"• Appended **{len(new_df):,} rows** → **{len(df):,} rows** in total")
+
+
+def replace_current(status, key: str, parse, backend: DuckDBDataset | None = None, *, hinted=()) -> None:
+    """Make the dataset under `key` the session dataset, calling `parse()` unless it is already loaded."""
+    if backend is not None:
+        st.write(f"• On disk: **{backend.n_rows:,} rows** "
+                 f"({backend.disk_bytes() / 1024 ** 2:,.1f} MB DuckDB file)")
+
+    # Identical data already loaded by any session: share that frame, skip parsing
+    df = dataset_store().get(key)
+    if df is not None:
+        st.write("• Identical dataset already loaded on this server — reusing it.")
+    else:
+        status.update(label="Reading file…")
+        df, key = fit_budget(parse(), key, replacing=True)
+
+        status.update(label="Optimizing & validating…")
+        # light datetime inference
+        with timer("datetime inference", rows=len(df)):
+            infer_datetime_columns(df, exclude=hinted)
+
+    status.update(label="Saving to session…")
+    with timer("store dataset", rows=len(df)):
+        attach_session_dataset(st.session_state, key, df)
+
+
+def finish_ingest(backend: DuckDBDataset | None, fp) -> None:
+    st.session_state["dataset_backend"] = backend
+    # Dashboard summary: computed in the background while the user moves on
+    materialize_summary(st.session_state["uploaded_df"], backend)
+    forget(st.session_state, "upload_preview")
+    for note in enforce_budgets(st.session_state):
+        st.write(f"• {note}")
+    st.session_state["just_uploaded"] = True
+    st.session_state["last_file_fp"] = fp
+
+    # CLEAR the uploader by bumping the versioned key, then rerun
+    st.session_state["uploader_key"] += 1
+
+
+# -------------------- Source --------------------
+# Server directory reads files already on the server's disk (allow-listed via DV_DATA_DIRS)
+server_dirs = allowed_roots()
+source = st.radio(
+    "Source",
+    ["Browser upload", "Server directory"],
+    index=0,
+    horizontal=True,
+    key="upload_source",
+    disabled=not server_dirs,
+    help="Server directory loads CSV, Parquet, Arrow or Excel files directly from the server's disk, "
+         f"with no upload size limit. Enable it by listing directories in {DATA_DIRS_ENV}.",
+)
+from_server = bool(server_dirs) and source == "Server directory"
+
+if from_server:
+    uploaded_file = None
+    paths = local_file_picker(key="local_files")
+    kinds = {file_kind(p) for p in paths}
+    use_disk = on_disk and not append and len(paths) == 1 and kinds <= {"csv", "parquet"}
+    load = {"hints": hints}
+    if paths and preview_first and not use_disk:
+        # the first file's schema stands for all of them
+        token = (paths[0], os.path.getmtime(paths[0]), engine, sorted(hints.items()))
+        load = preview_and_choose(token, lambda: read_local_files(
+            paths[:1], engine=engine, hints=hints, nrows=PREVIEW_ROWS)[0], key=f"local_opts_{paths[0]}",
+            source_bytes=sum(os.path.getsize(p) for p in paths) if kinds == {"csv"} else None)
+    if st.button("Load selected files", key="local_load", disabled=not paths or load is None, type="primary"):
+        with st.status("Loading files…", expanded=True) as status:
+            try:
+                total_mb = sum(os.path.getsize(p) for p in paths) / 1024 ** 2
+                st.write(f"• Files: **{len(paths)}**  \n• Size on disk: **{total_mb:,.2f} MB**")
+                if on_disk and not use_disk:
+                    st.write("• On-disk storage supports a single CSV or Parquet file; loading in memory.")
+                key = local_files_key(paths, kind=f"duckdb-{kinds.pop()}" if use_disk
+                                      else f"local{parse_options_tag(engine, **load)}")
+
+                def parse() -> pd.DataFrame:
+                    notes = []
+
+                    def read(parse_engine: str) -> pd.DataFrame:
+                        df, notes[:] = read_local_files(paths, engine=parse_engine, **load)
+                        return df
+
+                    df = parse_with_engine(status, "parse local files", read, nbytes=int(total_mb * 1024 ** 2),
+                                           is_csv="csv" in {file_kind(p) for p in paths})
+                    for note in notes:
+                        st.write(f"• {note}")
+                    return df
+
+                backend = None
+                if append:
+                    status.update(label="Reading files…")
+                    append_to_current(status, parse(), key, hinted=load["hints"])
+                else:
+                    if use_disk:
+                        status.update(label="Loading into on-disk table…")
+                        with timer("duckdb ingest", nbytes=int(total_mb * 1024 ** 2)) as rec:
+                            backend = DuckDBDataset.ingest(paths[0], key=key, kind=file_kind(paths[0]))
+                            rec["rows"] = backend.n_rows
+                    replace_current(status, key, backend.sample if backend is not None else parse, backend,
+                                    hinted=load["hints"])
+                finish_ingest(backend, tuple(paths))
+                status.update(label="Done! Rerendering pages…", state="complete", expanded=False)
+
+            except BudgetExceeded as e:
+                status.update(label="Not loaded: over the memory budget.", state="error", expanded=True)
+                st.error(str(e))
+            except Exception as e:
+                status.update(label="Failed to load files.", state="error", expanded=True)
+                st.exception(e)
+            else:
+                st.rerun()
+else:
+    # Use a versioned key so we can "clear" the uploader by bumping the key
+    uploaded_file = st.file_uploader(
+        "Upload CSV or Excel file (optionally compressed: gzip, bz2, xz, zstd or zip)",
+        type=["csv", "xlsx", "xls", "gz", "bz2", "xz", "zst", "zip"],
+        key=f"uploader_{st.session_state['uploader_key']}"
+    )
+
+# Compressed uploads are decompressed as a stream while parsing; zip archives need a member
+member = None
 if uploaded_file is not None:
+    inner_name, compression = split_compression(uploaded_file.name)
+    if compression == "zip":
+        members = zip_dataset_members(uploaded_file)
+        if not members:
+            st.error("The archive contains no CSV or Excel files.")
+        elif len(members) == 1:
+            member = members[0]
+        else:
+            member = st.selectbox("File in archive", members, index=None, placeholder="Choose a file to load…",
+                                  key=f"zip_member_{st.session_state['uploader_key']}")
+        inner_name = member
+
+if uploaded_file is not None and inner_name is not None:
     # Optional: fingerprint to avoid accidental reprocessing
-    fp = (uploaded_file.name, uploaded_file.size)
-    if st.session_state.get("last_file_fp") != fp:
+    fp = (uploaded_file.name, uploaded_file.size, member)
+    is_csv = not inner_name.lower().endswith(EXCEL_SUFFIXES)
+    use_disk = on_disk and is_csv and (compression is None or compression in COMPRESSED_SUFFIXES)
+
+    def read_upload(**options) -> pd.DataFrame:
+        if compression is None:
+            return read_dataset_bytes(uploaded_file.getvalue(), is_csv=is_csv, **options)
+        return read_compressed(uploaded_file, compression, inner_name, **options)
+
+    load = {"hints": hints}
+    if preview_first and not use_disk:
+        load = preview_and_choose(
+            (fp, engine, sorted(hints.items())),
+            lambda: read_upload(engine=engine, hints=hints, nrows=PREVIEW_ROWS),
+            key=f"upload_opts_{st.session_state['uploader_key']}_{member}",
+            source_bytes=uploaded_file.size if is_csv and compression is None else None,
+        )
+        process = st.button("Load dataset", key="upload_load", disabled=load is None, type="primary")
+    else:
+        process = st.session_state.get("last_file_fp") != fp
+    if process:
         with st.status("Processing file…", expanded=True) as status:
             try:
                 size_mb = (uploaded_file.size or 0) / (1024**2)
                 st.write(f"• File: **{uploaded_file.name}**  \n• Size: **{size_mb:,.2f} MB**")
+                if compression:
+                    st.write(f"• {compression} compressed{f' (member **{member}**)' if member else ''}: "
+                             "decompressed while parsing")
+
+                if on_disk and not is_csv:
+                    st.write("• On-disk storage supports CSV only; loading this file in memory.")
+                elif on_disk and compression and compression not in COMPRESSED_SUFFIXES:
+                    st.write(f"• On-disk storage reads plain, gzip or zstd CSV; loading this {compression} file in memory.")
+                file_bytes = uploaded_file.getvalue()
+                parse_tag = parse_options_tag(engine, **load)
+                key = content_key(file_bytes, kind=("duckdb-csv" if use_disk else f"csv{parse_tag}") if is_csv
+                                  else f"excel{parse_tag}")
+                if member is not None:
+                    key = content_key(f"{key}/{member}".encode(), kind="zip")
+
+                def parse() -> pd.DataFrame:
+                    def read(parse_engine: str) -> pd.DataFrame:
+                        return read_upload(engine=parse_engine, **load)
+
+                    return parse_with_engine(status, "parse" if compression is None else f"parse ({compression} stream)",
+                                             read, nbytes=len(file_bytes), is_csv=is_csv)
 
-                status.update(label="Reading file…")
-                if uploaded_file.name.lower().endswith(".csv"):
-                    file_bytes = uploaded_file.getvalue()
-                    df = _read_csv_with_sniff(file_bytes)
+                backend = None
+                if append:
+                    status.update(label="Reading file…")
+                    append_to_current(status, parse(), key, hinted=load["hints"])
                 else:
-                    df = pd.read_excel(uploaded_file)
-
-                status.update(label="Optimizing & validating…")
-                # light datetime inference
-                for col in df.columns:
-                    s = df[col]
-                    if s.dtype == "object":
-                        try:
-                            converted = pd.to_datetime(s, errors="ignore", infer_datetime_format=True)
-                            if getattr(converted.dtype, "kind", "") == "M":
-                                df[col] = converted
-                        except Exception:
-                            pass
-
-                status.update(label="Saving to session…")
-                st.session_state["uploaded_df"] = df
-                st.session_state["just_uploaded"] = True
-                st.session_state["last_file_fp"] = fp
-
-                # CLEAR the uploader by bumping the versioned key, then rerun
-                st.session_state["uploader_key"] += 1
+                    if use_disk:
+                        status.update(label="Loading into on-disk table…")
+                        with timer("duckdb ingest", nbytes=len(file_bytes)) as rec:
+                            backend = DuckDBDataset.ingest_bytes(file_bytes, key=key, compression=compression)
+                            rec["rows"] = backend.n_rows
+                    # in-memory frame of an on-disk dataset is only a sample; aggregations go to the table
+                    replace_current(status, key, backend.sample if backend is not None else parse, backend,
+                                    hinted=load["hints"])
+                finish_ingest(backend, fp)
 
                 status.update(label="Done! Rerendering pages…", state="complete", expanded=False)
 
+            except BudgetExceeded as e:
+                status.update(label="Not loaded: over the memory budget.", state="error", expanded=True)
+                st.error(str(e))
             except Exception as e:
                 status.update(label="Failed to process file.", state="error", expanded=True)
                 st.exception(e)
@@ -98,6 +411,14 @@ if st.session_state.get("uploaded_df") is not None and uploaded_file is None:
     df = st.session_state["uploaded_df"]
     n_rows, n_cols = df.shape
     st.caption(f"Current dataset in session: **{n_rows:,} rows × {n_cols:,} cols**")
+    backend = session_backend(st.session_state)
+    if backend is not None:
+        st.caption(f"On-disk dataset: **{backend.n_rows:,} rows**; charts aggregate the full table, "
+                   f"previews use this {n_rows:,}-row sample.")
+    shared = dataset_store().stats()
+    shared = shared[shared["dataset"] == st.session_state.get("dataset_key")]
+    if not shared.empty and int(shared["sessions"].iloc[0]) > 1:
+        st.caption(f"Shared read-only with **{int(shared['sessions'].iloc[0]) - 1}** other session(s) on this server.")
     st.dataframe(df.head(10), use_container_width=True)
 else:
     st.info("Upload a CSV or Excel file to continue.")
@@ -2,19 +2,43 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 
+from utils.data_grid import render_data_grid
+from utils.duckdb_backend import session_backend
+from utils.filters import filtered_dataset
+from utils.incremental import dataset_profile
+from utils.lazy_imports import lazy_import
+from utils.memory_budget import forget, recall, remember
+from utils.null_index import null_index
+from utils.perf import timer
+from utils.report import column_type_map, create_pdf_report
+from utils.visual_components import render_altair_chart
+
+alt = lazy_import("altair")  # imported on first use; None if not installed
+
 st.set_page_config(page_title="View Dataset", page_icon="📊", layout="wide")
 st.title("📊 View Uploaded Dataset")
 
-# Expecting df saved earlier as st.session_state["uploaded_df"]
-df: pd.DataFrame | None = st.session_state.get("uploaded_df")
+# Expecting df saved earlier as st.session_state["uploaded_df"] (restricted by the global filters)
+df: pd.DataFrame | None = filtered_dataset(st.session_state)  # global filters applied
 
 if df is None:
     st.warning("⚠️ No dataset found. Please upload one first from the **Upload Dataset** page.")
     st.stop()
 
+# On-disk datasets: row counts, missing values, duplicates, numeric stats and unique
+# counts come from the full table; previews and other sections use the session sample
+backend = session_backend(st.session_state)
+# In-memory datasets: profiling statistics come from the cached dataset profile (computed
+# once on the compute engine, and merged rather than recomputed when rows are appended)
+profile = dataset_profile(df) if backend is None else None
+
 # ---------- Quick stats ----------
 st.success("✅ Data loaded from session.")
 n_rows, n_cols = df.shape
+if backend is not None:
+    n_rows = backend.n_rows
+    st.caption(f"On-disk dataset ({backend.disk_bytes() / 1024 ** 2:,.1f} MB); "
+               f"previews and the PDF report use a {len(df):,}-row sample.")
 mem_bytes = df.memory_usage(deep=True).sum()
 mem_mb = mem_bytes / (1024 ** 2)
 
@@ -23,12 +47,16 @@ c1, c2, c3, c4 = st.columns(4)
 c1.metric("Rows", f"{n_rows:,}")
 c2.metric("Columns", f"{n_cols:,}")
 c3.metric("Memory", f"{mem_mb:,.2f} MB")
-c4.metric("Duplicated Rows", f"{df.duplicated().sum():,}")
+with timer("duplicated rows", rows=n_rows):
+    dup_count = backend.duplicated_count() if backend is not None else profile.duplicated_count()
+c4.metric("Duplicated Rows", f"{dup_count:,}")
 
 # ---------- Full dataframe (optionally limited for performance) ----------
+# Sorting, filtering and paging run on the server; only the visible page is sent
 with st.expander("🔎 View DataFrame", expanded=False):
-    max_rows = st.slider("Max rows to render", 50, min(2000, max(2000, n_rows)), 500, step=50)
-    st.dataframe(df.head(max_rows), use_container_width=True)
+    if backend is not None:
+        st.caption(f"Browsing the {len(df):,}-row session sample.")
+    render_data_grid(df, key="grid_all")
 
 # ---------- Head / Tail ----------
 st.subheader("Preview")
@@ -40,14 +68,7 @@ with tab_tail:
 
 # ---------- Column names & dtypes ----------
 st.subheader("Columns by Type")
-dtype_map = {
-    "Numeric": df.select_dtypes(include=[np.number]).columns.tolist(),
-    "Categorical": df.select_dtypes(include=["object", "category"]).columns.tolist(),
-    "Datetime": df.select_dtypes(include=["datetime64[ns]", "datetime64[ns, UTC]"]).columns.tolist(),
-    "Boolean": df.select_dtypes(include=["bool"]).columns.tolist(),
-}
-other_cols = [c for c in df.columns if c not in sum(dtype_map.values(), [])]
-dtype_map["Other"] = other_cols
+dtype_map = column_type_map(df)
 
 colA, colB = st.columns(2)
 with colA:
@@ -66,8 +87,9 @@ with st.expander("🧬 Raw dtypes table"):
 
 # ---------- Missing / Nulls ----------
 st.subheader("Missing & Null Values")
-null_counts = df.isnull().sum()
-null_pct = (null_counts / len(df) * 100).round(2)
+with timer("null counts", rows=n_rows):
+    null_counts = backend.null_counts() if backend is not None else profile.null_counts()
+null_pct = (null_counts / n_rows * 100).round(2)
 missing_df = (
     pd.DataFrame({"missing_count": null_counts, "missing_pct": null_pct})
     .sort_values("missing_pct", ascending=False)
@@ -76,20 +98,47 @@ left, right = st.columns(2)
 with left:
     st.metric("Columns with any missing", int((null_counts > 0).sum()))
 with right:
-    overall_missing = int(df.isnull().values.sum())
+    overall_missing = int(null_counts.sum())
     st.metric("Total missing cells", f"{overall_missing:,}")
 
 st.dataframe(missing_df, use_container_width=True)
 
+# Co-missingness and row patterns, from the dataset's packed null bitmaps
+if backend is None and overall_missing:
+    with st.expander("🧩 Missingness matrix", expanded=False):
+        nulls = null_index(df)
+        with timer("co-missingness", rows=n_rows):
+            co = nulls.co_missing()
+        st.caption("Rows missing both columns (diagonal: rows missing the column).")
+        if alt:
+            cells = co.rename_axis("column_a").reset_index().melt("column_a", var_name="column_b", value_name="rows")
+            cells[["column_a", "column_b"]] = cells[["column_a", "column_b"]].astype(str)
+            order = [str(c) for c in co.index]
+            heat = alt.Chart(cells).mark_rect().encode(
+                x=alt.X("column_b:N", sort=order, title=None),
+                y=alt.Y("column_a:N", sort=order, title=None),
+                color=alt.Color("rows:Q", scale=alt.Scale(scheme="oranges")),
+                tooltip=["column_a", "column_b", alt.Tooltip("rows:Q", format=",")],
+            )
+            render_altair_chart(heat, use_container_width=True)
+        else:
+            st.dataframe(co, use_container_width=True)
+
+        with timer("missingness patterns", rows=n_rows):
+            patterns, _ = nulls.patterns(top=20)
+        st.caption("Most frequent missingness patterns (✗ = missing).")
+        shown = patterns.drop(columns="rows").replace({True: "✗", False: ""})
+        shown["rows"] = patterns["rows"]
+        st.dataframe(shown, use_container_width=True)
+
 # ---------- Duplicates ----------
 st.subheader("Duplicates")
-dup_count = df.duplicated().sum()
 dup_exists = dup_count > 0
 st.write(f"**Duplicate rows exist?** {'✅ Yes' if dup_exists else '❌ No'}")
 if dup_exists:
     st.write(f"Number of duplicated rows: **{dup_count:,}**")
     with st.expander("Show duplicated rows"):
-        st.dataframe(df[df.duplicated(keep=False)], use_container_width=True)
+        render_data_grid(df, key="grid_dup", base="duplicated")
 
 # ---------- Describe / Summary ----------
 st.subheader("Descriptive Statistics")
@@ -97,7 +146,12 @@ tab_num, tab_cat, tab_all = st.tabs(["Numeric", "Categorical", "All (mixed)"])
 
 with tab_num:
     if dtype_map["Numeric"]:
-        st.dataframe(df[dtype_map["Numeric"]].describe().T, use_container_width=True)
+        with timer("describe numeric", rows=n_rows):
+            if backend is not None:
+                desc = backend.describe_numeric(dtype_map["Numeric"])
+            else:
+                desc = profile.describe_numeric(df, dtype_map["Numeric"])
+        st.dataframe(desc, use_container_width=True)
     else:
         st.info("No numeric columns.")
 
@@ -116,7 +170,11 @@ with tab_all:
 
 # ---------- Unique values (quick look) ----------
 st.subheader("Unique Values per Column")
-uni = df.nunique(dropna=True).rename("unique_values").to_frame()
+with timer("unique values", rows=n_rows):
+    uni = (backend.nunique() if backend is not None else profile.nunique()).rename("unique_values").to_frame()
+if profile is not None and profile.approximate_nunique():
+    st.caption("Approximate (HyperLogLog sketch) for high-cardinality columns: "
+               + ", ".join(map(str, profile.approximate_nunique())))
 st.dataframe(uni.sort_values("unique_values", ascending=False), use_container_width=True)
 
 with st.expander("🔢 Value counts for categorical columns (top 10 each)"):
@@ -138,186 +196,6 @@ with st.expander("📈 Correlations (numeric-only)"):
         st.info("Need at least two numeric columns to compute correlations.")
 
 # ---------- PDF EXPORT (Selectable, 2-decimals, fixed layout) ----------
-from io import BytesIO
-from datetime import datetime
-
-# -------- formatting helpers (readable & fixed) --------
-def _format_df_for_pdf(
-    df: pd.DataFrame,
-    *,
-    max_rows: int = 30,
-    max_cols: int = 12,
-    str_maxlen: int = 60,
-) -> pd.DataFrame:
-    """
-    Make a DataFrame readable for PDF:
-    - keep at most max_rows x max_cols
-    - round numeric columns to 2 decimals
-    - truncate long strings with ellipsis
-    - stringify everything (reportlab-friendly)
-    """
-    if df is None or df.empty:
-        return pd.DataFrame()
-
-    d = df.copy()
-
-    # limit rows/cols
-    if d.shape[0] > max_rows:
-        d = d.head(max_rows)
-    if d.shape[1] > max_cols:
-        keep = list(d.columns[:max_cols])
-        d = d[keep]
-
-    # round numeric to 2 decimals
-    num_cols = d.select_dtypes(include=[np.number]).columns
-    if len(num_cols) > 0:
-        d[num_cols] = d[num_cols].round(2)
-
-    # truncate long strings (columns and values)
-    def _trunc(x):
-        if pd.isna(x):
-            return ""
-        s = str(x)
-        return (s[:str_maxlen - 1] + "…") if len(s) > str_maxlen else s
-
-    d.columns = [_trunc(c) for c in d.columns]
-    d = d.applymap(_trunc)
-
-    # ensure string type
-    return d.astype(str)
-
-
-def _table_from_df(df: pd.DataFrame, style, repeat_header=True):
-    """Basic reportlab Table from DataFrame; lets reportlab handle widths."""
-    from reportlab.platypus import Table
-    if df is None or df.empty:
-        df = pd.DataFrame({"info": ["(no data)"]})
-
-    # add index as first column
-    data = [["#"] + list(df.columns)]
-    for idx, row in df.iterrows():
-        data.append([str(idx)] + [str(v) for v in row.tolist()])
-
-    tbl = Table(data, repeatRows=1 if repeat_header else 0)
-    tbl.setStyle(style)
-    return tbl
-
-
-def create_pdf_report(df: pd.DataFrame, sections: dict, title: str = "Dataset Profile Report") -> bytes:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, TableStyle, PageBreak
-
-    buf = BytesIO()
-    doc = SimpleDocTemplate(
-        buf,
-        pagesize=A4,
-        leftMargin=28, rightMargin=28, topMargin=30, bottomMargin=28,
-        title=title,
-    )
-
-    styles = getSampleStyleSheet()
-    h1 = styles["Heading1"]
-    h2 = styles["Heading2"]
-    p  = styles["BodyText"]
-    p.fontSize = 9
-    p.leading = 11
-
-    tstyle = TableStyle([
-        ("FONTNAME", (0,0), (-1,-1), "Helvetica"),
-        ("FONTSIZE", (0,0), (-1,-1), 8),
-        ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
-        ("ALIGN", (0,0), (-1,0), "CENTER"),
-        ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#F5F5F5")),
-        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-        ("LEFTPADDING", (0,0), (-1,-1), 4),
-        ("RIGHTPADDING", (0,0), (-1,-1), 4),
-        ("TOPPADDING", (0,0), (-1,-1), 2),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 2),
-    ])
-
-    story = []
-    now = datetime.now().strftime("%Y-%m-%d %H:%M")
-    story += [Paragraph(title, h1), Paragraph(f"Generated: {now}", p), Spacer(1, 8)]
-
-    # dtype buckets once
-    dtype_map = {
-        "Numeric": df.select_dtypes(include=[np.number]).columns.tolist(),
-        "Categorical": df.select_dtypes(include=["object", "category"]).columns.tolist(),
-        "Datetime": df.select_dtypes(include=["datetime64[ns]", "datetime64[ns, UTC]"]).columns.tolist(),
-        "Boolean": df.select_dtypes(include=["bool"]).columns.tolist(),
-    }
-    other_cols = [c for c in df.columns if c not in sum(dtype_map.values(), [])]
-    dtype_map["Other"] = other_cols
-
-    # Quick stats
-    if sections.get("quick_stats", True):
-        n_rows, n_cols = df.shape
-        mem_mb = round(df.memory_usage(deep=True).sum() / (1024**2), 2)
-        dup_rows = int(df.duplicated().sum())
-        qs = pd.DataFrame({
-            "Metric": ["Rows", "Columns", "Memory (MB)", "Duplicated Rows"],
-            "Value": [f"{n_rows:,}", f"{n_cols:,}", f"{mem_mb:,.2f}", f"{dup_rows:,}"]
-        }).set_index("Metric")
-        story += [Paragraph("Quick Stats", h2), _table_from_df(_format_df_for_pdf(qs), tstyle), Spacer(1, 10)]
-
-    # Columns by Type
-    if sections.get("columns_by_type", True):
-        dtypes_df = pd.DataFrame(
-            [(k, len(v), ", ".join(v[:50])) for k, v in dtype_map.items()],
-            columns=["Type", "Count", "Columns (first 50)"]
-        ).set_index("Type")
-        story += [Paragraph("Columns by Type", h2), _table_from_df(_format_df_for_pdf(dtypes_df), tstyle), Spacer(1, 10)]
-
-    # Missing values
-    if sections.get("missing", True):
-        null_counts = df.isnull().sum()
-        null_pct = (null_counts / len(df) * 100).round(2)
-        missing_df = pd.DataFrame({"missing_count": null_counts, "missing_pct": null_pct}) \
-                        .sort_values("missing_pct", ascending=False)
-        story += [Paragraph("Missing & Null Values", h2), _table_from_df(_format_df_for_pdf(missing_df), tstyle), Spacer(1, 10)]
-
-    # Preview head / tail
-    if sections.get("preview", True):
-        story += [
-            Paragraph("Preview (Head 10)", h2), _table_from_df(_format_df_for_pdf(df.head(10)), tstyle), Spacer(1, 6),
-            Paragraph("Preview (Tail 10)", h2), _table_from_df(_format_df_for_pdf(df.tail(10)), tstyle),
-            PageBreak()
-        ]
-
-    # Describe numeric
-    if sections.get("describe_numeric", True) and len(dtype_map["Numeric"]) > 0:
-        num_desc = df[dtype_map["Numeric"]].describe().T.round(2)
-        story += [Paragraph("Descriptive Statistics (Numeric)", h2), _table_from_df(_format_df_for_pdf(num_desc), tstyle), Spacer(1, 10)]
-
-    # Describe categorical
-    if sections.get("describe_categorical", True) and len(dtype_map["Categorical"]) > 0:
-        cat_desc = df[dtype_map["Categorical"]].describe(include=["object", "category"]).T
-        story += [Paragraph("Descriptive Statistics (Categorical)", h2), _table_from_df(_format_df_for_pdf(cat_desc), tstyle), Spacer(1, 10)]
-
-    # Unique values
-    if sections.get("unique_values", True):
-        uni = df.nunique(dropna=True).rename("unique_values").to_frame().sort_values("unique_values", ascending=False)
-        story += [Paragraph("Unique Values per Column", h2), _table_from_df(_format_df_for_pdf(uni), tstyle), Spacer(1, 10)]
-
-    # Correlations (numeric)
-    if sections.get("correlations", True) and len(dtype_map["Numeric"]) >= 2:
-        corr = df[dtype_map["Numeric"]].corr(numeric_only=True).round(2)
-        story += [Paragraph("Correlations (Numeric-Only)", h2), _table_from_df(_format_df_for_pdf(corr), tstyle), Spacer(1, 10)]
-
-    # Duplicates sample
-    if sections.get("duplicates", True):
-        dup_count = int(df.duplicated().sum())
-        if dup_count > 0:
-            dups_sample = df[df.duplicated(keep=False)].head(30)
-            story += [Paragraph(f"Duplicated Rows (showing first 30 of {dup_count:,})", h2),
-                      _table_from_df(_format_df_for_pdf(dups_sample), tstyle), Spacer(1, 10)]
-
-    doc.build(story)
-    return buf.getvalue()
-
-
 # ---- UI: section selector + horizontal Generate/Download ----
 st.subheader("📄 PDF Report")
 with st.expander("Select sections to include", expanded=False):
@@ -347,29 +225,27 @@ sections = {
     "duplicates": include_dups,
 }
 
-if "pdf_bytes_cache" not in st.session_state:
-    st.session_state["pdf_bytes_cache"] = None
-
+# The generated PDF is a regenerable artifact: it may be evicted under the memory budget
 btn_gen, btn_dl, _sp = st.columns([1.2, 2.2, 6])
 with btn_gen:
     if st.button("⚙️ Generate", key="pdf_generate"):
         try:
-            st.session_state["pdf_bytes_cache"] = create_pdf_report(
-                df, sections, title="Dataset Profile Report"
-            )
+            remember(st.session_state, "pdf_report",
+                     create_pdf_report(df, sections, title="Dataset Profile Report"), label="PDF report")
             st.toast("Report generated.")
         except Exception as e:
-            st.session_state["pdf_bytes_cache"] = None
+            forget(st.session_state, "pdf_report")
             st.error("Failed to generate PDF report.")
             st.exception(e)
 
+pdf_bytes = recall(st.session_state, "pdf_report")
 with btn_dl:
     st.download_button(
         "⬇️ Download PDF",
-        data=st.session_state["pdf_bytes_cache"] if st.session_state["pdf_bytes_cache"] else b"",
+        data=pdf_bytes or b"",
         file_name="dataset_report.pdf",
         mime="application/pdf",
-        disabled=st.session_state["pdf_bytes_cache"] is None,
+        disabled=pdf_bytes is None,
         key="pdf_download",
     )
 # ---------- END PDF EXPORT ----------
@@ -2,20 +2,26 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import json
+import uuid
 
 # Reusable PNG export UI (PNG-only)
-from utils.visual_components import export_controls_altair_png
+from utils.visual_components import export_controls_altair_png, render_altair_chart
+from utils.chart_data import altair_chart_spec
+from utils.duckdb_backend import session_backend
+from utils.perf import timer
+from utils.reactive import Stage, StageGraph
+from dv_core.charts import aggregate_for_bar, bar_defaults, bar_value_label, build_altair_bar, top_bars
+from utils.lazy_imports import lazy_import
+from utils.filters import FILTERS_KEY, filtered_dataset
 
-try:
-    import altair as alt
-except Exception:
-    alt = None
+alt = lazy_import("altair")  # imported on first use; None if not installed
 
 st.set_page_config(page_title="Visualization · Bar Chart", page_icon="📊", layout="wide")
 st.title("📊 Visualization → Bar Chart")
 
 # -------------------- Data --------------------
-df: pd.DataFrame | None = st.session_state.get("uploaded_df")
+df: pd.DataFrame | None = filtered_dataset(st.session_state)  # global filters applied
 if df is None:
     st.warning("⚠️ No dataset found. Please upload one first from the **Upload Dataset** page.")
     st.stop()
@@ -32,116 +38,17 @@ def selectable_categorical_columns(data: pd.DataFrame, max_unique_numeric_as_cat
 def selectable_numeric_columns(data: pd.DataFrame) -> list[str]:
     return data.select_dtypes(include=[np.number]).columns.tolist()
 
-def aggregate_for_bar(data: pd.DataFrame, x_col: str, y_col: str | None, agg: str, remove_nulls: bool) -> pd.DataFrame:
-    if agg == "count":
-        d = data[[x_col]].copy()
-        if remove_nulls:
-            d = d.dropna(subset=[x_col])
-        g = d.groupby(x_col, dropna=False).size().reset_index(name="value")
-    elif agg == "nunique(y)":
-        assert y_col is not None
-        d = data[[x_col, y_col]].copy()
-        if remove_nulls:
-            d = d.dropna(subset=[x_col, y_col])
-        g = d.groupby(x_col, dropna=False).agg(value=(y_col, lambda s: s.nunique(dropna=True))).reset_index()
-    else:
-        assert y_col is not None
-        d = data[[x_col, y_col]].copy()
-        if remove_nulls:
-            d = d.dropna(subset=[x_col, y_col])
-        g = d.groupby(x_col, dropna=False)[y_col].agg(agg).reset_index(name="value")
-    return g
-
-# NEW: color-aware bar builder
-def build_altair_bar(
-    grouped: pd.DataFrame,
-    x_col: str,
-    y_label: str,
-    title: str,
-    orientation: str,
-    show_labels: bool,
-    x_label_angle: int,
-    log_scale: bool,
-    # --- color controls ---
-    color_mode: str,            # "Single", "By X category", "By value"
-    single_color: str | None,   # hex string like "#4C78A8"
-    palette: str | None,        # e.g., "tableau10", "viridis"
-    reverse_palette: bool,
-    show_legend: bool,
-):
-    # orientation encodings
-    if orientation == "Vertical":
-        x_enc = alt.X(f"{x_col}:N", title=x_col, axis=alt.Axis(labelAngle=x_label_angle))
-        y_enc = alt.Y("value:Q", title=y_label, scale=alt.Scale(type="log") if log_scale else alt.Scale())
-    else:
-        x_enc = alt.X("value:Q", title=y_label, scale=alt.Scale(type="log") if log_scale else alt.Scale())
-        y_enc = alt.Y(f"{x_col}:N", title=x_col)
-
-    # base encodings
-    base = alt.Chart(grouped).encode(
-        x=x_enc,
-        y=y_enc,
-        tooltip=[alt.Tooltip(f"{x_col}:N", title=x_col), alt.Tooltip("value:Q", title=y_label)],
-    )
-
-    # color encodings
-    color_kw = {}
-    if color_mode == "Single":
-        # apply a single bar color via mark_bar(color=...)
-        bars = base.mark_bar(color=single_color or "#4C78A8")
-    elif color_mode == "By X category":
-        # color by the category on x-axis (nominal)
-        c = alt.Color(
-            f"{x_col}:N",
-            legend=alt.Legend() if show_legend else None,
-            scale=alt.Scale(scheme=palette or "tableau10", reverse=reverse_palette),
-        )
-        bars = base.mark_bar().encode(color=c)
-    else:  # "By value"
-        c = alt.Color(
-            "value:Q",
-            legend=alt.Legend() if show_legend else None,
-            scale=alt.Scale(scheme=palette or "viridis", reverse=reverse_palette),
-        )
-        bars = base.mark_bar().encode(color=c)
-
-    chart = bars
+backend = session_backend(st.session_state)
 
-    if show_labels:
-        if orientation == "Vertical":
-            text = base.mark_text(dy=-6).encode(text="value:Q")
-        else:
-            text = base.mark_text(dx=6, align="left").encode(text="value:Q")
-        # Keep text uncolored for readability
-        chart = bars + text
-
-    chart = chart.properties(height=360, title=title).interactive()
-    st.altair_chart(chart, use_container_width=True)
-    return chart
+def aggregate(x_col: str, y_col: str | None, agg: str, remove_nulls: bool) -> pd.DataFrame:
+    """Aggregate the full dataset: as SQL on the on-disk backend if there is one, else on the compute engine."""
+    if backend is None:
+        return aggregate_for_bar(df, x_col, y_col, agg, remove_nulls)
+    with timer("aggregate_for_bar", rows=backend.n_rows):
+        return backend.aggregate_for_bar(x_col, y_col, agg, remove_nulls)
 
 def default_config(cat_cols: list[str], num_cols: list[str]) -> dict:
-    return {
-        "x_col": cat_cols[0] if cat_cols else None,
-        "y_col": num_cols[0] if num_cols else None,
-        "agg": "sum",
-        "sort_by": "value",
-        "ascending": False,
-        "top_n": 20,
-        "remove_nulls": True,
-        "title": "",
-        "x_label": "",
-        "y_label": "",
-        "orientation": "Vertical",   # or "Horizontal"
-        "show_labels": False,
-        "x_label_angle": 0,
-        "log_scale": False,
-        # --- new color controls defaults ---
-        "color_mode": "Single",         # "Single", "By X category", "By value"
-        "single_color": "#4C78A8",      # matches Altair default blue
-        "palette": "tableau10",         # discrete default
-        "reverse_palette": False,
-        "show_legend": True,
-    }
+    return bar_defaults(cat_cols[0] if cat_cols else None, num_cols[0] if num_cols else None)
 
 # -------------------- Session State for chart configs --------------------
 cat_cols = selectable_categorical_columns(df)
@@ -167,6 +74,214 @@ with t2:
 
 st.caption("Tip: You can duplicate any chart with its full configuration via **Copy visual**.")
 
+# -------------------- Per-chart pipeline --------------------
+# Each chart is a small stage graph (utils.reactive): only stages whose config keys or
+# upstream stages changed are recomputed, so e.g. a title edit reuses the aggregation.
+def _aggregate_stage(cfg: dict) -> pd.DataFrame:
+    return aggregate(cfg["x_col"], None if cfg["agg"] == "count" else cfg["y_col"], cfg["agg"], cfg["remove_nulls"])
+
+def _top_stage(cfg: dict, grouped: pd.DataFrame) -> pd.DataFrame:
+    return top_bars(grouped, cfg["x_col"], sort_by=cfg["sort_by"], ascending=cfg["ascending"], top_n=cfg["top_n"])
+
+def _labels_stage(cfg: dict) -> dict:
+    y_label_default = bar_value_label(cfg["agg"], cfg["y_col"])
+    return {
+        "title": cfg["title"] or f"{y_label_default} by {cfg['x_col']} (Top {cfg['top_n']})",
+        "y_label": cfg["y_label"] or y_label_default,
+    }
+
+def _chart_stage(cfg: dict, grouped: pd.DataFrame, labels: dict):
+    if not alt:
+        return None
+    return build_altair_bar(
+        grouped,
+        x_col=cfg["x_col"],
+        y_label=labels["y_label"],
+        title=labels["title"],
+        orientation=cfg["orientation"],
+        show_labels=cfg["show_labels"],
+        x_label_angle=int(cfg["x_label_angle"]),
+        log_scale=bool(cfg["log_scale"]),
+        # color params
+        color_mode=cfg["color_mode"],
+        single_color=cfg.get("single_color"),
+        palette=cfg.get("palette"),
+        reverse_palette=bool(cfg.get("reverse_palette", False)),
+        show_legend=bool(cfg.get("show_legend", True)),
+    )
+
+def _spec_stage(cfg: dict, chart) -> str | None:
+    return json.dumps(altair_chart_spec(chart), indent=2) if chart is not None else None
+
+def _csv_stage(cfg: dict, grouped: pd.DataFrame) -> bytes:
+    return grouped.to_csv(index=False).encode("utf-8")
+
+BAR_DATA_KEYS = ("x_col", "y_col", "agg", "remove_nulls")
+BAR_ORDER_KEYS = ("sort_by", "ascending", "top_n")
+BAR_STYLE_KEYS = ("orientation", "show_labels", "x_label_angle", "log_scale",
+                  "color_mode", "single_color", "palette", "reverse_palette", "show_legend")
+BAR_GRAPH = StageGraph([
+    Stage("aggregate", BAR_DATA_KEYS, (), _aggregate_stage),
+    Stage("top", ("x_col",) + BAR_ORDER_KEYS, ("aggregate",), _top_stage),
+    Stage("labels", ("x_col", "y_col", "agg", "top_n", "title", "y_label"), (), _labels_stage),
+    Stage("chart", ("x_col",) + BAR_STYLE_KEYS, ("top", "labels"), _chart_stage),
+    Stage("spec", (), ("chart",), _spec_stage),
+    Stage("csv", (), ("top",), _csv_stage),
+])
+
+# Stage memos per chart id; a different dataset or filter set invalidates them. The token names
+# them by value: filtered frames are evicted and rebuilt, so their id() may be reused by another one
+for cfg in configs:
+    cfg.setdefault("id", uuid.uuid4().hex)
+memos: dict[str, dict] = st.session_state.setdefault("bar_chart_memos", {})
+for chart_id in set(memos) - {cfg["id"] for cfg in configs}:
+    del memos[chart_id]
+data_token = (st.session_state.get("dataset_key"), frozenset(st.session_state.get(FILTERS_KEY, [])),
+              backend is not None)
+
+@st.fragment
+def chart_panel(idx: int) -> None:
+    """Controls and output of chart `idx`; its widgets rerun only this fragment."""
+    configs = st.session_state["bar_chart_configs"]
+    if idx >= len(configs):
+        return
+    cfg = configs[idx]
+    st.subheader(f"Chart {idx+1}")
+
+    # --- Controls (two columns) ---
+    cc1, cc2 = st.columns(2)
+    with cc1:
+        cfg["x_col"] = st.selectbox(
+            "X (categorical)", cat_cols,
+            index=(cat_cols.index(cfg["x_col"]) if cfg["x_col"] in cat_cols else 0),
+            key=f"x_{idx}", help="Categorical / low-cardinality column for grouping."
+        )
+        # y_col optional only when agg == count
+        y_opts = ["<none> (for count)"] + num_cols
+        selected_y = cfg["y_col"] if cfg["y_col"] in num_cols else "<none> (for count)"
+        y_sel = st.selectbox(
+            "Y (numeric)", y_opts,
+            index=(y_opts.index(selected_y) if selected_y in y_opts else 0),
+            key=f"y_{idx}", help="Numeric column to aggregate; choose <none> for count."
+        )
+        cfg["y_col"] = None if y_sel.startswith("<none>") else y_sel
+
+        cfg["agg"] = st.selectbox(
+            "Aggregation", ["sum", "mean", "median", "min", "max", "count", "nunique(y)"],
+            index=(["sum", "mean", "median", "min", "max", "count", "nunique(y)"].index(cfg["agg"])
+                   if cfg["agg"] in ["sum","mean","median","min","max","count","nunique(y)"] else 0),
+            key=f"agg_{idx}"
+        )
+
+        cfg["top_n"] = st.number_input("Top N", min_value=1, max_value=200,
+                                       value=int(cfg["top_n"]), step=1, key=f"topn_{idx}")
+        cfg["remove_nulls"] = st.checkbox("Remove nulls in X/Y", value=bool(cfg["remove_nulls"]),
+                                          key=f"nulls_{idx}")
+
+    with cc2:
+        cfg["sort_by"] = st.selectbox("Sort by", ["value", "x"],
+                                      index=(0 if cfg["sort_by"]=="value" else 1), key=f"sort_{idx}")
+        cfg["ascending"] = st.checkbox("Ascending sort", value=bool(cfg["ascending"]), key=f"asc_{idx}")
+        cfg["orientation"] = st.selectbox("Orientation", ["Vertical", "Horizontal"],
+                                          index=(0 if cfg["orientation"]=="Vertical" else 1), key=f"ori_{idx}")
+        cfg["show_labels"] = st.checkbox("Show data labels", value=bool(cfg["show_labels"]),
+                                         key=f"labels_{idx}")
+        cfg["x_label_angle"] = st.slider("X label angle", 0, 90, int(cfg["x_label_angle"]),
+                                         step=5, key=f"angle_{idx}")
+        cfg["log_scale"] = st.checkbox("Log scale (value)", value=bool(cfg["log_scale"]), key=f"log_{idx}")
+
+    # --- Title & Axis labels ---
+    cfg["title"] = st.text_input("Chart title (optional)", value=cfg["title"], key=f"title_{idx}")
+    cfg["x_label"] = st.text_input("X-axis label (optional)", value=cfg["x_label"], key=f"xlab_{idx}")
+    cfg["y_label"] = st.text_input("Y-axis label (optional)", value=cfg["y_label"], key=f"ylab_{idx}")
+
+    # --- Color controls (dynamic) ---
+    with st.expander("🎨 Appearance · Colors", expanded=False):
+        cfg["color_mode"] = st.selectbox(
+            "Color mode",
+            ["Single", "By X category", "By value"],
+            index=(["Single","By X category","By value"].index(cfg["color_mode"])
+                   if cfg.get("color_mode") in ["Single","By X category","By value"] else 0),
+            key=f"c_mode_{idx}",
+            help="Single = one color; By X category = separate color per category; By value = gradient by aggregated value."
+        )
+
+        # sensible palette shortlist
+        discrete_palettes = ["tableau10", "category10", "set2", "set3", "paired", "pastel1", "pastel2"]
+        continuous_palettes = ["viridis", "plasma", "magma", "inferno", "blues", "greens", "reds", "purples"]
+        if cfg["color_mode"] == "Single":
+            cfg["single_color"] = st.color_picker("Bar color", value=cfg.get("single_color", "#4C78A8"),
+                                                  key=f"c_single_{idx}")
+            cfg["show_legend"] = False
+        elif cfg["color_mode"] == "By X category":
+            cfg["palette"] = st.selectbox("Palette (discrete)", discrete_palettes,
+                                          index=(discrete_palettes.index(cfg.get("palette","tableau10"))
+                                                 if cfg.get("palette") in discrete_palettes else 0),
+                                          key=f"c_pal_disc_{idx}")
+            cfg["reverse_palette"] = st.checkbox("Reverse palette", value=bool(cfg.get("reverse_palette", False)),
+                                                 key=f"c_rev_{idx}")
+            cfg["show_legend"] = st.checkbox("Show legend", value=bool(cfg.get("show_legend", True)),
+                                             key=f"c_leg_{idx}")
+        else:  # By value
+            cfg["palette"] = st.selectbox("Palette (continuous)", continuous_palettes,
+                                          index=(continuous_palettes.index(cfg.get("palette","viridis"))
+                                                 if cfg.get("palette") in continuous_palettes else 0),
+                                          key=f"c_pal_cont_{idx}")
+            cfg["reverse_palette"] = st.checkbox("Reverse palette", value=bool(cfg.get("reverse_palette", False)),
+                                                 key=f"c_rev_{idx}")
+            cfg["show_legend"] = st.checkbox("Show legend", value=bool(cfg.get("show_legend", True)),
+                                             key=f"c_leg_{idx}")
+
+    # --- Aggregate, sort & build (only the stages whose inputs changed) ---
+    if cfg["agg"] != "count" and cfg["y_col"] is None:
+        st.error("Select a Y column for nunique(y)." if cfg["agg"] == "nunique(y)"
+                 else "Select a Y column for this aggregation.")
+    else:
+        out, _ = BAR_GRAPH.run(memos.setdefault(cfg["id"], {}), cfg, token=data_token)
+        grouped, chart = out["top"], out["chart"]
+
+        # render
+        if chart is not None:
+            render_altair_chart(chart, use_container_width=True)
+        else:
+            st.info("Altair not installed; showing basic bar chart.")
+            st.caption(out["labels"]["title"])
+            st.bar_chart(grouped.set_index(cfg["x_col"])["value"])  # Streamlit native lacks horizontal
+
+        # --- Actions: data & spec export ---
+        a1, a2, a3 = st.columns(3)
+        with a1:
+            st.download_button("⬇️ Download CSV", out["csv"],
+                               file_name=f"bar_chart_{idx+1}.csv",
+                               mime="text/csv", key=f"csv_{idx}")
+        with a2:
+            if out["spec"] is not None:
+                st.download_button("⬇️ Vega-Lite JSON", out["spec"],
+                                   file_name=f"bar_chart_{idx+1}.json",
+                                   mime="application/json", key=f"json_{idx}")
+            else:
+                st.caption("Install Altair for JSON export.")
+        with a3:
+            if st.button("📋 Copy visual", key=f"copy_{idx}"):
+                if len(configs) < max_charts:
+                    new_cfg = {k: (v.copy() if isinstance(v, dict) else v) for k, v in cfg.items()}
+                    new_cfg["id"] = uuid.uuid4().hex
+                    configs.insert(idx + 1, new_cfg)
+                    st.rerun()
+                else:
+                    st.warning(f"Maximum of {max_charts} charts reached.", icon="⚠️")
+
+        # --- Image Export (PNG-only via reusable component) ---
+        if chart is not None:
+            export_controls_altair_png(chart, key_suffix=str(idx))
+        else:
+            st.caption("Install Altair to enable image export.")
+
+    # remove button
+    if st.button("🗑️ Remove this chart", key=f"del_{idx}"):
+        del configs[idx]
+        st.rerun()
+
 # -------------------- Render grid (2 per row) --------------------
 if not configs:
     st.info("No charts configured. Click **Add chart** to start.")
@@ -178,190 +293,8 @@ else:
         for col in (cL, cR):
             if idx >= len(configs):
                 break
-            cfg = configs[idx]
-
             with col:
-                st.subheader(f"Chart {idx+1}")
-
-                # --- Controls (two columns) ---
-                cc1, cc2 = st.columns(2)
-                with cc1:
-                    cfg["x_col"] = st.selectbox(
-                        "X (categorical)", cat_cols,
-                        index=(cat_cols.index(cfg["x_col"]) if cfg["x_col"] in cat_cols else 0),
-                        key=f"x_{idx}", help="Categorical / low-cardinality column for grouping."
-                    )
-                    # y_col optional only when agg == count
-                    y_opts = ["<none> (for count)"] + num_cols
-                    selected_y = cfg["y_col"] if cfg["y_col"] in num_cols else "<none> (for count)"
-                    y_sel = st.selectbox(
-                        "Y (numeric)", y_opts,
-                        index=(y_opts.index(selected_y) if selected_y in y_opts else 0),
-                        key=f"y_{idx}", help="Numeric column to aggregate; choose <none> for count."
-                    )
-                    cfg["y_col"] = None if y_sel.startswith("<none>") else y_sel
-
-                    cfg["agg"] = st.selectbox(
-                        "Aggregation", ["sum", "mean", "median", "min", "max", "count", "nunique(y)"],
-                        index=(["sum", "mean", "median", "min", "max", "count", "nunique(y)"].index(cfg["agg"])
-                               if cfg["agg"] in ["sum","mean","median","min","max","count","nunique(y)"] else 0),
-                        key=f"agg_{idx}"
-                    )
-
-                    cfg["top_n"] = st.number_input("Top N", min_value=1, max_value=200,
-                                                   value=int(cfg["top_n"]), step=1, key=f"topn_{idx}")
-                    cfg["remove_nulls"] = st.checkbox("Remove nulls in X/Y", value=bool(cfg["remove_nulls"]),
-                                                      key=f"nulls_{idx}")
-
-                with cc2:
-                    cfg["sort_by"] = st.selectbox("Sort by", ["value", "x"],
-                                                  index=(0 if cfg["sort_by"]=="value" else 1), key=f"sort_{idx}")
-                    cfg["ascending"] = st.checkbox("Ascending sort", value=bool(cfg["ascending"]), key=f"asc_{idx}")
-                    cfg["orientation"] = st.selectbox("Orientation", ["Vertical", "Horizontal"],
-                                                      index=(0 if cfg["orientation"]=="Vertical" else 1), key=f"ori_{idx}")
-                    cfg["show_labels"] = st.checkbox("Show data labels", value=bool(cfg["show_labels"]),
-                                                     key=f"labels_{idx}")
-                    cfg["x_label_angle"] = st.slider("X label angle", 0, 90, int(cfg["x_label_angle"]),
-                                                     step=5, key=f"angle_{idx}")
-                    cfg["log_scale"] = st.checkbox("Log scale (value)", value=bool(cfg["log_scale"]), key=f"log_{idx}")
-
-                # --- Title & Axis labels ---
-                cfg["title"] = st.text_input("Chart title (optional)", value=cfg["title"], key=f"title_{idx}")
-                cfg["x_label"] = st.text_input("X-axis label (optional)", value=cfg["x_label"], key=f"xlab_{idx}")
-                cfg["y_label"] = st.text_input("Y-axis label (optional)", value=cfg["y_label"], key=f"ylab_{idx}")
-
-                # --- Color controls (dynamic) ---
-                with st.expander("🎨 Appearance · Colors", expanded=False):
-                    cfg["color_mode"] = st.selectbox(
-                        "Color mode",
-                        ["Single", "By X category", "By value"],
-                        index=(["Single","By X category","By value"].index(cfg["color_mode"])
-                               if cfg.get("color_mode") in ["Single","By X category","By value"] else 0),
-                        key=f"c_mode_{idx}",
-                        help="Single = one color; By X category = separate color per category; By value = gradient by aggregated value."
-                    )
-
-                    # sensible palette shortlist
-                    discrete_palettes = ["tableau10", "category10", "set2", "set3", "paired", "pastel1", "pastel2"]
-                    continuous_palettes = ["viridis", "plasma", "magma", "inferno", "blues", "greens", "reds", "purples"]
-                    if cfg["color_mode"] == "Single":
-                        cfg["single_color"] = st.color_picker("Bar color", value=cfg.get("single_color", "#4C78A8"),
-                                                              key=f"c_single_{idx}")
-                        cfg["show_legend"] = False
-                    elif cfg["color_mode"] == "By X category":
-                        cfg["palette"] = st.selectbox("Palette (discrete)", discrete_palettes,
-                                                      index=(discrete_palettes.index(cfg.get("palette","tableau10"))
-                                                             if cfg.get("palette") in discrete_palettes else 0),
-                                                      key=f"c_pal_disc_{idx}")
-                        cfg["reverse_palette"] = st.checkbox("Reverse palette", value=bool(cfg.get("reverse_palette", False)),
-                                                             key=f"c_rev_{idx}")
-                        cfg["show_legend"] = st.checkbox("Show legend", value=bool(cfg.get("show_legend", True)),
-                                                         key=f"c_leg_{idx}")
-                    else:  # By value
-                        cfg["palette"] = st.selectbox("Palette (continuous)", continuous_palettes,
-                                                      index=(continuous_palettes.index(cfg.get("palette","viridis"))
-                                                             if cfg.get("palette") in continuous_palettes else 0),
-                                                      key=f"c_pal_cont_{idx}")
-                        cfg["reverse_palette"] = st.checkbox("Reverse palette", value=bool(cfg.get("reverse_palette", False)),
-                                                             key=f"c_rev_{idx}")
-                        cfg["show_legend"] = st.checkbox("Show legend", value=bool(cfg.get("show_legend", True)),
-                                                         key=f"c_leg_{idx}")
-
-                # --- Aggregate & sort ---
-                if cfg["agg"] == "count":
-                    grouped = aggregate_for_bar(df, cfg["x_col"], None, cfg["agg"], cfg["remove_nulls"])
-                    y_label_default = "count"
-                elif cfg["agg"] == "nunique(y)":
-                    if cfg["y_col"] is None:
-                        st.error("Select a Y column for nunique(y).")
-                        grouped = None
-                    else:
-                        grouped = aggregate_for_bar(df, cfg["x_col"], cfg["y_col"], cfg["agg"], cfg["remove_nulls"])
-                        y_label_default = "nunique"
-                else:
-                    if cfg["y_col"] is None:
-                        st.error("Select a Y column for this aggregation.")
-                        grouped = None
-                    else:
-                        grouped = aggregate_for_bar(df, cfg["x_col"], cfg["y_col"], cfg["agg"], cfg["remove_nulls"])
-                        y_label_default = f"{cfg['agg']}({cfg['y_col']})"
-
-                if grouped is not None:
-                    # sort and top-N
-                    if cfg["sort_by"] == "value":
-                        grouped = grouped.sort_values("value", ascending=bool(cfg["ascending"]))
-                    else:
-                        grouped = grouped.sort_values(cfg["x_col"], ascending=bool(cfg["ascending"]),
-                                                      key=lambda s: s.astype(str))
-                    grouped = grouped.head(int(cfg["top_n"]))
-
-                    # resolve labels
-                    title = cfg["title"] or f"{y_label_default} by {cfg['x_col']} (Top {cfg['top_n']})"
-                    x_axis_label = cfg["x_label"] or cfg["x_col"]
-                    y_axis_label = cfg["y_label"] or y_label_default
-
-                    # render
-                    if alt:
-                        chart = build_altair_bar(
-                            grouped,
-                            x_col=cfg["x_col"],
-                            y_label=y_axis_label,
-                            title=title,
-                            orientation=cfg["orientation"],
-                            show_labels=cfg["show_labels"],
-                            x_label_angle=int(cfg["x_label_angle"]),
-                            log_scale=bool(cfg["log_scale"]),
-                            # color params
-                            color_mode=cfg["color_mode"],
-                            single_color=cfg.get("single_color"),
-                            palette=cfg.get("palette"),
-                            reverse_palette=bool(cfg.get("reverse_palette", False)),
-                            show_legend=bool(cfg.get("show_legend", True)),
-                        )
-                    else:
-                        st.info("Altair not installed; showing basic bar chart.")
-                        st.caption(title)
-                        chart = None
-                        if cfg["orientation"] == "Vertical":
-                            st.bar_chart(grouped.set_index(cfg["x_col"])["value"])
-                        else:
-                            st.bar_chart(grouped.set_index(cfg["x_col"])["value"])  # Streamlit native lacks horizontal
-
-                    # --- Actions: data & spec export ---
-                    a1, a2, a3 = st.columns(3)
-                    with a1:
-                        csv = grouped.to_csv(index=False).encode("utf-8")
-                        st.download_button("⬇️ Download CSV", csv,
-                                           file_name=f"bar_chart_{idx+1}.csv",
-                                           mime="text/csv", key=f"csv_{idx}")
-                    with a2:
-                        if alt and chart is not None:
-                            spec = chart.to_json()
-                            st.download_button("⬇️ Vega-Lite JSON", spec,
-                                               file_name=f"bar_chart_{idx+1}.json",
-                                               mime="application/json", key=f"json_{idx}")
-                        else:
-                            st.caption("Install Altair for JSON export.")
-                    with a3:
-                        if st.button("📋 Copy visual", key=f"copy_{idx}"):
-                            if len(configs) < max_charts:
-                                new_cfg = {k: (v.copy() if isinstance(v, dict) else v) for k, v in cfg.items()}
-                                configs.insert(idx + 1, new_cfg)
-                                st.rerun()
-                            else:
-                                st.warning(f"Maximum of {max_charts} charts reached.", icon="⚠️")
-
-                    # --- Image Export (PNG-only via reusable component) ---
-                    if alt and chart is not None:
-                        export_controls_altair_png(chart, key_suffix=str(idx))
-                    else:
-                        st.caption("Install Altair to enable image export.")
-
-                # remove button
-                if st.button("🗑️ Remove this chart", key=f"del_{idx}"):
-                    del configs[idx]
-                    st.rerun()
-
+                chart_panel(idx)
             idx += 1
 
 # Persist updates
@@ -2,33 +2,33 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 
-from utils.visual_components import export_controls_altair_png
-
-try:
-    import altair as alt
-except Exception:
-    alt = None
+from utils.visual_components import export_controls_altair_png, render_altair_chart
+from utils.sampling import dataset_sampler
+from utils.duckdb_backend import session_backend
+from utils.perf import timer
+from dv_core.charts import (
+    build_histogram, build_value_counts_chart, default_bins, is_categorical, value_counts_frame, with_percent,
+)
+from utils.lazy_imports import lazy_import
+from utils.filters import filtered_dataset
+
+alt = lazy_import("altair")  # imported on first use; None if not installed
 
 st.set_page_config(page_title="Visualization · Distribution", page_icon="📈", layout="wide")
 st.title("📈 Visualization → Distribution")
 
 # -------------------- Data --------------------
-df: pd.DataFrame | None = st.session_state.get("uploaded_df")
+df: pd.DataFrame | None = filtered_dataset(st.session_state)  # global filters applied
 if df is None:
     st.warning("⚠️ No dataset found. Please upload one first from the **Upload Dataset** page.")
     st.stop()
 
-# -------------------- Helpers --------------------
-CAT_INCLUDE_DTYPES = ["object", "category", "bool"]
+# On-disk datasets: counts/bins come from the full table, other layers from the session sample
+backend = session_backend(st.session_state)
 
-def is_categorical(series: pd.Series, low_card_threshold: int) -> bool:
-    if str(series.dtype) in CAT_INCLUDE_DTYPES:
-        return True
-    if pd.api.types.is_numeric_dtype(series):
-        return series.nunique(dropna=True) <= low_card_threshold
-    if pd.api.types.is_datetime64_any_dtype(series):
-        return series.nunique(dropna=True) <= low_card_threshold
-    return False
+# -------------------- Helpers --------------------
+# Density (KDE) and rug layers are computed in the browser; beyond this many rows they use a sample
+BROWSER_LAYER_SAMPLE_ROWS = 5000
 
 # -------------------- Controls (MAIN BODY) --------------------
 st.subheader("Controls")
@@ -77,10 +77,14 @@ with st.expander("⚙️ Advanced preprocessing (numeric only)", expanded=False)
     else:
         winsor, p_low, p_high = False, 1.0, 99.0
 
-# Prepare working series
-x = col_s.copy()
+# Prepare working series (x_pos: dataset row position of each entry in x)
+sampler = dataset_sampler(df)
 if drop_na:
-    x = x.dropna()
+    x_pos = sampler.valid_positions([target_col])
+    x = col_s.iloc[x_pos]
+else:
+    x_pos = np.arange(len(col_s))
+    x = col_s
 
 if chart_type.startswith("Histogram") and winsor and pd.api.types.is_numeric_dtype(x):
     lo = np.nanpercentile(x.values, p_low)
@@ -94,13 +98,11 @@ if chart_type.startswith("Bar"):
     st.subheader(f"Distribution of **{target_col}** (categorical)")
 
     # value counts frame
-    counts = (
-        x.value_counts(dropna=False)
-        .rename_axis(target_col)
-        .reset_index(name="count")
-    )
-    total = counts["count"].sum()
-    counts["percent"] = (counts["count"] / total * 100).round(2)
+    with timer("value counts", rows=backend.n_rows if backend is not None else len(x)):
+        if backend is not None:
+            counts = with_percent(backend.value_counts(target_col, dropna=drop_na))
+        else:
+            counts = value_counts_frame(x, target_col)
 
     # Sorting / Top-N
     c1, c2, c3 = st.columns(3)
@@ -137,29 +139,15 @@ if chart_type.startswith("Bar"):
 
     # Build chart OUTSIDE expander
     if alt:
-        x_enc = alt.X(f"{target_col}:N", title=target_col, axis=alt.Axis(labelAngle=0))
-        y_enc = alt.Y("count:Q", title="Count")
-        base = alt.Chart(counts).encode(
-            x=x_enc, y=y_enc,
-            tooltip=[
-                alt.Tooltip(f"{target_col}:N", title=target_col),
-                alt.Tooltip("count:Q", title="Count"),
-                alt.Tooltip("percent:Q", title="Percent"),
-            ]
+        chart = build_value_counts_chart(
+            counts, target_col,
+            color_mode=color_mode,
+            single_color=single_color,
+            palette=palette,
+            reverse_palette=reverse_palette,
+            show_legend=show_legend,
         )
-        if color_mode == "Single":
-            bars = base.mark_bar(color=single_color)
-        else:
-            bars = base.mark_bar().encode(
-                color=alt.Color(
-                    f"{target_col}:N",
-                    legend=alt.Legend() if show_legend else None,
-                    scale=alt.Scale(scheme=palette, reverse=reverse_palette),
-                )
-            )
-        title = f"Value counts of {target_col}"
-        chart = bars.properties(height=360, title=title).interactive()
-        st.altair_chart(chart, use_container_width=True)
+        render_altair_chart(chart, use_container_width=True)
 
         with st.expander("🔎 Data table"):
             st.dataframe(counts, use_container_width=True)
@@ -179,9 +167,8 @@ else:
     n_unique = x.nunique(dropna=True)
     h1, h2, h3, h4 = st.columns(4)
     with h1:
-        default_bins = min(30, max(10, int(np.sqrt(max(n_unique, 1)))))
         bins = st.number_input(
-            "Bins", min_value=5, max_value=200, value=default_bins, step=1, help="Number of histogram bins",
+            "Bins", min_value=5, max_value=200, value=default_bins(n_unique), step=1, help="Number of histogram bins",
             key=f"hist_bins_{target_col}"
         )
     with h2:
@@ -199,67 +186,35 @@ else:
 
     # Build chart OUTSIDE expander
     if alt:
-        hist_df = pd.DataFrame({target_col: x})
-        base = alt.Chart(hist_df)
-
-        # Histogram layer (handle normalization)
-        y_title = {"count": "Count", "density": "Density", "percent": "Percent"}[norm]
-
-        if norm == "count":
-            hist = (
-                base.mark_bar(color=bar_color)
-                .encode(
-                    x=alt.X(f"{target_col}:Q", bin=alt.Bin(maxbins=int(bins)), title=target_col),
-                    y=alt.Y("count()", title=y_title),
-                    tooltip=[
-                        alt.Tooltip(f"{target_col}:Q", bin=alt.Bin(maxbins=int(bins)), title="Range"),
-                        alt.Tooltip("count():Q", title="Count"),
-                    ],
-                )
-            )
-        elif norm == "percent":
-            hist = (
-                base.transform_bin("binned", field=target_col, maxbins=int(bins))
-                    .transform_aggregate(count="count()", groupby=["binned"])
-                    .transform_joinaggregate(total="sum(count)")
-                    .transform_calculate(percent="100 * datum.count / datum.total")
-                    .mark_bar(color=bar_color)
-                    .encode(
-                        x=alt.X("binned:Q", bin=alt.Bin(maxbins=int(bins)), title=target_col),
-                        y=alt.Y("percent:Q", title=y_title),
-                    )
-            )
-        else:  # density (keep bar counts for shape; density line overlays)
-            hist = (
-                base.mark_bar(color=bar_color)
-                .encode(
-                    x=alt.X(f"{target_col}:Q", bin=alt.Bin(maxbins=int(bins)), title=target_col),
-                    y=alt.Y("count()", title=y_title),
-                )
-            )
-
-        layers = [hist]
-
-        if show_density:
-            dens = (
-                base.transform_density(target_col, as_=[target_col, 'density'])
-                    .mark_line(stroke=density_color, strokeWidth=2)
-                    .encode(
-                        x=f"{target_col}:Q",
-                        y="density:Q",
-                        tooltip=[alt.Tooltip("density:Q", title="Density")]
-                    )
-            )
-            layers.append(dens)
-
-        if show_rug:
-            rug = base.mark_tick(opacity=0.35, thickness=1).encode(x=f"{target_col}:Q", y=alt.value(0))
-            layers.append(rug)
-
-        chart = alt.layer(*layers).properties(height=360, title=f"Histogram of {target_col}").interactive()
-        st.altair_chart(chart, use_container_width=True)
+        binned = None
+        if backend is not None and backend.is_numeric(target_col):
+            # Pre-binned over the full on-disk table
+            clip = tuple(backend.quantiles(target_col, [p_low / 100, p_high / 100])) if winsor else None
+            with timer("duckdb histogram", rows=backend.n_rows):
+                binned = backend.histogram(target_col, int(bins), clip)
+
+        # Density and rug use the shared deterministic sample on large columns
+        layer_data = None
+        if len(x) > BROWSER_LAYER_SAMPLE_ROWS:
+            sample_pos = sampler.positions(BROWSER_LAYER_SAMPLE_ROWS, valid=[target_col])
+            layer_data = pd.DataFrame({target_col: x.iloc[np.searchsorted(x_pos, sample_pos)]})
+
+        chart = build_histogram(
+            x, target_col,
+            bins=int(bins),
+            norm=norm,
+            bar_color=bar_color,
+            binned=binned,
+            layer_data=layer_data,
+            show_density=show_density,
+            density_color=density_color,
+            show_rug=show_rug,
+        )
+        render_altair_chart(chart, use_container_width=True)
 
         with st.expander("🧮 Summary stats"):
+            if backend is not None:
+                st.caption(f"Computed on a {len(df):,}-row sample of {backend.n_rows:,} rows.")
             desc = x.describe(percentiles=[0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]).to_frame("value")
             st.dataframe(desc, use_container_width=True)
 
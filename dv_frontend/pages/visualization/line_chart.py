@@ -2,18 +2,23 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 
-from utils.visual_components import export_controls_altair_png
-
-try:
-    import altair as alt
-except Exception:
-    alt = None
+from utils.visual_components import export_controls_altair_png, render_altair_chart
+from utils.sampling import sample_positions
+from utils.duckdb_backend import session_backend
+from utils.line_prep import finish_line_data, resample_if_needed, select_line_rows
+from utils.perf import timer
+from utils.time_index import time_range_slider
+from dv_core.charts import build_line_chart
+from utils.lazy_imports import lazy_import
+from utils.filters import filtered_dataset
+
+alt = lazy_import("altair")  # imported on first use; None if not installed
 
 st.set_page_config(page_title="Visualization · Line Chart", page_icon="📈", layout="wide")
 st.title("📈 Visualization → Line Chart")
 
 # -------------------- Data --------------------
-df: pd.DataFrame | None = st.session_state.get("uploaded_df")
+df: pd.DataFrame | None = filtered_dataset(st.session_state)  # global filters applied
 if df is None:
     st.warning("⚠️ No dataset found. Please upload one first from the **Upload Dataset** page.")
     st.stop()
@@ -23,11 +28,11 @@ def datetime_cols(data: pd.DataFrame) -> list[str]:
     dt = data.select_dtypes(include=["datetime64[ns]", "datetime64[ns, UTC]"]).columns.tolist()
     # also suggest object columns that *look* like datetimes (heuristic: try few rows)
     for c in data.select_dtypes(include=["object"]).columns:
-        s = data[c].dropna().astype(str)
-        if s.empty:
+        pos = sample_positions(data, 20, valid=[c])  # small, cached sample of non-null rows
+        if len(pos) == 0:
             continue
         try:
-            pd.to_datetime(s.sample(min(20, len(s))), errors="raise")  # try small sample
+            pd.to_datetime(data[c].iloc[pos].astype(str), errors="raise")
             if c not in dt:
                 dt.append(c)
         except Exception:
@@ -42,13 +47,6 @@ def categorical_cols(data: pd.DataFrame, max_unique_numeric_as_cat: int = 30) ->
     low_card_num = [c for c in numeric_cols(data) if data[c].nunique(dropna=True) <= max_unique_numeric_as_cat]
     return sorted(list(dict.fromkeys(base + low_card_num)))
 
-def maybe_to_datetime(series: pd.Series, do_parse: bool) -> pd.Series:
-    if pd.api.types.is_datetime64_any_dtype(series):
-        return series
-    if do_parse:
-        return pd.to_datetime(series, errors="coerce")
-    return series
-
 # -------------------- Controls (MAIN BODY) --------------------
 st.subheader("Controls")
 c1, c2, c3 = st.columns([2.2, 2.2, 2.2])
@@ -91,6 +89,11 @@ with r3:
 with r4:
     topn_groups = st.number_input("Top N groups (if grouped)", min_value=1, max_value=100, value=10, step=1, key="line_topn")
 
+layout = st.radio(
+    "Data layout", ["Wide (fold in chart)", "Long (melt on server)"], index=0, horizontal=True, key="line_layout",
+    help="Wide sends one row per X value and lets Vega-Lite fold the Y columns; Long melts on the server first.",
+)
+
 # Appearance controls
 with st.expander("🎨 Appearance · Style", expanded=False):
     a1, a2, a3, a4 = st.columns(4)
@@ -117,138 +120,58 @@ if not y_cols:
     st.info("Select at least one numeric Y column.")
     st.stop()
 
-work = df[[x_col] + y_cols + ([group_col] if group_col else [])].copy()
-
-# Parse/convert X
-work[x_col] = maybe_to_datetime(work[x_col], do_parse=is_time)
-
-# Handle missing X or Y rows
-if missing == "drop":
-    work = work.dropna(subset=[x_col] + y_cols)
+backend = session_backend(st.session_state)
+pushdown = backend is not None and is_time and freq != "Auto (no resample)"
+
+if pushdown:
+    # On-disk dataset: bucket the full table in SQL (incl. top-N groups and dropping missing);
+    # the pandas resample below then only relabels buckets and adds empty periods
+    with timer("duckdb time buckets", rows=backend.n_rows):
+        work = backend.time_buckets(
+            x_col, y_cols, freq, agg,
+            group_col=group_col,
+            top_n_groups=int(topn_groups) if group_col else None,
+            drop_missing=(missing == "drop"),
+        )
 else:
-    # keep rows; we'll fill later after sorting/grouping
-    pass
+    if backend is not None:
+        st.caption("Plotting the in-memory sample of the on-disk dataset; "
+                   "choose a resample frequency to aggregate the full table.")
 
-# For grouped lines, keep top-N groups by aggregate on first Y column
-if group_col:
-    totals = work.groupby(group_col, dropna=False)[y_cols[0]].sum(numeric_only=True)
-    keep = totals.sort_values(ascending=False).head(int(topn_groups)).index
-    work = work[work[group_col].isin(keep)]
+    # Time window: a slice of the dataset's sorted time index (rows arrive in time order)
+    time_range = time_range_slider(df, x_col, key="line_time_range") if is_time else None
 
-# Resample if datetime + freq selected
-def resample_if_needed(d: pd.DataFrame) -> pd.DataFrame:
-    if not is_time or freq == "Auto (no resample)":
-        return d
-    # ensure time index
-    d = d.sort_values(x_col)
-    gcols = [group_col] if group_col else []
-    out = []
-    if gcols:
-        for key, sub in d.groupby(gcols, dropna=False):
-            sub = sub.set_index(x_col)
-            r = sub.resample(freq)[y_cols].agg(agg)
-            r[gcols] = key if isinstance(key, tuple) else key
-            out.append(r.reset_index())
-        d = pd.concat(out, ignore_index=True)
-    else:
-        d = d.set_index(x_col).resample(freq)[y_cols].agg(agg).reset_index()
-    return d
+    work = select_line_rows(df, x_col, y_cols, group_col=group_col, is_time=is_time,
+                            missing=missing, top_n_groups=int(topn_groups), time_range=time_range)
 
-work = resample_if_needed(work)
-
-# Fill/interpolate after resample/sort
-if missing in ("ffill", "interpolate"):
-    work = work.sort_values([c for c in ([group_col] if group_col else [])] + [x_col])
-    if missing == "ffill":
-        work[y_cols] = work.groupby(group_col)[y_cols].ffill() if group_col else work[y_cols].ffill()
-    elif missing == "interpolate":
-        # time-aware interpolation if datetime
-        if is_time:
-            if group_col:
-                work[y_cols] = work.groupby(group_col)[y_cols].apply(lambda g: g.set_index(work.loc[g.index, x_col]).interpolate(method="time").reset_index(drop=True))
-            else:
-                work = work.set_index(x_col)
-                work[y_cols] = work[y_cols].interpolate(method="time")
-                work = work.reset_index()
-        else:
-            work[y_cols] = work.groupby(group_col)[y_cols].interpolate() if group_col else work[y_cols].interpolate()
-
-# Rolling smoothing
-if rolling and rolling > 0:
-    if group_col:
-        work[y_cols] = work.groupby(group_col, group_keys=False)[y_cols].apply(lambda s: s.rolling(int(rolling), min_periods=1).mean())
-    else:
-        work[y_cols] = work[y_cols].rolling(int(rolling), min_periods=1).mean()
+# Resample if datetime + freq selected
+work = resample_if_needed(work, x_col, y_cols, is_time=is_time, freq=freq, agg=agg, group_col=group_col)
 
-# Normalize to 100 per series (use first non-null per series)
-if normalize:
-    if group_col:
-        for g in work[group_col].dropna().unique():
-            mask = work[group_col] == g
-            for y in y_cols:
-                first = work.loc[mask & work[y].notna(), y].iloc[:1]
-                if not first.empty and first.values[0] != 0:
-                    work.loc[mask, y] = work.loc[mask, y] / first.values[0] * 100.0
-    else:
-        for y in y_cols:
-            first = work.loc[work[y].notna(), y].iloc[:1]
-            if not first.empty and first.values[0] != 0:
-                work[y] = work[y] / first.values[0] * 100.0
+# Fill/interpolate, rolling smoothing, normalize to 100 per series
+work = finish_line_data(work, x_col, y_cols, group_col=group_col, is_time=is_time,
+                        missing=missing, rolling=int(rolling), normalize=normalize)
 
 # -------------------- Build Altair chart --------------------
 if alt:
-    # Melt to long form: columns -> series per Y (and optionally group)
-    id_vars = [x_col] + ([group_col] if group_col else [])
-    long = work.melt(id_vars=id_vars, value_vars=y_cols, var_name="series", value_name="value")
-
-    # Combine group + series if grouping to color lines distinctly
-    if group_col:
-        long["series_label"] = long[group_col].astype(str) + " · " + long["series"].astype(str)
-    else:
-        long["series_label"] = long["series"].astype(str)
-
-    # Encodings
-    if is_time:
-        x_enc = alt.X(f"{x_col}:T", title=x_col)
-    else:
-        # numeric or category
-        x_type = "Q" if pd.api.types.is_numeric_dtype(df[x_col]) else "N"
-        x_enc = alt.X(f"{x_col}:{x_type}", title=x_col, sort=None)
-
-    y_scale = alt.Scale(type="log") if log_scale else alt.Scale()
-    y_enc = alt.Y("value:Q", title=", ".join(y_cols) if len(y_cols) > 1 else y_cols[0], scale=y_scale)
-
-    color = alt.Color(
-        "series_label:N",
-        legend=alt.Legend() if show_legend else None,
-        scale=alt.Scale(scheme=palette, reverse=reverse_palette),
-        title="Series"
+    chart, plot_df = build_line_chart(
+        work, x_col, y_cols,
+        group_col=group_col,
+        is_time=is_time,
+        x_numeric=pd.api.types.is_numeric_dtype(df[x_col]),
+        layout=layout,
+        orientation=orientation,
+        show_markers=show_markers,
+        area_fill=area_fill,
+        log_scale=log_scale,
+        palette=palette,
+        reverse_palette=reverse_palette,
+        show_legend=show_legend,
     )
-
-    base = alt.Chart(long)
-
-    mark_kwargs = {}
-    if show_markers:
-        mark_kwargs["point"] = True
-
-    line = base.mark_line(**mark_kwargs)
-    if area_fill:
-        area = base.mark_area(opacity=0.2)
-        chart = (area.encode(x=x_enc, y=y_enc, color=color) + line.encode(x=x_enc, y=y_enc, color=color))
-    else:
-        chart = line.encode(x=x_enc, y=y_enc, color=color)
-
-    # Orientation swap (horizontal)
-    if orientation.startswith("Horizontal"):
-        chart = chart.encode(x=y_enc, y=x_enc)
-
-    chart = chart.properties(height=420, title="Line Chart").interactive()
-
-    st.altair_chart(chart, use_container_width=True)
+    render_altair_chart(chart, use_container_width=True)
 
     # Data preview
-    with st.expander("🔎 Data (long-form used for plotting)"):
-        st.dataframe(long.head(500), use_container_width=True)
+    with st.expander("🔎 Data (frame used for plotting)"):
+        st.dataframe(plot_df.head(500), use_container_width=True)
 
     # Export PNG
     export_controls_altair_png(chart, key_suffix="line")
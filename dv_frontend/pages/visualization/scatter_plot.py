@@ -2,18 +2,19 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 
-from utils.visual_components import export_controls_altair_png
+from utils.visual_components import export_controls_altair_png, render_altair_chart
+from utils.scatter_prep import prepare_scatter_data
+from utils.time_index import time_range_slider, time_window
+from utils.lazy_imports import lazy_import
+from utils.filters import filtered_dataset
 
-try:
-    import altair as alt
-except Exception:
-    alt = None
+alt = lazy_import("altair")  # imported on first use; None if not installed
 
 st.set_page_config(page_title="Visualization · Scatter Plot", page_icon="🔬", layout="wide")
 st.title("🔬 Visualization → Scatter Plot")
 
 # -------------------- Data --------------------
-df: pd.DataFrame | None = st.session_state.get("uploaded_df")
+df: pd.DataFrame | None = filtered_dataset(st.session_state)  # global filters applied
 if df is None:
     st.warning("⚠️ No dataset found. Please upload one first from the **Upload Dataset** page.")
     st.stop()
@@ -30,13 +31,6 @@ def categorical_cols(data: pd.DataFrame, max_unique_numeric_as_cat: int = 30) ->
     low_card_num = [c for c in numeric_cols(data) if data[c].nunique(dropna=True) <= max_unique_numeric_as_cat]
     return sorted(list(dict.fromkeys(base + low_card_num)))
 
-def maybe_parse_datetime(s: pd.Series, force_parse: bool) -> pd.Series:
-    if pd.api.types.is_datetime64_any_dtype(s):
-        return s
-    if force_parse:
-        return pd.to_datetime(s, errors="coerce")
-    return s
-
 # -------------------- Controls (MAIN BODY) --------------------
 st.subheader("Controls")
 
@@ -65,6 +59,23 @@ with c7:
 with c8:
     jitter = st.checkbox("Jitter points", value=False, key="sc_jitter")
 
+if facet_col:
+    f1, f2, f3, f4 = st.columns([2.2, 2.2, 2.2, 2.2])
+    with f1:
+        max_facets = st.number_input("Max facets", min_value=2, max_value=48, value=12, step=1, key="sc_facet_max",
+                                     help="Largest categories get their own panel; the rest are folded into \"Other\".")
+    with f2:
+        facet_budget = st.number_input("Points per facet", min_value=100, max_value=20000, value=1000, step=100,
+                                       key="sc_facet_budget", help="Stratified sample size per panel (replaces global sampling).")
+    with f3:
+        facet_agg = st.checkbox("Aggregate per facet (2D bins)", value=False, key="sc_facet_agg",
+                                help="Bin X/Y on the server and draw one mark per non-empty cell.")
+    with f4:
+        facet_bins = st.number_input("Bins per axis", min_value=5, max_value=100, value=30, step=5,
+                                     key="sc_facet_bins", disabled=not facet_agg)
+else:
+    max_facets, facet_budget, facet_agg, facet_bins = 0, 0, False, 0
+
 r1, r2, r3, r4 = st.columns([2.2, 2.2, 2.2, 2.2])
 with r1:
     x_log = st.checkbox("Log X", value=False, key="sc_x_log")
@@ -122,36 +133,41 @@ else:
     color_num = None
 
 # -------------------- Prepare data --------------------
-work_cols = [x_col, y_col] + ([color_cat] if color_cat else []) + ([color_num] if color_num else []) + ([size_col] if size_col else []) + ([facet_col] if facet_col else [])
-work = df[work_cols].copy()
-
-# Parse datetime X if asked
-work[x_col] = maybe_parse_datetime(work[x_col], treat_x_as_time)
-
-# Drop rows with missing essential fields
+extra_cols = ([color_cat] if color_cat else []) + ([color_num] if color_num else []) + ([size_col] if size_col else [])
 essential = [x_col, y_col] + ([size_col] if size_mode == "By numeric" else [])
-work = work.dropna(subset=essential)
-
-# Optional jitter (small random noise) — only for numeric axes
-if jitter:
-    rng = np.random.default_rng(42)
-    # Add jitter of ~0.5% of std for numeric columns involved
-    if pd.api.types.is_numeric_dtype(work[x_col]):
-        jx = float(work[x_col].std(ddof=0) or 0)
-        work["_xj"] = work[x_col] + (rng.normal(0, jx * 0.005, size=len(work)) if jx > 0 else 0)
-    else:
-        work["_xj"] = work[x_col]
-    jy = float(work[y_col].std(ddof=0) or 0)
-    work["_yj"] = work[y_col] + (rng.normal(0, jy * 0.005, size=len(work)) if jy > 0 else 0)
-    x_field = "_xj"
-    y_field = "_yj"
-else:
-    x_field = x_col
-    y_field = y_col
 
-# Sampling
-if sample_n and sample_n > 0 and len(work) > sample_n:
-    work = work.sample(int(sample_n), random_state=1)
+if facet_col and facet_agg and (treat_x_as_time or not pd.api.types.is_numeric_dtype(df[x_col])):
+    st.info("Per-facet aggregation needs a numeric X; showing sampled points instead.")
+    facet_agg = False
+
+# Time window: rows of a datetime column's range, sliced from its sorted index (memoized per window)
+window_cols = list(dict.fromkeys(([x_col] if treat_x_as_time else []) + dt_candidates))
+if window_cols:
+    w1, w2 = st.columns([1, 3])
+    with w1:
+        window_col = st.selectbox("Time window on", window_cols, index=0, key="sc_window_col")
+    with w2:
+        time_range = time_range_slider(df, window_col, key="sc_time_range")
+    if time_range is not None:
+        df = time_window(df, window_col, *time_range)
+        if df.empty:
+            st.info("No rows in the selected time window.")
+            st.stop()
+
+# Rows to plot (shared, cached sampler): per-facet budget, global sample, or all valid rows
+work, x_field, y_field, facet_field = prepare_scatter_data(
+    df, x_col, y_col,
+    columns=extra_cols,
+    essential=essential,
+    parse_x_time=treat_x_as_time,
+    sample_n=int(sample_n),
+    facet_col=facet_col,
+    max_facets=int(max_facets),
+    facet_budget=int(facet_budget),
+    facet_agg=facet_agg,
+    facet_bins=int(facet_bins),
+    jitter=jitter,
+)
 
 # -------------------- Build Altair chart --------------------
 if not alt:
@@ -197,23 +213,36 @@ else:
 
 base = alt.Chart(work)
 
-points = base.mark_circle(opacity=float(opacity)).encode(
-    x=x_enc,
-    y=y_enc,
-    tooltip=tooltip,
-    size=size_enc,
-    color=color_enc if color_enc is not None else alt.value("#4C78A8"),
-)
+if facet_agg:
+    # one mark per (facet, x-bin, y-bin); size/color carry the row count
+    points = base.mark_square(opacity=float(opacity)).encode(
+        x=x_enc,
+        y=y_enc,
+        tooltip=tooltip + [alt.Tooltip("count:Q", title="Rows")],
+        size=alt.Size("count:Q", scale=alt.Scale(range=list(size_range)), title="Rows"),
+        color=alt.Color("count:Q",
+                        legend=alt.Legend() if legend else None,
+                        scale=alt.Scale(scheme=palette_cont, reverse=reverse_palette),
+                        title="Rows"),
+    )
+else:
+    points = base.mark_circle(opacity=float(opacity)).encode(
+        x=x_enc,
+        y=y_enc,
+        tooltip=tooltip,
+        size=size_enc,
+        color=color_enc if color_enc is not None else alt.value("#4C78A8"),
+    )
 
 layers = [points]
 
-# Trendline layer
-if trend != "None":
-    trend_kwargs = {}
+# Trendline layer (not meaningful on binned cells)
+if trend != "None" and not facet_agg:
+    trend_kwargs = {"groupby": [color_cat]} if (trend_per_group and color_cat) else {}
     if trend == "Linear":
-        tr = base.transform_regression(x_field, y_field, groupby=[color_cat] if (trend_per_group and color_cat) else None).mark_line(strokeWidth=2)
+        tr = base.transform_regression(x_field, y_field, **trend_kwargs).mark_line(strokeWidth=2)
     else:  # LOESS
-        tr = base.transform_loess(x_field, y_field, groupby=[color_cat] if (trend_per_group and color_cat) else None, bandwidth=float(loess_bandwidth)).mark_line(strokeWidth=2)
+        tr = base.transform_loess(x_field, y_field, bandwidth=float(loess_bandwidth), **trend_kwargs).mark_line(strokeWidth=2)
 
     tr_enc = {
         "x": x_enc,
@@ -224,13 +253,17 @@ if trend != "None":
 
 chart = alt.layer(*layers)
 
-# Facet (small multiples)
+# Facet (small multiples): size/zoom apply to each panel, title to the whole grid
 if facet_col:
-    chart = chart.facet(column=alt.Column(f"{facet_col}:N", header=alt.Header(title=facet_col, labelOrient="bottom")))
-
-chart = chart.properties(height=420, title="Scatter Plot").interactive()
+    n_panels = int(work[facet_field].nunique()) if len(work) else 1
+    chart = chart.properties(width=220, height=220).interactive().facet(
+        facet=alt.Facet(f"{facet_field}:N", title=facet_col, sort=None, header=alt.Header(labelOrient="bottom")),
+        columns=min(4, max(n_panels, 1)),
+    ).properties(title="Scatter Plot")
+else:
+    chart = chart.properties(height=420, title="Scatter Plot").interactive()
 
-st.altair_chart(chart, use_container_width=True)
+render_altair_chart(chart, use_container_width=True)
 
 # Data preview (first 500 rows used)
 with st.expander("🔎 Data preview"):
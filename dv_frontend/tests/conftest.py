@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# modules import each other as `utils.*` / `dv_core.*` (the app runs from dv_frontend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,125 @@
+# tests/test_append.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.dataset_cache import dataset_cache
+from utils.incremental import PROFILE_KEY, ProfileStats, cached_bar_aggregate, dataset_profile, extend_caches
+from utils.ingest import append_rows
+from utils.compute_engine import PandasEngine
+
+# Appending a parsed slice to the session frame (utils.ingest.append_rows) and
+# carrying the cached profile / bar aggregations over (utils.incremental).
+
+
+@pytest.fixture
+def base() -> pd.DataFrame:
+    return pd.DataFrame({
+        "flag": [False, False, True],
+        "units": [1, 2, 3],
+        "region": pd.Categorical(["N", "S", "N"]),
+        "date": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03"]),
+        "label": pd.Series(["a", "b", "c"], dtype="str"),
+    })
+
+
+# -------- append_rows --------
+def test_missing_columns_are_null_not_filled(base):
+    combined, notes = append_rows(base, pd.DataFrame({"units": [4, 5]}))
+    assert combined["flag"].tolist()[:3] == [False, False, True]
+    assert combined["flag"].iloc[3:].isna().all()
+    assert combined["region"].iloc[3:].isna().all()
+    assert combined["date"].iloc[3:].isna().all()
+    assert combined["label"].iloc[3:].isna().all()
+    assert combined["units"].tolist() == [1, 2, 3, 4, 5]
+    assert any("left empty" in n and "flag" in n for n in notes)
+    assert any(n.startswith("flag: bool") for n in notes)  # upcast, reported
+
+
+def test_missing_int_column_becomes_float(base):
+    combined, _ = append_rows(base, pd.DataFrame({"flag": [True]}))
+    assert combined["units"].dtype == np.float64
+    assert combined["units"].isna().tolist() == [False, False, False, True]
+
+
+def test_new_columns_are_null_in_earlier_rows(base):
+    combined, notes = append_rows(base, pd.DataFrame({"units": [4], "price": [9.5]}))
+    assert list(combined.columns) == [*base.columns, "price"]
+    assert combined["price"].isna().tolist() == [True, True, True, False]
+    assert any("New columns" in n and "price" in n for n in notes)
+
+
+def test_categories_are_unioned(base):
+    combined, _ = append_rows(base, pd.DataFrame({"region": pd.Categorical(["E", "N"])}))
+    assert isinstance(combined["region"].dtype, pd.CategoricalDtype)
+    assert set(combined["region"].cat.categories) == {"N", "S", "E"}
+    assert combined["region"].tolist() == ["N", "S", "N", "E", "N"]
+
+
+def test_text_dates_and_numbers_convert_to_base_kind(base):
+    new = pd.DataFrame({"date": ["2024-02-01", "2024-02-02"], "units": ["7", "8"]})
+    combined, _ = append_rows(base, new)
+    assert combined["date"].dtype == base["date"].dtype
+    assert combined["date"].iloc[3] == pd.Timestamp("2024-02-01")
+    assert combined["units"].tolist() == [1, 2, 3, 7, 8]
+
+
+def test_base_is_unchanged(base):
+    before = base.copy()
+    append_rows(base, pd.DataFrame({"units": [4]}))
+    pd.testing.assert_frame_equal(base, before)
+
+
+# -------- extend_caches --------
+def _frame(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    sales = rng.normal(50, 10, n)
+    sales[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame({
+        "region": pd.Categorical(rng.choice(["N", "S", "E"], n)),
+        "flag": rng.random(n) < 0.5,
+        "qty": rng.integers(0, 5, n),
+        "sales": sales,
+    })
+
+
+def _assert_profile_matches(combined: pd.DataFrame) -> None:
+    carried = dataset_cache(combined).get(PROFILE_KEY, lambda: None)
+    fresh = ProfileStats.from_frame(combined)
+    pd.testing.assert_series_equal(carried.null_counts(), fresh.null_counts(), check_names=False)
+    pd.testing.assert_series_equal(carried.nunique(), fresh.nunique(), check_names=False)
+    assert carried.duplicated_count() == fresh.duplicated_count()
+    num = ["qty", "sales"] if "qty" in combined.select_dtypes(include=[np.number]) else ["sales"]
+    pd.testing.assert_frame_equal(carried.describe_numeric(combined, num), fresh.describe_numeric(combined, num),
+                                  check_exact=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("agg", ["count", "sum", "min", "max", "mean"])
+def test_carried_bar_aggregates_match_recompute(agg):
+    base = _frame(500, 1)
+    y_col = None if agg == "count" else "sales"
+    dataset_profile(base)
+    cached_bar_aggregate(base, "region", y_col, agg, True)
+    combined, _ = append_rows(base, _frame(200, 2))
+    assert extend_caches(base, combined)
+    carried = dataset_cache(combined).get(("bar", "region", y_col, agg, True), lambda: None)
+    assert carried is not None
+    expected = PandasEngine().aggregate_for_bar(combined, "region", y_col, agg, True)
+    pd.testing.assert_frame_equal(carried.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_exact=False, rtol=1e-9, check_dtype=False)
+    _assert_profile_matches(combined)
+
+
+def test_carried_profile_with_missing_bool_column():
+    base = _frame(300, 3)
+    dataset_profile(base)
+    cached_bar_aggregate(base, "flag", None, "count", False)
+    combined, _ = append_rows(base, _frame(100, 4).drop(columns=["flag"]))
+    extend_caches(base, combined)
+    assert combined["flag"].isna().sum() == 100
+    assert int(combined["flag"].eq(True).sum()) == int(base["flag"].sum())
+    # dtype changed (bool -> object): the bar aggregation is not carried over
+    assert dataset_cache(combined).get(("bar", "flag", None, "count", False), lambda: None) is None
+    _assert_profile_matches(combined)
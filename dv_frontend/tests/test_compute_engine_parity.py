@@ -0,0 +1,122 @@
+# tests/test_compute_engine_parity.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("polars")
+
+from utils.compute_engine import RESAMPLE_FREQ, PandasEngine, PolarsEngine  # noqa: E402
+
+# The Polars engine must return what the pandas reference returns (layout,
+# values and dtypes), so pages can switch engines via DV_COMPUTE_ENGINE.
+
+BAR_AGGS = ["sum", "mean", "median", "min", "max", "count", "nunique(y)"]
+LINE_AGGS = ["sum", "mean", "median", "min", "max"]
+N_ROWS = 2_000
+
+
+@pytest.fixture(scope="module")
+def frame() -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    n = N_ROWS
+    region = pd.Series(rng.choice(["N", "S", "E", "W"], n), dtype="category")
+    region[rng.random(n) < 0.1] = np.nan
+    label = pd.Series(rng.choice(["a", "b", "c", "d", "e"], n), dtype="str")
+    label[rng.random(n) < 0.05] = np.nan
+    sales = rng.normal(100, 25, n).round(2)
+    sales[rng.random(n) < 0.08] = np.nan
+    return pd.DataFrame({
+        "date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 700, n), unit="D"),
+        "region": region,
+        "label": label,
+        "units": rng.integers(1, 12, n),
+        "sales": sales,
+        "qty": rng.integers(0, 50, n).astype("int64"),
+    })
+
+
+@pytest.fixture(autouse=True)
+def no_fallback(monkeypatch):
+    """Fail instead of letting PolarsEngine quietly fall back to the pandas code."""
+    for name in ("aggregate_for_bar", "resample", "null_counts", "nunique",
+                 "duplicated_count", "describe_numeric"):
+        reference = getattr(PandasEngine, name)
+
+        def guarded(self, *args, _reference=reference, _name=name, **kwargs):
+            if isinstance(self, PolarsEngine):
+                pytest.fail(f"PolarsEngine.{_name} fell back to pandas")
+            return _reference(self, *args, **kwargs)
+
+        monkeypatch.setattr(PandasEngine, name, guarded)
+
+
+@pytest.fixture(scope="module")
+def engines() -> tuple[PandasEngine, PolarsEngine]:
+    return PandasEngine(), PolarsEngine()
+
+
+def assert_same(expected: pd.DataFrame | pd.Series, actual: pd.DataFrame | pd.Series, **kwargs) -> None:
+    if isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(actual, expected, **kwargs)
+    else:
+        pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True), **kwargs)
+
+
+# -------- bar --------
+@pytest.mark.parametrize("remove_nulls", [True, False])
+@pytest.mark.parametrize("agg", BAR_AGGS)
+@pytest.mark.parametrize("x_col", ["units", "region", "label", "date"])  # numeric, categorical, text, datetime
+def test_aggregate_for_bar(frame, engines, x_col, agg, remove_nulls):
+    reference, polars = engines
+    y_col = None if agg == "count" else "sales"
+    expected = reference.aggregate_for_bar(frame, x_col, y_col, agg, remove_nulls)
+    actual = polars.aggregate_for_bar(frame, x_col, y_col, agg, remove_nulls)
+    assert_same(expected, actual, check_exact=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("agg", ["sum", "min", "max"])
+def test_aggregate_for_bar_integer_y(frame, engines, agg):
+    reference, polars = engines
+    assert_same(reference.aggregate_for_bar(frame, "region", "qty", agg, True),
+                polars.aggregate_for_bar(frame, "region", "qty", agg, True))
+
+
+# -------- line --------
+@pytest.mark.parametrize("group_col", [None, "region"])
+@pytest.mark.parametrize("agg", LINE_AGGS)
+@pytest.mark.parametrize("freq", list(RESAMPLE_FREQ))
+def test_resample(frame, engines, freq, agg, group_col):
+    reference, polars = engines
+    data = frame.sort_values("date", kind="stable").reset_index(drop=True)
+    if group_col:
+        data = data[data[group_col].notna()].reset_index(drop=True)
+    expected = reference.resample(data, "date", ["sales", "qty"], freq, agg, group_col)
+    actual = polars.resample(data, "date", ["sales", "qty"], freq, agg, group_col)
+    assert_same(expected, actual, check_exact=False, rtol=1e-9)
+
+
+# -------- profile --------
+def test_null_counts(frame, engines):
+    reference, polars = engines
+    assert_same(reference.null_counts(frame), polars.null_counts(frame))
+
+
+def test_nunique(frame, engines):
+    reference, polars = engines
+    assert_same(reference.nunique(frame), polars.nunique(frame))
+
+
+def test_duplicated_count(frame, engines):
+    reference, polars = engines
+    doubled = pd.concat([frame, frame.head(123)], ignore_index=True)
+    assert reference.duplicated_count(doubled) == polars.duplicated_count(doubled) == 123
+    assert reference.duplicated_count(frame) == polars.duplicated_count(frame)
+
+
+def test_describe_numeric(frame, engines):
+    reference, polars = engines
+    cols = ["units", "sales", "qty"]
+    assert_same(reference.describe_numeric(frame, cols), polars.describe_numeric(frame, cols),
+                check_exact=False, rtol=1e-9, atol=1e-9)
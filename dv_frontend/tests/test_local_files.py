@@ -0,0 +1,41 @@
+# tests/test_local_files.py
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from utils.local_files import DATA_DIRS_ENV, read_local_files
+
+
+@pytest.fixture
+def daily_slices(tmp_path, monkeypatch):
+    """Three files with the same layout (like daily extracts), allow-listed for reading."""
+    monkeypatch.setenv(DATA_DIRS_ENV, str(tmp_path))
+    paths = []
+    for day in range(3):
+        path = tmp_path / f"day{day}.csv"
+        pd.DataFrame({"day": day, "row": range(1000)}).to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+def test_files_are_sampled_independently(daily_slices, engine):
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    df, _ = read_local_files(daily_slices, engine=engine, fraction=0.3)
+    kept = [set(g["row"]) for _, g in df.groupby("day")]
+    assert len(kept) == 3 and all(200 < len(rows) < 400 for rows in kept)
+    assert kept[0] != kept[1] and kept[1] != kept[2]
+
+
+def test_sample_is_reproducible(daily_slices):
+    first, _ = read_local_files(daily_slices, fraction=0.3)
+    again, _ = read_local_files(daily_slices, fraction=0.3)
+    pd.testing.assert_frame_equal(first, again)
+
+
+def test_limit_over_files_is_taken_before_sampling(daily_slices):
+    df, _ = read_local_files(daily_slices, nrows=1500, fraction=0.5)
+    assert set(df["day"]) <= {0, 1}
+    assert 600 < len(df) < 900
@@ -0,0 +1,40 @@
+# tests/test_perf.py
+from __future__ import annotations
+
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from utils.perf import begin_run, end_run, timer
+
+
+@pytest.fixture
+def traced():
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+def test_nested_stage_keeps_outer_peak(traced):
+    run = begin_run("test")
+    with timer("outer"):
+        big = np.ones(4 * 1024 ** 2 // 8)  # 4 MB, freed before the inner stage
+        del big
+        with timer("inner"):
+            small = np.ones(1024)
+            del small
+    end_run(run)
+    stages = {s["stage"]: s for s in run.stages}
+    assert stages["outer"]["peak_mb"] >= 4
+    assert "peak_mb" not in stages["inner"]
+
+
+def test_sequential_stages_each_measure(traced):
+    run = begin_run("test")
+    for name in ("first", "second"):
+        with timer(name):
+            block = np.ones(2 * 1024 ** 2 // 8)
+            del block
+    end_run(run)
+    assert all(s["peak_mb"] >= 2 for s in run.stages)
@@ -0,0 +1,162 @@
+# utils/chart_data.py
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Any
+
+import pandas as pd
+
+# Chart data transport.
+#
+# Instead of letting Altair inline every frame as JSON records in each spec
+# (and trip its 5000-row `max_rows` guard), charts reference their data by
+# name: {"data": {"name": "dv-<hash>"}}. The frame itself lives once in the
+# spec's top-level `datasets`, keyed by a content hash, so layers and charts
+# built from the same frame share one payload. Serialized payloads (Arrow IPC
+# for the browser, records for vl-convert / JSON export) are cached per hash,
+# so a rerun with unchanged data does not serialize it again.
+
+MAX_CACHED_DATASETS = 32
+MAX_CACHED_BYTES = 256 * 1024 ** 2
+
+_TRANSFORMER_NAME = "dv_named"
+
+_cache_lock = threading.Lock()
+# Altair's transformer/theme registries are process-global
+_altair_lock = threading.Lock()
+_cache: "OrderedDict[str, dict[str, Any]]" = OrderedDict()
+
+
+def dataset_name(df: pd.DataFrame) -> str:
+    """Stable content hash for a frame (values, column names and dtypes)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    try:
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    except TypeError:
+        # unhashable cells (lists, dicts): hash the serialized payload instead
+        h.update(_to_arrow_bytes(df))
+    return f"dv-{h.hexdigest()}"
+
+
+def _to_arrow_bytes(df: pd.DataFrame) -> bytes:
+    import pyarrow as pa
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # mixed-type object columns: ship them as strings
+        obj_cols = df.select_dtypes(include=["object"]).columns
+        table = pa.Table.from_pandas(df.astype({c: str for c in obj_cols}), preserve_index=False)
+
+    sink = pa.BufferOutputStream()
+    with pa.RecordBatchStreamWriter(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _to_values(df: pd.DataFrame) -> list[dict]:
+    import altair as alt
+
+    return alt.to_values(df)["values"]
+
+
+_SERIALIZERS = {"arrow": _to_arrow_bytes, "values": _to_values}
+
+
+def _entry_bytes(entry: dict[str, Any]) -> int:
+    n = entry["frame_bytes"]
+    if "arrow" in entry:
+        n += len(entry["arrow"])
+    return n
+
+
+def _remember(df: pd.DataFrame) -> tuple[str, dict[str, Any]]:
+    name = dataset_name(df)
+    with _cache_lock:
+        known = name in _cache
+    # sized once, outside the lock: deep sizing walks every text value
+    frame_bytes = None if known else int(df.memory_usage(index=False, deep=True).sum())
+    with _cache_lock:
+        entry = _cache.get(name)
+        if entry is None:
+            if frame_bytes is None:  # evicted in between
+                frame_bytes = int(df.memory_usage(index=False, deep=True).sum())
+            entry = _cache[name] = {"frame": df, "frame_bytes": frame_bytes}
+        else:
+            _cache.move_to_end(name)
+        _evict_locked()
+    return name, entry
+
+
+def _evict_locked() -> None:
+    total = sum(_entry_bytes(e) for e in _cache.values())
+    while len(_cache) > 1 and (len(_cache) > MAX_CACHED_DATASETS or total > MAX_CACHED_BYTES):
+        _, old = _cache.popitem(last=False)
+        total -= _entry_bytes(old)
+
+
+def _payload(entry: dict[str, Any], dataset_format: str) -> Any:
+    if dataset_format not in entry:
+        entry[dataset_format] = _SERIALIZERS[dataset_format](entry["frame"])
+    return entry[dataset_format]
+
+
+def _named_dataset(data: Any, datasets: dict[str, dict[str, Any]]) -> Any:
+    """Altair data transformer: swap a frame for a reference to its named dataset."""
+    if not isinstance(data, pd.DataFrame):
+        return data
+    name, entry = _remember(data)
+    datasets[name] = entry
+    return {"name": name}
+
+
+def chart_data_cache_bytes() -> int:
+    with _cache_lock:
+        return sum(_entry_bytes(e) for e in _cache.values())
+
+
+def clear_chart_data_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+def altair_chart_spec(chart, *, dataset_format: str = "values", default_theme: bool = True) -> dict:
+    """
+    Convert an Altair chart to a Vega-Lite spec whose data is referenced by name.
+
+    dataset_format:
+      - "values": records in `datasets` (standalone spec for vl-convert / JSON download)
+      - "arrow":  Arrow IPC bytes in `datasets` (for st.vega_lite_chart)
+    """
+    if chart is None:
+        raise ValueError("No chart object provided.")
+    if dataset_format not in _SERIALIZERS:
+        raise ValueError(f"Unknown dataset format: {dataset_format!r}")
+
+    import altair as alt
+
+    alt.data_transformers.register(_TRANSFORMER_NAME, _named_dataset)
+    collected: dict[str, dict[str, Any]] = {}
+
+    with _altair_lock:
+        if default_theme:
+            theme_ctx = nullcontext()
+        else:
+            # Streamlit applies its own theme; drop Altair's 300px view defaults
+            themes = getattr(alt, "theme", None)
+            if not hasattr(themes, "enable"):  # altair < 5.5
+                themes = alt.themes
+            theme_ctx = themes.enable("none") if themes.active == "default" else nullcontext()
+        with theme_ctx, alt.data_transformers.enable(_TRANSFORMER_NAME, datasets=collected):
+            spec = chart.to_dict()
+
+    if collected:
+        datasets = dict(spec.get("datasets") or {})
+        for name, entry in collected.items():
+            datasets[name] = _payload(entry, dataset_format)
+        spec["datasets"] = datasets
+    return spec
@@ -0,0 +1,35 @@
+# utils/column_access.py
+from __future__ import annotations
+
+from typing import Sequence
+
+import pandas as pd
+
+from utils.dataset_cache import dataset_cache
+
+# Read-only column access for the visualization pages.
+#
+# Pages select columns from the session frame without a defensive `.copy()`.
+# With copy-on-write enabled, a selection shares memory with the session frame
+# until a column is replaced, and only the replaced column is allocated.
+# Derived columns that are expensive to recompute on every rerun (datetime
+# parsing) are computed once per dataset and cached.
+
+
+def enable_copy_on_write() -> None:
+    """Turn on pandas copy-on-write (always on from pandas 3.0)."""
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def column_view(df: pd.DataFrame, columns: Sequence[str]) -> pd.DataFrame:
+    """Selected columns of `df`; shares memory with `df` under copy-on-write."""
+    return df[list(dict.fromkeys(columns))]
+
+
+def parsed_datetime(df: pd.DataFrame, column: str) -> pd.Series:
+    """`df[column]` as datetimes (unparseable values -> NaT), parsed once per dataset."""
+    s = df[column]
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    return dataset_cache(df).get(("datetime", column), lambda: pd.to_datetime(s, errors="coerce"))
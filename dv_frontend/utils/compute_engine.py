@@ -0,0 +1,253 @@
+# utils/compute_engine.py
+from __future__ import annotations
+
+import os
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset_cache import dataset_cache
+from utils.lazy_imports import lazy_import
+from utils.null_index import null_index
+
+pl = lazy_import("polars")
+
+# Pluggable compute engine for the heavy per-dataset operations
+# (bar aggregation, time resampling, profiling statistics).
+#
+# "pandas" is the reference implementation. "polars" runs the same operations
+# as lazy Polars queries on all cores and returns frames with the same layout,
+# values and dtypes, so pages do not care which engine produced them.
+# Select with the DV_COMPUTE_ENGINE environment variable (default "pandas");
+# Polars' thread count follows POLARS_MAX_THREADS (default: all cores).
+
+ENGINE_ENV = "DV_COMPUTE_ENGINE"
+
+# Line-chart resample choices -> pandas offset aliases ("M"/"Q"/"Y" are removed in pandas 3)
+RESAMPLE_FREQ = {"D": "D", "W": "W", "M": "ME", "Q": "QE", "Y": "YE"}
+
+
+class PandasEngine:
+    """Reference implementation (single-threaded pandas)."""
+
+    name = "pandas"
+
+    # -------- bar --------
+    def aggregate_for_bar(self, data: pd.DataFrame, x_col: str, y_col: str | None, agg: str, remove_nulls: bool) -> pd.DataFrame:
+        # Group the column views directly; only the null filter allocates (for the kept rows).
+        # Valid-row masks come from the dataset's packed null bitmaps (no column rescans)
+        x = data[x_col]
+        if agg == "count":
+            if remove_nulls:
+                x = x[null_index(data).valid_mask([x_col])]
+            return x.groupby(x, dropna=False).size().reset_index(name="value")
+
+        assert y_col is not None
+        y = data[y_col]
+        if remove_nulls:
+            mask = null_index(data).valid_mask([x_col, y_col])
+            x, y = x[mask], y[mask]
+        if agg == "nunique(y)":
+            g = y.groupby(x, dropna=False).nunique(dropna=True)
+        else:
+            g = y.groupby(x, dropna=False).agg(agg)
+        return g.rename_axis(x_col).reset_index(name="value")
+
+    # -------- line --------
+    def resample(self, data: pd.DataFrame, x_col: str, y_cols: list[str], freq: str, agg: str,
+                 group_col: str | None = None) -> pd.DataFrame:
+        """`agg` of each Y column per `freq` period (per group), empty periods included."""
+        rule = RESAMPLE_FREQ[freq]
+        # rows from the sorted time index (utils.time_index) arrive in order already
+        d = data if data[x_col].is_monotonic_increasing else data.sort_values(x_col)
+        if not group_col:
+            return d.set_index(x_col).resample(rule)[y_cols].agg(agg).reset_index()
+        out = []
+        for key, sub in d.groupby([group_col], dropna=False):
+            r = sub.set_index(x_col).resample(rule)[y_cols].agg(agg)
+            r[group_col] = key[0]
+            out.append(r.reset_index())
+        return pd.concat(out, ignore_index=True)
+
+    # -------- profile --------
+    def null_counts(self, data: pd.DataFrame) -> pd.Series:
+        return null_index(data).null_counts()
+
+    def nunique(self, data: pd.DataFrame) -> pd.Series:
+        return data.nunique(dropna=True)
+
+    def duplicated_count(self, data: pd.DataFrame) -> int:
+        return int(data.duplicated().sum())
+
+    def describe_numeric(self, data: pd.DataFrame, cols: Sequence[str]) -> pd.DataFrame:
+        return data[list(cols)].describe().T
+
+
+class PolarsEngine(PandasEngine):
+    """
+    Multithreaded Polars (lazy) implementation. Falls back to pandas for
+    inputs Polars cannot represent (e.g. mixed-type object columns).
+    """
+
+    name = "polars"
+
+    def _lazy(self, data: pd.DataFrame, cols: Sequence[str]) -> "pl.LazyFrame":
+        cols = list(dict.fromkeys(cols))
+        if all(c in data.columns for c in cols) and len(cols) == data.shape[1]:
+            # whole session frame: convert once per dataset
+            frame = dataset_cache(data).get("polars", lambda: pl.from_pandas(data))
+            return frame.lazy()
+        return pl.from_pandas(data[cols]).lazy()
+
+    @staticmethod
+    def _restore(out: pd.DataFrame, data: pd.DataFrame, cols: Sequence[str]) -> pd.DataFrame:
+        """Give key columns back their pandas dtypes (category, str, …)."""
+        for c in cols:
+            dtype = data[c].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                # unordered dtypes compare equal regardless of category order
+                out[c] = out[c].astype(object).astype(dtype)
+            elif out[c].dtype != dtype:
+                out[c] = out[c].astype(dtype)
+        return out
+
+    # -------- bar --------
+    def aggregate_for_bar(self, data, x_col, y_col, agg, remove_nulls):
+        try:
+            x = pl.col(x_col)
+            if agg == "count":
+                lf = self._lazy(data, [x_col])
+                if remove_nulls:
+                    lf = lf.filter(x.is_not_null())
+                q = lf.group_by(x_col).agg(pl.len().cast(pl.Int64).alias("value"))
+            else:
+                y = pl.col(y_col)
+                lf = self._lazy(data, [x_col, y_col])
+                if remove_nulls:
+                    lf = lf.filter(x.is_not_null() & y.is_not_null())
+                if agg == "nunique(y)":
+                    expr = y.drop_nulls().n_unique().cast(pl.Int64)
+                else:
+                    expr = getattr(y, agg)()
+                q = lf.group_by(x_col).agg(expr.alias("value"))
+            out = q.sort(x_col, nulls_last=True).collect().to_pandas()
+        except (pl.exceptions.PolarsError, TypeError, ValueError):
+            return super().aggregate_for_bar(data, x_col, y_col, agg, remove_nulls)
+        if agg != "count" and out["value"].dtype != data[y_col].dtype and agg in ("sum", "min", "max"):
+            out["value"] = out["value"].astype(data[y_col].dtype)
+        return self._restore(out, data, [x_col])
+
+    # -------- line --------
+    @staticmethod
+    def _period_label(x: "pl.Expr", freq: str) -> "pl.Expr":
+        # pandas labels: day, week ending Sunday, period end for M/Q/Y (all at midnight)
+        day = x.dt.truncate("1d")
+        if freq == "D":
+            return day
+        if freq == "W":
+            return day.dt.offset_by(((7 - x.dt.weekday()) % 7).cast(pl.String) + "d")
+        every = {"M": "1mo", "Q": "1q", "Y": "1y"}[freq]
+        return x.dt.truncate(every).dt.offset_by(every).dt.offset_by("-1d")
+
+    def resample(self, data, x_col, y_cols, freq, agg, group_col=None):
+        keys = ([group_col] if group_col else []) + [x_col]
+        try:
+            lf = self._lazy(data, keys + list(y_cols)).filter(pl.col(x_col).is_not_null())
+            buckets = (
+                lf.with_columns(self._period_label(pl.col(x_col), freq).alias(x_col))
+                .group_by(keys)
+                .agg([getattr(pl.col(y), agg)() for y in y_cols])
+                .collect()
+                .to_pandas()
+            )
+        except (pl.exceptions.PolarsError, TypeError, ValueError):
+            return super().resample(data, x_col, y_cols, freq, agg, group_col)
+
+        # Fill empty periods on the (small) aggregated frame, like pandas resample
+        rule = RESAMPLE_FREQ[freq]
+
+        def complete(sub: pd.DataFrame) -> pd.DataFrame:
+            sub = sub.set_index(x_col).sort_index()
+            full = pd.date_range(sub.index.min(), sub.index.max(), freq=rule, name=x_col)
+            r = sub[list(y_cols)].reindex(full)
+            return r.fillna(0) if agg == "sum" else r  # sum of an empty period is 0
+
+        if not group_col:
+            out = complete(buckets).reset_index()
+        else:
+            buckets = self._restore(buckets, data, [group_col])  # pandas group order (e.g. category order)
+            parts = []
+            for key, sub in buckets.groupby([group_col], dropna=False, sort=True):
+                r = complete(sub)
+                r[group_col] = key[0]
+                parts.append(r.reset_index())
+            out = pd.concat(parts, ignore_index=True)
+        for y in y_cols:
+            if agg in ("sum", "min", "max") and out[y].dtype != data[y].dtype and not out[y].isna().any():
+                out[y] = out[y].astype(data[y].dtype)
+        out[x_col] = out[x_col].astype(data[x_col].dtype)
+        return out
+
+    # -------- profile --------
+    def null_counts(self, data):
+        try:
+            row = self._lazy(data, data.columns).select(pl.all().null_count()).collect().row(0)
+        except (pl.exceptions.PolarsError, TypeError, ValueError):
+            return super().null_counts(data)
+        return pd.Series(row, index=data.columns, dtype="int64")
+
+    def nunique(self, data):
+        try:
+            row = self._lazy(data, data.columns).select(pl.all().drop_nulls().n_unique()).collect().row(0)
+        except (pl.exceptions.PolarsError, TypeError, ValueError):
+            return super().nunique(data)
+        return pd.Series(row, index=data.columns, dtype="int64")
+
+    def duplicated_count(self, data):
+        try:
+            lf = self._lazy(data, data.columns)
+            n_unique = lf.unique().select(pl.len()).collect().item()
+        except (pl.exceptions.PolarsError, TypeError, ValueError):
+            return super().duplicated_count(data)
+        return len(data) - int(n_unique)
+
+    def describe_numeric(self, data, cols):
+        cols = list(cols)
+        stats = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+        try:
+            exprs = []
+            for c in cols:
+                v = pl.col(c).cast(pl.Float64)
+                exprs += [
+                    v.count().cast(pl.Float64).alias(f"{c}\0count"),
+                    v.mean().alias(f"{c}\0mean"),
+                    v.std(ddof=1).alias(f"{c}\0std"),
+                    v.min().alias(f"{c}\0min"),
+                    v.quantile(0.25, "linear").alias(f"{c}\0" "25%"),
+                    v.quantile(0.5, "linear").alias(f"{c}\0" "50%"),
+                    v.quantile(0.75, "linear").alias(f"{c}\0" "75%"),
+                    v.max().alias(f"{c}\0max"),
+                ]
+            row = self._lazy(data, cols).select(exprs).collect().row(0)
+        except (pl.exceptions.PolarsError, TypeError, ValueError):
+            return super().describe_numeric(data, cols)
+        values = np.asarray(row, dtype=float).reshape(len(cols), len(stats))
+        return pd.DataFrame(values, index=cols, columns=stats)
+
+
+_ENGINES = {"pandas": PandasEngine, "polars": PolarsEngine}
+_engine: PandasEngine | None = None
+
+
+def compute_engine() -> PandasEngine:
+    """The configured engine (DV_COMPUTE_ENGINE); pandas if Polars is not installed."""
+    global _engine
+    if _engine is None:
+        name = os.environ.get(ENGINE_ENV, "pandas").strip().lower()
+        if name not in _ENGINES:
+            raise ValueError(f"Unknown {ENGINE_ENV}={name!r}; expected one of {sorted(_ENGINES)}")
+        if name == "polars" and pl is None:
+            name = "pandas"
+        _engine = _ENGINES[name]()
+    return _engine
@@ -0,0 +1,206 @@
+# utils/data_grid.py
+from __future__ import annotations
+
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Hashable
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset_cache import dataset_cache
+from utils.perf import timer
+
+# Server-side paginated, sortable, filterable grid over a session frame.
+#
+# A view is an array of row positions: the sort permutation of a column
+# (argsort, computed once per column and direction) restricted to the rows of a
+# boolean filter mask. Both are cached per dataset, so browsing pages is an
+# `iloc` of one page of positions and only that page is sent to the browser,
+# however large the frame. Sorting puts missing values last in both directions.
+#
+# Filters are per column: text columns match a case-insensitive substring;
+# numeric and datetime columns take `>x`, `>=x`, `<x`, `<=x`, `=x`, `!=x`,
+# `a..b` (inclusive range) or a plain value (equality).
+
+MAX_CACHED_MASKS = 16
+MAX_CACHED_VIEWS = 8
+PAGE_SIZES = (25, 50, 100, 250, 500)
+
+_RANGE = re.compile(r"^\s*(.+?)\s*\.\.\s*(.+?)\s*$")
+_COMPARE = re.compile(r"^\s*(>=|<=|!=|>|<|=)\s*(.+?)\s*$")
+
+
+class DataGrid:
+    """Sort permutations, filter masks and views of one DataFrame (see `data_grid`)."""
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = weakref.ref(df)
+        self.n_rows = len(df)
+        self._lock = threading.Lock()
+        self._orders: dict[Hashable, tuple[np.ndarray, int]] = {}
+        self._masks: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._views: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+
+    def _frame(self) -> pd.DataFrame:
+        df = self._df()
+        if df is None:
+            raise RuntimeError("Dataset is no longer available.")
+        return df
+
+    @staticmethod
+    def _lru(cache: OrderedDict, key: tuple, limit: int, compute) -> np.ndarray:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = cache[key] = compute()
+        while len(cache) > limit:
+            cache.popitem(last=False)
+        return value
+
+    # -------- sort --------
+    def _order(self, col: Hashable) -> tuple[np.ndarray, int]:
+        """Stable ascending permutation of `col` (missing last) and its non-missing count."""
+        with self._lock:
+            if col in self._orders:
+                return self._orders[col]
+        s = pd.Series(self._frame()[col].array)
+        with timer("grid argsort", rows=len(s)):
+            try:
+                order = s.sort_values(kind="stable", na_position="last").index.to_numpy()
+            except TypeError:  # mixed types: order by text
+                order = s.astype(str).where(s.notna()).sort_values(kind="stable", na_position="last").index.to_numpy()
+        value = (order, int(s.notna().sum()))
+        with self._lock:
+            return self._orders.setdefault(col, value)
+
+    def sort_positions(self, col: Hashable, ascending: bool = True) -> np.ndarray:
+        order, n_valid = self._order(col)
+        if ascending:
+            return order
+        return np.concatenate([order[:n_valid][::-1], order[n_valid:]])
+
+    # -------- filter --------
+    def filter_mask(self, col: Hashable, query: str) -> np.ndarray:
+        """Rows of `col` matching `query` (see module comment)."""
+        key = (col, query.strip())
+        with self._lock:
+            if key in self._masks:
+                self._masks.move_to_end(key)
+                return self._masks[key]
+        with timer("grid filter", rows=self.n_rows):
+            mask = _match(self._frame()[col], key[1])
+        with self._lock:
+            return self._lru(self._masks, key, MAX_CACHED_MASKS, lambda: mask)
+
+    # -------- views --------
+    def view(self, *, sort_col: Hashable | None = None, ascending: bool = True,
+             filters: tuple[tuple[Hashable, str], ...] = (), base: str | None = None) -> np.ndarray:
+        """
+        Row positions of the view: `base` rows ("duplicated" or all), matching
+        every (column, query) filter, in `sort_col` order (else frame order).
+        """
+        key = (sort_col, bool(ascending), tuple((c, q.strip()) for c, q in filters if q.strip()), base)
+        with self._lock:
+            if key in self._views:
+                self._views.move_to_end(key)
+                return self._views[key]
+        mask = None
+        if base == "duplicated":
+            mask = duplicated_mask(self._frame())
+        for col, query in key[2]:
+            m = self.filter_mask(col, query)
+            mask = m if mask is None else mask & m
+        positions = self.sort_positions(sort_col, ascending) if sort_col is not None else np.arange(self.n_rows)
+        if mask is not None:
+            positions = positions[mask[positions]]
+        with self._lock:
+            return self._lru(self._views, key, MAX_CACHED_VIEWS, lambda: positions)
+
+
+def _parse_like(value: str, s: pd.Series):
+    if pd.api.types.is_datetime64_any_dtype(s):
+        out = pd.Timestamp(value)
+        tz = getattr(s.dtype, "tz", None)
+        return out.tz_localize(tz) if tz is not None and out.tzinfo is None else out
+    return float(value)
+
+
+def _match(s: pd.Series, query: str) -> np.ndarray:
+    if not query:
+        return np.ones(len(s), dtype=bool)
+    if pd.api.types.is_bool_dtype(s) or not (pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s)):
+        text = s.astype(str).where(s.notna(), "")
+        return text.str.contains(query, case=False, regex=False).to_numpy(dtype=bool, na_value=False)
+    try:
+        rng = _RANGE.match(query)
+        if rng:
+            lo, hi = (_parse_like(v, s) for v in rng.groups())
+            return (s.ge(lo) & s.le(hi)).to_numpy(dtype=bool, na_value=False)
+        cmp = _COMPARE.match(query)
+        op, value = cmp.groups() if cmp else ("=", query)
+        value = _parse_like(value, s)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Cannot filter {s.name!r} by {query!r}: use >x, <=x, =x, !=x, a..b or a value") from e
+    method = {">": "gt", ">=": "ge", "<": "lt", "<=": "le", "=": "eq", "!=": "ne"}[op]
+    return getattr(s, method)(value).to_numpy(dtype=bool, na_value=False)
+
+
+def duplicated_mask(df: pd.DataFrame) -> np.ndarray:
+    """Rows that have an identical row elsewhere in `df` (cached per dataset)."""
+    return dataset_cache(df).get("duplicated_mask", lambda: df.duplicated(keep=False).to_numpy())
+
+
+def data_grid(df: pd.DataFrame) -> DataGrid:
+    """Grid state for `df`, shared by all sessions and released with the frame."""
+    return dataset_cache(df).get("data_grid", lambda: DataGrid(df))
+
+
+# -------- Streamlit UI --------
+def render_data_grid(df: pd.DataFrame, *, key: str, base: str | None = None) -> None:
+    """Paginated grid of `df` with server-side sort and per-column filters; only one page is sent."""
+    import streamlit as st
+
+    grid = data_grid(df)
+    columns = ["(none)"] + [str(c) for c in df.columns]
+    by_name = {str(c): c for c in df.columns}
+
+    c1, c2, c3, c4 = st.columns([2, 1, 2, 3])
+    with c1:
+        sort_name = st.selectbox("Sort by", columns, key=f"{key}_sort")
+    with c2:
+        ascending = st.toggle("Ascending", value=True, key=f"{key}_asc")
+    with c3:
+        filter_name = st.selectbox("Filter column", columns, key=f"{key}_fcol")
+    with c4:
+        query = st.text_input(
+            "Filter", key=f"{key}_fq", disabled=filter_name == "(none)",
+            help="Text: case-insensitive substring. Numbers/dates: >x, >=x, <x, <=x, =x, !=x, a..b or a value.",
+        )
+
+    filters = ((by_name[filter_name], query),) if filter_name != "(none)" and query else ()
+    try:
+        positions = grid.view(sort_col=by_name.get(sort_name), ascending=ascending, filters=filters, base=base)
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    total = len(positions)
+    p1, p2, p3 = st.columns([1, 1, 4])
+    with p1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_size")
+    n_pages = max(1, -(-total // page_size))
+    if st.session_state.get(f"{key}_page", 1) > n_pages:  # view shrank under the current page
+        st.session_state[f"{key}_page"] = n_pages
+    with p2:
+        page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1, key=f"{key}_page")
+    start = (int(page) - 1) * page_size
+    stop = min(start + page_size, total)
+    with p3:
+        scope = f" (filtered from {len(df):,})" if total != len(df) and base is None else ""
+        st.caption(f"Rows {start + 1 if total else 0:,}–{stop:,} of {total:,}{scope} · page {page:,} of {n_pages:,}")
+
+    with timer("grid page", rows=stop - start):
+        st.dataframe(df.iloc[positions[start:stop]], use_container_width=True)
@@ -0,0 +1,89 @@
+# utils/dataset_cache.py
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from typing import Any, Callable, Hashable
+
+import pandas as pd
+
+# Per-dataset cache for derived artifacts (parsed columns, samplers, indexes…).
+#
+# Keyed by the identity of the session DataFrame and released together with
+# it, so replacing `uploaded_df` drops everything derived from the old frame.
+# Session frames are treated as immutable: pages never modify them in place.
+# Entries remember when they were last used, so the memory budget
+# (utils.memory_budget) can drop the least recently used ones; they are simply
+# recomputed on the next `get`.
+
+
+class DatasetCache:
+    """Derived artifacts for one DataFrame (see `dataset_cache`)."""
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = weakref.ref(df)
+        self.n_rows = len(df)
+        self._lock = threading.Lock()
+        self._items: dict[Hashable, Any] = {}
+        self._used: dict[Hashable, float] = {}
+
+    def frame(self) -> pd.DataFrame:
+        df = self._df()
+        if df is None:
+            raise RuntimeError("Dataset is no longer available.")
+        return df
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the artifact stored under `key`, computing it on first use."""
+        with self._lock:
+            if key in self._items:
+                self._used[key] = time.monotonic()
+                return self._items[key]
+        # computed outside the lock; a concurrent miss just computes twice
+        value = compute()
+        with self._lock:
+            self._used[key] = time.monotonic()
+            return self._items.setdefault(key, value)
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            self._used.pop(key, None)
+            return self._items.pop(key, None)
+
+    def entries(self) -> list[tuple[Hashable, Any, float]]:
+        """(key, artifact, last used) of every entry."""
+        with self._lock:
+            return [(k, v, self._used.get(k, 0.0)) for k, v in self._items.items()]
+
+    def keys(self) -> list[Hashable]:
+        with self._lock:
+            return list(self._items)
+
+
+_caches: dict[int, DatasetCache] = {}
+_caches_lock = threading.Lock()
+
+
+def dataset_cache(df: pd.DataFrame) -> DatasetCache:
+    """Shared cache for `df`; created on first use and released with the frame."""
+    key = id(df)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is not None and cache._df() is df and cache.n_rows == len(df):
+            return cache
+        cache = _caches[key] = DatasetCache(df)
+    weakref.finalize(df, _release, key, cache)
+    return cache
+
+
+def dataset_caches() -> list[DatasetCache]:
+    """The caches of all live datasets."""
+    with _caches_lock:
+        return list(_caches.values())
+
+
+def _release(key: int, cache: DatasetCache) -> None:
+    with _caches_lock:
+        if _caches.get(key) is cache:
+            del _caches[key]
@@ -0,0 +1,187 @@
+# utils/dataset_store.py
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+import weakref
+from typing import Any, Callable
+
+import pandas as pd
+
+# Process-wide store of uploaded datasets, shared across Streamlit sessions.
+#
+# All sessions run as threads of one server process, so identical uploads can
+# share one DataFrame: the store is keyed by a content hash of the uploaded
+# bytes, and each session only holds a lease on (a reference to) the shared
+# frame. Frames are read-only by convention (copy-on-write, pages never
+# modify the session frame in place). Leases are reference counted; a dataset
+# with no leases stays cached for a grace period and is then evicted (eviction
+# listeners then release what else is kept per key, e.g. on-disk tables).
+
+DEFAULT_IDLE_TTL_S = 15 * 60
+DEFAULT_MAX_IDLE_BYTES = 2 * 1024 ** 3
+
+
+def content_key(data: bytes, *, kind: str) -> str:
+    """Dataset key for uploaded bytes; `kind` separates parse modes (e.g. "csv", "excel")."""
+    h = hashlib.blake2b(data, digest_size=16)
+    return f"{kind}-{h.hexdigest()}"
+
+
+class DatasetStore:
+    """Reference-counted, content-keyed datasets with idle eviction."""
+
+    def __init__(self, idle_ttl_s: float = DEFAULT_IDLE_TTL_S, max_idle_bytes: int = DEFAULT_MAX_IDLE_BYTES):
+        self.idle_ttl_s = idle_ttl_s
+        self.max_idle_bytes = max_idle_bytes
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._listeners: list[Callable[[str], None]] = []
+
+    def on_evict(self, listener: Callable[[str], None]) -> None:
+        """Call `listener(key)` after a dataset is evicted."""
+        self._listeners.append(listener)
+
+    def _evicted(self, keys: list[str]) -> None:
+        for key in keys:
+            for listener in self._listeners:
+                listener(key)
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry["last_used"] = time.monotonic()
+            return entry["frame"]
+
+    def put(self, key: str, df: pd.DataFrame, *, acquire: bool = False) -> pd.DataFrame:
+        """
+        Store `df` under `key` and return the shared frame (the existing one if
+        another session stored it first). With `acquire`, also take a reference.
+        """
+        nbytes = None
+        with self._lock:
+            known = key in self._entries
+        if not known:
+            nbytes = int(df.memory_usage(deep=True).sum())  # outside the lock: deep sizing is slow
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if nbytes is None:  # evicted in between
+                    nbytes = int(df.memory_usage(deep=True).sum())
+                entry = self._entries[key] = {"frame": df, "bytes": nbytes, "refs": 0}
+            if acquire:
+                entry["refs"] += 1
+            entry["last_used"] = time.monotonic()
+            evicted = self._evict_idle_locked(keep=key)
+            frame = entry["frame"]
+        self._evicted(evicted)
+        return frame
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["refs"] = max(0, entry["refs"] - 1)
+                entry["last_used"] = time.monotonic()
+            evicted = self._evict_idle_locked()
+        self._evicted(evicted)
+
+    def evict_idle(self) -> None:
+        with self._lock:
+            evicted = self._evict_idle_locked()
+        self._evicted(evicted)
+
+    def _evict_idle_locked(self, keep: str | None = None) -> list[str]:
+        """Evict expired or over-budget idle datasets; returns their keys."""
+        evicted = []
+        now = time.monotonic()
+        idle = sorted(
+            ((k, e) for k, e in self._entries.items() if e["refs"] == 0 and k != keep),
+            key=lambda kv: kv[1]["last_used"],
+        )
+        idle_bytes = sum(e["bytes"] for _, e in idle)
+        for k, e in idle:
+            if now - e["last_used"] > self.idle_ttl_s or idle_bytes > self.max_idle_bytes:
+                del self._entries[k]
+                idle_bytes -= e["bytes"]
+                evicted.append(k)
+        return evicted
+
+    def usage(self) -> dict[str, tuple[int, int]]:
+        """Bytes and session count of every stored dataset."""
+        with self._lock:
+            return {k: (e["bytes"], e["refs"]) for k, e in self._entries.items()}
+
+    def shrink(self, nbytes: int) -> int:
+        """Evict idle datasets (least recently used first) until `nbytes` are freed; returns the bytes freed."""
+        freed = 0
+        evicted = []
+        with self._lock:
+            idle = sorted(((k, e) for k, e in self._entries.items() if e["refs"] == 0),
+                          key=lambda kv: kv[1]["last_used"])
+            for k, e in idle:
+                if freed >= nbytes:
+                    break
+                del self._entries[k]
+                freed += e["bytes"]
+                evicted.append(k)
+        self._evicted(evicted)
+        return freed
+
+    def stats(self) -> pd.DataFrame:
+        now = time.monotonic()
+        with self._lock:
+            rows = [
+                {
+                    "dataset": k,
+                    "rows": len(e["frame"]),
+                    "memory_mb": round(e["bytes"] / 1024 ** 2, 2),
+                    "sessions": e["refs"],
+                    "idle_s": 0 if e["refs"] else round(now - e["last_used"], 1),
+                }
+                for k, e in self._entries.items()
+            ]
+        return pd.DataFrame(rows, columns=["dataset", "rows", "memory_mb", "sessions", "idle_s"])
+
+
+_store = DatasetStore()
+
+
+def dataset_store() -> DatasetStore:
+    return _store
+
+
+class DatasetLease:
+    """
+    A session's (already acquired) reference to a shared dataset; released
+    explicitly or when the session state holding it is garbage collected.
+    """
+
+    def __init__(self, key: str, store: DatasetStore | None = None):
+        self.key = key
+        self._finalizer = weakref.finalize(self, (store or _store).release, key)
+
+    def release(self) -> None:
+        self._finalizer()  # runs at most once
+
+
+def attach_session_dataset(session_state, key: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Store `df` (or reuse the identical shared frame) and point the session at it,
+    releasing the session's previous lease. Returns the frame the session now holds.
+    """
+    shared = _store.put(key, df, acquire=True)
+    old = session_state.get("dataset_lease")
+    session_state["dataset_lease"] = DatasetLease(key)
+    session_state["dataset_key"] = key
+    session_state["uploaded_df"] = shared
+    if old is not None:
+        old.release()
+    return shared
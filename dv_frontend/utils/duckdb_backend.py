@@ -0,0 +1,285 @@
+# utils/duckdb_backend.py
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset_store import dataset_store
+from utils.lazy_imports import lazy_import
+
+duckdb = lazy_import("duckdb")
+
+# Optional out-of-core backend for datasets larger than RAM.
+#
+# The uploaded file is loaded into an on-disk DuckDB table instead of a pandas
+# DataFrame. Pages push their heavy work down as SQL (bar group-by, time
+# bucketing, histogram binning, value counts, profiling statistics, sampling)
+# and only pull small result frames into memory. The session still holds a
+# bounded sample frame (`SAMPLE_ROWS`) for column pickers and previews.
+#
+# The table file `<key>.duckdb` lives as long as the sample frame stored under
+# the same key in the dataset store: it is deleted when the store evicts the
+# key. Files left behind by an earlier server process (or an interrupted
+# ingest) are swept on ingest once they are older than the store's idle TTL.
+
+SAMPLE_ROWS = 100_000
+STORAGE_DIR_ENV = "DV_DUCKDB_DIR"
+TEMP_PREFIX = "dv-ingest-"  # uploads spilled to disk and tables being built
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}  # compressed CSVs DuckDB reads directly
+
+# pandas resample frequency -> DuckDB date_trunc part
+_TRUNC = {"D": "day", "W": "week", "M": "month", "Q": "quarter", "Y": "year"}
+_SQL_AGG = {"sum": "sum", "mean": "avg", "median": "median", "min": "min", "max": "max"}
+
+
+def duckdb_available() -> bool:
+    return duckdb is not None
+
+
+def _q(name: str) -> str:
+    """Quote an identifier."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _storage_dir() -> str:
+    path = os.environ.get(STORAGE_DIR_ENV) or os.path.join(tempfile.gettempdir(), "dv_duckdb")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _remove_table(key: str) -> None:
+    """Delete the table file of an evicted dataset (sessions still reading it keep their open handle)."""
+    path = os.path.join(_storage_dir(), f"{key}.duckdb")
+    for p in (path, path + ".wal"):
+        try:
+            os.remove(p)
+        except OSError:
+            pass  # not on disk (in-memory dataset), or still open on Windows: swept later
+
+
+def _sweep_storage() -> None:
+    """Delete table and temp files no stored dataset owns, once they are older than the store's idle TTL."""
+    store = dataset_store()
+    cutoff = time.time() - store.idle_ttl_s
+    for entry in os.scandir(_storage_dir()):
+        try:
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            if entry.name.startswith(TEMP_PREFIX):
+                if entry.is_dir():
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+            elif entry.name.endswith(".duckdb") and not store.contains(entry.name[:-len(".duckdb")]):
+                _remove_table(entry.name[:-len(".duckdb")])
+        except OSError:
+            pass  # removed concurrently
+
+
+dataset_store().on_evict(_remove_table)
+
+
+class DuckDBDataset:
+    """A dataset stored as an on-disk DuckDB table, queried on demand."""
+
+    TABLE = "data"
+
+    def __init__(self, db_path: str):
+        if duckdb is None:
+            raise RuntimeError("duckdb is not installed. Run: pip install duckdb")
+        self.db_path = db_path
+        self._con = duckdb.connect(db_path, read_only=True)
+        self._lock = threading.Lock()
+        self.n_rows = int(self._query(f"SELECT count(*) AS n FROM {self.TABLE}")["n"].iloc[0])
+        schema = self._query(f"DESCRIBE {self.TABLE}")
+        self.columns: list[str] = schema["column_name"].tolist()
+        self.sql_types: dict[str, str] = dict(zip(schema["column_name"], schema["column_type"]))
+
+    # -------- ingest --------
+    @classmethod
+    def ingest(cls, source: str, *, key: str, kind: str = "csv") -> "DuckDBDataset":
+        """Load a CSV/Parquet file into `<storage dir>/<key>.duckdb` (reused if it already exists)."""
+        if duckdb is None:
+            raise RuntimeError("duckdb is not installed. Run: pip install duckdb")
+        _sweep_storage()
+        db_path = os.path.join(_storage_dir(), f"{key}.duckdb")
+        if not os.path.exists(db_path):
+            reader = {"csv": "read_csv_auto", "parquet": "read_parquet"}[kind]
+            # built in a private directory: concurrent ingests of the same key do not share a temp file
+            tmp_dir = tempfile.mkdtemp(prefix=TEMP_PREFIX, dir=_storage_dir())
+            try:
+                tmp_path = os.path.join(tmp_dir, "data.duckdb")
+                con = duckdb.connect(tmp_path)
+                try:
+                    con.execute(f"CREATE TABLE {cls.TABLE} AS SELECT * FROM {reader}(?)", [source])
+                finally:
+                    con.close()
+                os.replace(tmp_path, db_path)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return cls(db_path)
+
+    @classmethod
+    def ingest_bytes(cls, data: bytes, *, key: str, kind: str = "csv", compression: str | None = None) -> "DuckDBDataset":
+        """Spill uploaded bytes to a temp file and ingest it (`compression`: a key of COMPRESSED_SUFFIXES)."""
+        db_path = os.path.join(_storage_dir(), f"{key}.duckdb")
+        if os.path.exists(db_path):
+            return cls(db_path)
+        # DuckDB decompresses gzip/zstd CSVs itself, detected from the file suffix
+        suffix = f".{kind}" + (COMPRESSED_SUFFIXES[compression] if compression else "")
+        fd, src = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=suffix, dir=_storage_dir())
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            return cls.ingest(src, key=key, kind=kind)
+        finally:
+            os.remove(src)
+
+    # -------- helpers --------
+    def _query(self, sql: str, params: Sequence | None = None) -> pd.DataFrame:
+        with self._lock:
+            return self._con.execute(sql, params or []).df()
+
+    def is_numeric(self, col: str) -> bool:
+        t = self.sql_types[col].upper()
+        return any(k in t for k in ("INT", "DOUBLE", "FLOAT", "DECIMAL", "REAL", "NUMERIC"))
+
+    def disk_bytes(self) -> int:
+        return os.path.getsize(self.db_path)
+
+    # -------- sampling --------
+    def sample(self, n: int = SAMPLE_ROWS, seed: int = 1) -> pd.DataFrame:
+        """Deterministic reservoir sample (whole table if it is smaller than `n`)."""
+        if self.n_rows <= n:
+            return self._query(f"SELECT * FROM {self.TABLE}")
+        return self._query(
+            f"SELECT * FROM {self.TABLE} USING SAMPLE reservoir({int(n)} ROWS) REPEATABLE ({int(seed)})"
+        )
+
+    # -------- bar --------
+    def aggregate_for_bar(self, x_col: str, y_col: str | None, agg: str, remove_nulls: bool) -> pd.DataFrame:
+        """Same result shape as the pandas `aggregate_for_bar`: [x_col, "value"]."""
+        x = _q(x_col)
+        where = [f"{x} IS NOT NULL"] if remove_nulls else []
+        if agg == "count":
+            expr = "count(*)"
+        else:
+            assert y_col is not None
+            y = _q(y_col)
+            if remove_nulls:
+                where.append(f"{y} IS NOT NULL")
+            expr = f"count(DISTINCT {y})" if agg == "nunique(y)" else f"{_SQL_AGG[agg]}({y})"
+        sql = f"SELECT {x}, {expr} AS value FROM {self.TABLE}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" GROUP BY {x} ORDER BY {x} NULLS LAST"
+        return self._query(sql)
+
+    # -------- line --------
+    def time_buckets(
+        self,
+        x_col: str,
+        y_cols: list[str],
+        freq: str,
+        agg: str,
+        *,
+        group_col: str | None = None,
+        top_n_groups: int | None = None,
+        drop_missing: bool = False,
+    ) -> pd.DataFrame:
+        """
+        One row per (group, time bucket) with `agg` of every Y column, X = bucket start.
+        Feed the result through the page's pandas resample to get pandas' bucket
+        labels and empty buckets (each bucket holds a single pre-aggregated row).
+        """
+        x = _q(x_col)
+        where = [f"{x} IS NOT NULL"]
+        if drop_missing:
+            where += [f"{_q(y)} IS NOT NULL" for y in y_cols]
+        if group_col and top_n_groups:
+            where.append(
+                f"{_q(group_col)} IN (SELECT {_q(group_col)} FROM {self.TABLE} GROUP BY 1 "
+                f"ORDER BY sum({_q(y_cols[0])}) DESC NULLS LAST LIMIT {int(top_n_groups)})"
+            )
+        bucket = f"date_trunc('{_TRUNC[freq]}', CAST({x} AS TIMESTAMP))"
+        keys = ([_q(group_col)] if group_col else []) + [f"{bucket} AS {x}"]
+        aggs = [f"{_SQL_AGG[agg]}({_q(y)}) AS {_q(y)}" for y in y_cols]
+        sql = (
+            f"SELECT {', '.join(keys + aggs)} FROM {self.TABLE} WHERE {' AND '.join(where)} "
+            f"GROUP BY ALL ORDER BY {x}"
+        )
+        return self._query(sql)
+
+    # -------- distribution --------
+    def value_counts(self, col: str, dropna: bool = True) -> pd.DataFrame:
+        """[col, "count"] sorted by count, like Series.value_counts().reset_index()."""
+        c = _q(col)
+        where = f" WHERE {c} IS NOT NULL" if dropna else ""
+        return self._query(
+            f"SELECT {c}, count(*) AS count FROM {self.TABLE}{where} GROUP BY {c} ORDER BY count DESC"
+        )
+
+    def quantiles(self, col: str, qs: Sequence[float]) -> list[float]:
+        row = self._query(
+            f"SELECT quantile_cont({_q(col)}, ?::DOUBLE[]) AS q FROM {self.TABLE}", [list(qs)]
+        )["q"].iloc[0]
+        return [float(v) for v in row]
+
+    def histogram(self, col: str, bins: int, clip: tuple[float, float] | None = None) -> pd.DataFrame:
+        """Equal-width bins over the (optionally clipped) column: bin_start, bin_end, count."""
+        c = _q(col)
+        v = f"least(greatest({c}, {float(clip[0])}), {float(clip[1])})" if clip else c
+        lo, hi = self._query(f"SELECT min({v}) AS lo, max({v}) AS hi FROM {self.TABLE}").iloc[0]
+        if pd.isna(lo):
+            return pd.DataFrame({"bin_start": [], "bin_end": [], "count": []})
+        lo, hi = float(lo), float(hi)
+        width = (hi - lo) / bins if hi > lo else 1.0
+        counts = self._query(
+            f"SELECT least(floor(({v} - ?) / ?), ?)::BIGINT AS b, count(*) AS count "
+            f"FROM {self.TABLE} WHERE {c} IS NOT NULL GROUP BY b ORDER BY b",
+            [lo, width, bins - 1],
+        )
+        edges = lo + np.arange(bins + 1) * width
+        out = pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": 0})
+        out.loc[counts["b"].to_numpy(), "count"] = counts["count"].to_numpy()
+        return out
+
+    # -------- profile --------
+    def null_counts(self) -> pd.Series:
+        exprs = ", ".join(f"count(*) - count({_q(c)}) AS {_q(c)}" for c in self.columns)
+        return self._query(f"SELECT {exprs} FROM {self.TABLE}").iloc[0].astype("int64")
+
+    def nunique(self) -> pd.Series:
+        exprs = ", ".join(f"count(DISTINCT {_q(c)}) AS {_q(c)}" for c in self.columns)
+        return self._query(f"SELECT {exprs} FROM {self.TABLE}").iloc[0].astype("int64")
+
+    def duplicated_count(self) -> int:
+        return int(self._query(
+            f"SELECT (SELECT count(*) FROM {self.TABLE}) - "
+            f"(SELECT count(*) FROM (SELECT DISTINCT * FROM {self.TABLE})) AS n"
+        )["n"].iloc[0])
+
+    def describe_numeric(self, cols: Sequence[str]) -> pd.DataFrame:
+        """Same layout as DataFrame.describe().T for numeric columns."""
+        rows = {}
+        for col in cols:
+            c = _q(col)
+            r = self._query(
+                f"SELECT count({c}) AS count, avg({c}) AS mean, stddev_samp({c}) AS std, min({c}) AS min, "
+                f"quantile_cont({c}, 0.25) AS \"25%\", quantile_cont({c}, 0.5) AS \"50%\", "
+                f"quantile_cont({c}, 0.75) AS \"75%\", max({c}) AS max FROM {self.TABLE}"
+            ).iloc[0]
+            rows[col] = r.astype(float)
+        return pd.DataFrame(rows).T
+
+
+def session_backend(session_state) -> DuckDBDataset | None:
+    """The session's on-disk backend, if the current dataset was loaded with one."""
+    return session_state.get("dataset_backend")
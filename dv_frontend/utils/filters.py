@@ -0,0 +1,265 @@
+# utils/filters.py
+from __future__ import annotations
+
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset_cache import dataset_cache
+from utils.perf import timer
+
+# Global (cross-page) row filters.
+#
+# The filter bar keeps a list of predicates in session state; every analysis
+# page (bar, line, scatter, distribution, profile) works on the same filtered
+# frame. Predicates compile to bitmaps (packed boolean masks) from per-dataset
+# indexes:
+#   ("in", col, values)      equality: OR of per-value bitmaps over the column's
+#                            factorized codes (built once per value)
+#   ("range", col, lo, hi)   inclusive range: a slice of the column's sorted
+#                            index (argsort + searchsorted)
+# The AND of the predicates' bitmaps and the filtered frame are memoized per
+# filter expression (a frozenset of predicates), so all pages share one frame
+# object — and with it every per-dataset cache — until the filters change.
+# On-disk (DuckDB) datasets are not filtered: their pages aggregate the full table.
+
+FILTERS_KEY = "global_filters"
+MISSING = None               # value of the "(missing)" choice in equality filters
+MAX_CACHED_BITMAPS = 64
+MAX_CACHED_MASKS = 16
+MAX_CACHED_FRAMES = 4
+MAX_LISTED_VALUES = 200      # values offered by the equality filter (most frequent first)
+RANGE_MIN_UNIQUE = 30        # numeric columns with more distinct values get a range filter
+
+
+def _sortable(s: pd.Series) -> pd.Series:
+    """Values comparable with `_bound` (tz-aware datetimes as naive UTC)."""
+    if isinstance(s.dtype, pd.DatetimeTZDtype):
+        return s.dt.tz_convert("UTC").dt.tz_localize(None)
+    return s
+
+
+def _bound(value: Any, s: pd.Series):
+    if pd.api.types.is_datetime64_any_dtype(s):
+        ts = pd.Timestamp(value)
+        return (ts.tz_convert("UTC").tz_localize(None) if ts.tzinfo is not None else ts).to_datetime64()
+    return value
+
+
+class FilterIndex:
+    """Bitmap and sorted indexes, masks and filtered frames of one DataFrame (see `filter_index`)."""
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = weakref.ref(df)
+        self.n_rows = len(df)
+        self._lock = threading.Lock()
+        self._codes: dict[Hashable, tuple[np.ndarray, pd.Index]] = {}
+        self._sorted: dict[Hashable, tuple[np.ndarray, np.ndarray]] = {}
+        self._bitmaps: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._masks: "OrderedDict[frozenset, np.ndarray]" = OrderedDict()
+        self._frames: "OrderedDict[frozenset, pd.DataFrame]" = OrderedDict()
+
+    def _frame(self) -> pd.DataFrame:
+        df = self._df()
+        if df is None:
+            raise RuntimeError("Dataset is no longer available.")
+        return df
+
+    def _cached(self, cache: OrderedDict, key: Hashable, limit: int, compute):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = compute()
+        with self._lock:
+            if key in cache:  # computed concurrently: keep the first (frames must stay one object)
+                return cache[key]
+            cache[key] = value
+            while len(cache) > limit:
+                cache.popitem(last=False)
+        return value
+
+    # -------- indexes --------
+    def codes(self, col: Hashable) -> tuple[np.ndarray, pd.Index]:
+        """Factorized codes of `col` (-1 = missing) and the distinct values."""
+        with self._lock:
+            if col in self._codes:
+                return self._codes[col]
+        with timer("filter index: factorize", rows=self.n_rows):
+            codes, uniques = pd.factorize(self._frame()[col], use_na_sentinel=True)
+        with self._lock:
+            return self._codes.setdefault(col, (codes, pd.Index(uniques)))
+
+    def sorted_index(self, col: Hashable) -> tuple[np.ndarray, np.ndarray]:
+        """Positions of the non-missing values of `col` in ascending order, and those values."""
+        with self._lock:
+            if col in self._sorted:
+                return self._sorted[col]
+        s = _sortable(self._frame()[col])
+        with timer("filter index: sort", rows=self.n_rows):
+            positions = np.flatnonzero(s.notna().to_numpy())
+            values = s.to_numpy()[positions]
+            order = np.argsort(values, kind="stable")
+        with self._lock:
+            return self._sorted.setdefault(col, (positions[order], values[order]))
+
+    # -------- bitmaps --------
+    def value_bitmap(self, col: Hashable, value: Any) -> np.ndarray:
+        """Packed bitmap of the rows where `col == value` (`MISSING` = missing)."""
+        def compute():
+            codes, uniques = self.codes(col)
+            if value is MISSING:
+                code = -1
+            else:
+                try:
+                    code = uniques.get_loc(value)
+                except KeyError:
+                    return np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            return np.packbits(codes == code)
+        return self._cached(self._bitmaps, ("eq", col, value), MAX_CACHED_BITMAPS, compute)
+
+    def range_bitmap(self, col: Hashable, lo: Any, hi: Any) -> np.ndarray:
+        """Packed bitmap of the rows where `lo <= col <= hi` (either bound may be None)."""
+        def compute():
+            positions, values = self.sorted_index(col)
+            s = self._frame()[col]
+            i = 0 if lo is None else np.searchsorted(values, _bound(lo, s), side="left")
+            j = len(values) if hi is None else np.searchsorted(values, _bound(hi, s), side="right")
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[positions[i:j]] = True
+            return np.packbits(mask)
+        return self._cached(self._bitmaps, ("range", col, lo, hi), MAX_CACHED_BITMAPS, compute)
+
+    def predicate_bitmap(self, predicate: tuple) -> np.ndarray:
+        kind, col = predicate[:2]
+        if kind == "in":
+            bits = [self.value_bitmap(col, v) for v in predicate[2]]
+            return np.bitwise_or.reduce(bits) if bits else np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        if kind == "range":
+            return self.range_bitmap(col, predicate[2], predicate[3])
+        raise ValueError(f"Unknown filter predicate {kind!r}")
+
+    # -------- results --------
+    def mask(self, predicates: frozenset) -> np.ndarray:
+        """Boolean mask of the rows matching every predicate."""
+        def compute():
+            with timer("filter mask", rows=self.n_rows):
+                bits = np.bitwise_and.reduce([self.predicate_bitmap(p) for p in predicates])
+                return np.unpackbits(bits, count=self.n_rows).astype(bool)
+        return self._cached(self._masks, predicates, MAX_CACHED_MASKS, compute)
+
+    def filtered(self, predicates: frozenset) -> pd.DataFrame:
+        """The frame restricted to the matching rows (the same object for the same predicates)."""
+        df = self._frame()
+        if not predicates:
+            return df
+        def compute():
+            mask = self.mask(predicates)
+            with timer("filter apply", rows=int(mask.sum())):
+                return df.iloc[np.flatnonzero(mask)]
+        return self._cached(self._frames, predicates, MAX_CACHED_FRAMES, compute)
+
+
+def filter_index(df: pd.DataFrame) -> FilterIndex:
+    """Filter indexes for `df`, shared by all sessions and released with the frame."""
+    return dataset_cache(df).get("filter_index", lambda: FilterIndex(df))
+
+
+def describe_predicate(predicate: tuple) -> str:
+    kind, col = predicate[:2]
+    if kind == "in":
+        shown = ", ".join("(missing)" if v is MISSING else str(v) for v in predicate[2][:5])
+        more = f" +{len(predicate[2]) - 5}" if len(predicate[2]) > 5 else ""
+        return f"{col} ∈ {{{shown}{more}}}"
+    lo, hi = predicate[2:]
+    return f"{'' if lo is None else f'{lo} ≤ '}{col}{'' if hi is None else f' ≤ {hi}'}"
+
+
+def uses_range(s: pd.Series) -> bool:
+    """Range filter for datetimes and high-cardinality numbers, equality otherwise."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return True
+    return (pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)
+            and s.nunique(dropna=True) > RANGE_MIN_UNIQUE)
+
+
+# -------- Streamlit UI --------
+def filtered_dataset(session_state) -> pd.DataFrame | None:
+    """
+    The session dataset with the global filters applied (rendering the filter
+    bar in the sidebar), or None if no dataset is loaded.
+    """
+    import streamlit as st
+    from utils.duckdb_backend import session_backend
+
+    df = session_state.get("uploaded_df")
+    if df is None:
+        return None
+    with st.sidebar.expander("🔍 Global filters", expanded=bool(session_state.get(FILTERS_KEY))):
+        if session_backend(session_state) is not None:
+            st.caption("Not available for on-disk datasets: their charts aggregate the full table.")
+            return df
+        predicates = [p for p in session_state.get(FILTERS_KEY, []) if p[1] in df.columns]
+        session_state[FILTERS_KEY] = predicates
+        _filter_bar(st, df, predicates)
+        out = filter_index(df).filtered(frozenset(predicates))
+        if predicates:
+            st.caption(f"**{len(out):,}** of {len(df):,} rows match.")
+    if out.empty:
+        st.warning("No rows match the global filters. Change or clear them in the sidebar.")
+        st.stop()
+    return out
+
+
+def _filter_bar(st, df: pd.DataFrame, predicates: list[tuple]) -> None:
+    for i, p in enumerate(predicates):
+        c1, c2 = st.columns([5, 1])
+        c1.caption(describe_predicate(p))
+        if c2.button("✕", key=f"gf_del_{i}"):
+            del predicates[i]
+            st.rerun()
+
+    names = {str(c): c for c in df.columns}
+    pick = st.selectbox("Add filter on", ["—"] + list(names), key="gf_col")
+    if pick == "—":
+        predicate = None
+    elif uses_range(df[names[pick]]):
+        col = names[pick]
+        _, values = filter_index(df).sorted_index(col)
+        if len(values) == 0:
+            st.caption("Column has no values.")
+            return
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            lo, hi = pd.Timestamp(values[0]).date(), pd.Timestamp(values[-1]).date()
+            picked = st.date_input("Between", value=(lo, hi), min_value=lo, max_value=hi, key="gf_dates")
+            if len(picked) != 2:
+                return
+            tz = getattr(df[col].dtype, "tz", None)
+            start = pd.Timestamp(picked[0], tz=tz)
+            end = pd.Timestamp(picked[1], tz=tz) + pd.Timedelta(days=1) - pd.Timedelta(1, "us")
+            predicate = ("range", col, start, end)
+        else:
+            lo, hi = float(values[0]), float(values[-1])
+            if lo == hi:
+                hi = lo + 1.0
+            start, end = st.slider("Between", lo, hi, (lo, hi), key="gf_range")
+            predicate = ("range", col, start, end)
+    else:
+        col = names[pick]
+        counts = df[col].value_counts(dropna=False).head(MAX_LISTED_VALUES)
+        labels = {("(missing)" if pd.isna(v) else str(v)): (MISSING if pd.isna(v) else v) for v in counts.index}
+        chosen = st.multiselect("Values", list(labels), key="gf_values",
+                                help=f"The {MAX_LISTED_VALUES} most frequent values are listed.")
+        predicate = ("in", col, tuple(labels[c] for c in chosen)) if chosen else None
+
+    b1, b2 = st.columns(2)
+    if b1.button("Add filter", key="gf_add", disabled=predicate is None):
+        predicates.append(predicate)
+        st.rerun()
+    if predicates and b2.button("Clear all", key="gf_clear"):
+        predicates.clear()
+        st.rerun()
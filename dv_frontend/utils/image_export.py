@@ -1,31 +1,27 @@
 # utils/image_export.py
 from __future__ import annotations
+from concurrent.futures import Future
 from typing import Optional
+from utils.chart_data import altair_chart_spec
+from utils.lazy_imports import lazy_import
+from utils.perf import timed
+from utils.render_pool import render_pool
 
-def altair_to_png(
+vlc = lazy_import("vl_convert")
+
+def png_spec(
     chart,
     *,
-    scale: float = 2.0,
     width: Optional[int] = None,
     height: Optional[int] = None,
     background: Optional[str] = "white"  # Optional: "white" or "transparent"
-) -> bytes:
-    """
-    Export an Altair chart to PNG using vl-convert-python directly.
-    Dependencies: pip install vl-convert-python
-    """
+) -> dict:
+    """Standalone Vega-Lite spec of an Altair chart, ready for PNG conversion."""
     if chart is None:
         raise ValueError("No chart object provided.")
 
-    try:
-        import vl_convert as vlc
-    except Exception as e:
-        raise RuntimeError(
-            "vl-convert-python is not installed. Run: pip install vl-convert-python"
-        ) from e
-
-    # Convert chart to Vega-Lite spec dict
-    spec = chart.to_dict()
+    # Convert chart to Vega-Lite spec dict (named datasets, no max_rows limit)
+    spec = altair_chart_spec(chart, dataset_format="values")
 
     # Inject optional size & background
     if width is not None:
@@ -34,9 +30,35 @@ def altair_to_png(
         spec["height"] = int(height)
     if background is not None:
         spec["background"] = background  # "white" or "transparent"
+    return spec
+
+def submit_png(chart, *, scale: float = 2.0, **spec_kwargs) -> Future:
+    """
+    Queue an Altair chart for PNG export on the renderer pool (utils.render_pool).
+    Returns a future of the PNG bytes; `spec_kwargs` are those of `png_spec`.
+    """
+    if vlc is None:
+        raise RuntimeError(
+            "vl-convert-python is not installed. Run: pip install vl-convert-python"
+        )
+    return render_pool().submit(png_spec(chart, **spec_kwargs), scale=scale)
 
+@timed()
+def altair_to_png(
+    chart,
+    *,
+    scale: float = 2.0,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    background: Optional[str] = "white"  # Optional: "white" or "transparent"
+) -> bytes:
+    """
+    Export an Altair chart to PNG using vl-convert-python (on the renderer pool).
+    Dependencies: pip install vl-convert-python
+    """
+    future = submit_png(chart, scale=scale, width=width, height=height, background=background)
     try:
         # Convert Vega-Lite to PNG bytes
-        return vlc.vegalite_to_png(spec, scale=scale)
+        return future.result()
     except Exception as e:
         raise RuntimeError("PNG export via vl-convert failed.") from e
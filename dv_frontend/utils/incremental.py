@@ -0,0 +1,290 @@
+# utils/incremental.py
+from __future__ import annotations
+
+from typing import Hashable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.compute_engine import compute_engine
+from utils.dataset_cache import dataset_cache
+from utils.null_index import null_index
+from utils.perf import timer
+
+# Mergeable dataset statistics, so appending a slice to a dataset updates its
+# cached profile and bar aggregations instead of recomputing them.
+#
+# The profile (`dataset_profile`) keeps per-column null counts, numeric moments
+# (count, mean, M2, min, max; merged with Chan's formulas), distinct-value
+# counters (exact hash sets, switching to a HyperLogLog sketch past
+# EXACT_DISTINCT_LIMIT values) and the set of row hashes for duplicate counts.
+# Bar aggregations (`cached_bar_aggregate`) of count/sum/min/max/mean are merged
+# per group; median and nunique(y) are not mergeable and are recomputed on use.
+# Anything whose column dtype changed in the append is recomputed as well.
+#
+# `extend_caches(base, combined)` carries whatever the base frame had cached
+# over to the combined frame; `combined` must start with exactly `base`'s rows.
+
+EXACT_DISTINCT_LIMIT = 100_000
+HLL_P = 14  # 2**14 registers: ~0.8% standard error
+PROFILE_KEY = "profile"
+MERGEABLE_BAR_AGGS = ("count", "sum", "min", "max", "mean")
+
+
+def _value_hashes(s: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(s, index=False).to_numpy()
+
+
+# -------- distinct counts --------
+class DistinctCounter:
+    """Distinct non-null values: exact hash set, or an HLL sketch once large."""
+
+    def __init__(self, hashes: np.ndarray | None = None, registers: np.ndarray | None = None):
+        self.hashes = hashes            # sorted unique uint64 (exact)
+        self.registers = registers      # uint8[2**HLL_P] (sketch)
+
+    @classmethod
+    def from_series(cls, s: pd.Series) -> "DistinctCounter":
+        return cls._from_hashes(np.unique(_value_hashes(s.dropna())))
+
+    @classmethod
+    def _from_hashes(cls, unique: np.ndarray) -> "DistinctCounter":
+        if len(unique) <= EXACT_DISTINCT_LIMIT:
+            return cls(hashes=unique)
+        return cls(registers=_hll_registers(unique))
+
+    @property
+    def approximate(self) -> bool:
+        return self.registers is not None
+
+    def merge(self, other: "DistinctCounter") -> "DistinctCounter":
+        if not self.approximate and not other.approximate:
+            return self._from_hashes(np.union1d(self.hashes, other.hashes))
+        return DistinctCounter(registers=np.maximum(self._sketch(), other._sketch()))
+
+    def _sketch(self) -> np.ndarray:
+        return self.registers if self.approximate else _hll_registers(self.hashes)
+
+    def count(self) -> int:
+        if not self.approximate:
+            return len(self.hashes)
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # small-range correction
+        return int(round(estimate))
+
+
+def _hll_registers(hashes: np.ndarray) -> np.ndarray:
+    idx = (hashes >> np.uint64(64 - HLL_P)).astype(np.int64)
+    rest = (hashes << np.uint64(HLL_P)) | np.uint64(1 << (HLL_P - 1))
+    # rank = leading zeros of the remaining bits + 1
+    rank = (65 - np.frexp(rest.astype(np.float64))[1]).astype(np.uint8)
+    registers = np.zeros(1 << HLL_P, dtype=np.uint8)
+    np.maximum.at(registers, idx, rank)
+    return registers
+
+
+# -------- numeric moments --------
+class Moments:
+    """count, mean, M2 (sum of squared deviations), min, max of a numeric column."""
+
+    __slots__ = ("n", "mean", "m2", "min", "max")
+
+    def __init__(self, n: float, mean: float, m2: float, lo: float, hi: float):
+        self.n, self.mean, self.m2, self.min, self.max = n, mean, m2, lo, hi
+
+    @classmethod
+    def from_describe(cls, row: pd.Series) -> "Moments":
+        n = float(row["count"])
+        m2 = float(row["std"]) ** 2 * (n - 1) if n > 1 else 0.0
+        return cls(n, float(row["mean"]), m2, float(row["min"]), float(row["max"]))
+
+    def merge(self, other: "Moments") -> "Moments":
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            return other
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        return Moments(
+            n,
+            self.mean + delta * other.n / n,
+            self.m2 + other.m2 + delta * delta * self.n * other.n / n,
+            min(self.min, other.min),
+            max(self.max, other.max),
+        )
+
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else float("nan")
+
+
+# -------- profile --------
+class ProfileStats:
+    """Mergeable profile of one frame (see module comment)."""
+
+    def __init__(self, n_rows: int, dtypes: pd.Series, nulls: pd.Series, distinct: dict,
+                 moments: dict, row_hashes: np.ndarray, quantiles: pd.DataFrame | None = None):
+        self.n_rows = n_rows
+        self.dtypes = dtypes
+        self.nulls = nulls
+        self.distinct = distinct
+        self.moments = moments
+        self.row_hashes = row_hashes      # sorted unique uint64 per distinct row
+        self._quantiles = quantiles       # 25/50/75% of numeric columns (not mergeable)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ProfileStats":
+        engine = compute_engine()
+        num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        desc = engine.describe_numeric(df, num_cols) if num_cols else None
+        return cls(
+            n_rows=len(df),
+            dtypes=df.dtypes,
+            nulls=null_index(df).null_counts(),
+            distinct={c: DistinctCounter.from_series(df[c]) for c in df.columns},
+            moments={c: Moments.from_describe(desc.loc[c]) for c in num_cols},
+            row_hashes=np.unique(pd.util.hash_pandas_object(df, index=False).to_numpy()),
+            quantiles=desc[["25%", "50%", "75%"]] if desc is not None else None,
+        )
+
+    def extend(self, combined: pd.DataFrame) -> "ProfileStats":
+        """Profile of `combined` (this profile's rows followed by new ones)."""
+        new = combined.iloc[self.n_rows:]
+        part = ProfileStats.from_frame(new)
+        num_cols = combined.select_dtypes(include=[np.number]).columns.tolist()
+        same = [c for c in combined.columns if c in self.dtypes.index and self.dtypes[c] == combined[c].dtype]
+
+        distinct, moments = {}, {}
+        for c in combined.columns:
+            if c in same:
+                distinct[c] = self.distinct[c].merge(part.distinct[c])
+            else:  # new column or changed dtype (hashes differ): recompute
+                distinct[c] = DistinctCounter.from_series(combined[c])
+        for c in num_cols:
+            if c in same:
+                moments[c] = self.moments[c].merge(part.moments[c])
+            else:
+                moments[c] = Moments.from_describe(combined[c].describe())
+
+        if len(same) == combined.shape[1] == len(self.dtypes):
+            row_hashes = np.union1d(self.row_hashes, part.row_hashes)
+        else:  # column set or dtypes changed: row hashes are not comparable
+            row_hashes = np.unique(pd.util.hash_pandas_object(combined, index=False).to_numpy())
+
+        nulls = self.nulls.reindex(combined.columns)
+        nulls = nulls.where(nulls.notna(), self.n_rows).astype("int64") + part.nulls.reindex(combined.columns)
+        return ProfileStats(len(combined), combined.dtypes, nulls.astype("int64"), distinct, moments, row_hashes)
+
+    # -------- results --------
+    def null_counts(self) -> pd.Series:
+        return self.nulls
+
+    def nunique(self) -> pd.Series:
+        return pd.Series({c: d.count() for c, d in self.distinct.items()}, dtype="int64")
+
+    def approximate_nunique(self) -> list[Hashable]:
+        """Columns whose distinct count comes from a sketch (approximate)."""
+        return [c for c, d in self.distinct.items() if d.approximate]
+
+    def duplicated_count(self) -> int:
+        return self.n_rows - len(self.row_hashes)
+
+    def describe_numeric(self, df: pd.DataFrame, cols: Sequence[str]) -> pd.DataFrame:
+        """Like `DataFrame.describe().T` for `cols`; quantiles are computed once per frame."""
+        cols = list(cols)
+        if self._quantiles is None or not set(cols) <= set(self._quantiles.index):
+            self._quantiles = df[cols].quantile([0.25, 0.5, 0.75]).T.set_axis(["25%", "50%", "75%"], axis=1)
+        rows = {
+            c: {"count": m.n, "mean": m.mean, "std": m.std(), "min": m.min, **self._quantiles.loc[c], "max": m.max}
+            for c, m in ((c, self.moments[c]) for c in cols)
+        }
+        return pd.DataFrame.from_dict(rows, orient="index")[["count", "mean", "std", "min", "25%", "50%", "75%", "max"]]
+
+
+def dataset_profile(df: pd.DataFrame) -> ProfileStats:
+    """Cached profile of a (session) frame."""
+    def compute():
+        with timer("profile stats", rows=len(df)):
+            return ProfileStats.from_frame(df)
+    return dataset_cache(df).get(PROFILE_KEY, compute)
+
+
+# -------- bar aggregations --------
+def _bar_key(x_col: str, y_col: str | None, agg: str, remove_nulls: bool) -> tuple:
+    return ("bar", x_col, y_col, agg, bool(remove_nulls))
+
+
+def _group_counts(data: pd.DataFrame, x_col: str, y_col: str, remove_nulls: bool) -> pd.Series:
+    """Non-null Y values per X group (the weights for merging means)."""
+    x, y = data[x_col], data[y_col]
+    if remove_nulls:
+        mask = x.notna() & y.notna()
+        x, y = x[mask], y[mask]
+    return y.notna().groupby(x, dropna=False).sum()
+
+
+def cached_bar_aggregate(data: pd.DataFrame, x_col: str, y_col: str | None, agg: str, remove_nulls: bool) -> pd.DataFrame:
+    """`compute_engine().aggregate_for_bar`, cached per dataset (callers must not modify the result)."""
+    cache = dataset_cache(data)
+    key = _bar_key(x_col, y_col, agg, remove_nulls)
+    if agg == "mean":
+        cache.get(key + ("n",), lambda: _group_counts(data, x_col, y_col, remove_nulls))
+    return cache.get(key, lambda: compute_engine().aggregate_for_bar(data, x_col, y_col, agg, remove_nulls))
+
+
+def _merge_bar(old: pd.DataFrame, new: pd.DataFrame, x_col: str, agg: str,
+               old_n: pd.Series | None = None, new_n: pd.Series | None = None) -> pd.DataFrame:
+    both = pd.concat([old, new], ignore_index=True)
+    if agg == "mean":
+        # weighted by the non-null Y count of each part's group
+        weights = np.concatenate([old[x_col].map(old_n).to_numpy(float), new[x_col].map(new_n).to_numpy(float)])
+        both = both.assign(value=both["value"].fillna(0) * weights, _w=weights)
+        g = both.groupby(x_col, dropna=False, sort=True)[["value", "_w"]].sum()
+        value = g["value"] / g["_w"].where(g["_w"] > 0)
+    else:
+        g = both.groupby(x_col, dropna=False, sort=True)["value"]
+        value = g.sum() if agg in ("count", "sum") else getattr(g, agg)()
+    out = value.rename("value").rename_axis(x_col).reset_index()
+    if out["value"].dtype != old["value"].dtype and not out["value"].isna().any():
+        out["value"] = out["value"].astype(old["value"].dtype)
+    return out
+
+
+def extend_caches(base: pd.DataFrame, combined: pd.DataFrame) -> list[str]:
+    """
+    Seed `combined`'s cache from `base`'s: merge the profile and mergeable bar
+    aggregations with statistics of the appended rows. Returns what was carried.
+    """
+    old, cache = dataset_cache(base), dataset_cache(combined)
+    old_keys = set(old.keys())
+    new = combined.iloc[len(base):]
+    carried = []
+
+    if PROFILE_KEY in old_keys:
+        profile = old.get(PROFILE_KEY, lambda: None)
+        with timer("profile stats (append)", rows=len(new)):
+            cache.get(PROFILE_KEY, lambda: profile.extend(combined))
+        carried.append("profile")
+
+    unchanged = {c for c in base.columns if c in combined.columns and base[c].dtype == combined[c].dtype}
+    for key in old_keys:
+        if not (isinstance(key, tuple) and len(key) == 5 and key[0] == "bar"):
+            continue
+        _, x_col, y_col, agg, remove_nulls = key
+        if agg not in MERGEABLE_BAR_AGGS or not {x_col, y_col or x_col} <= unchanged:
+            continue
+        with timer("aggregate_for_bar (append)", rows=len(new)):
+            part = compute_engine().aggregate_for_bar(new, x_col, y_col, agg, remove_nulls)
+            if agg == "mean":
+                old_n = old.get(key + ("n",), lambda: _group_counts(base, x_col, y_col, remove_nulls))
+                new_n = _group_counts(new, x_col, y_col, remove_nulls)
+                merged = _merge_bar(old.get(key, lambda: None), part, x_col, agg, old_n, new_n)
+                merged_n = pd.concat([old_n, new_n]).groupby(level=0, dropna=False).sum()
+                cache.get(key + ("n",), lambda: merged_n)
+            else:
+                merged = _merge_bar(old.get(key, lambda: None), part, x_col, agg)
+        cache.get(key, lambda: merged)
+        carried.append(f"{agg}({y_col or x_col}) by {x_col}")
+    return list(dict.fromkeys(carried))
@@ -0,0 +1,531 @@
+# utils/ingest.py
+from __future__ import annotations
+
+import bz2
+import csv
+import gzip
+import hashlib
+import io
+import lzma
+import os
+import warnings
+import zipfile
+from typing import BinaryIO, Callable
+
+import numpy as np
+import pandas as pd
+
+from utils.lazy_imports import lazy_import
+
+pa_csv = lazy_import("pyarrow.csv")
+zstandard = lazy_import("zstandard")
+
+# Parsing of uploaded files (shared by the upload page, benchmarks and batch jobs)
+# and appending new slices to a loaded dataset.
+#
+# Compressed uploads (gzip, bz2, xz, zstd, zip) are decompressed as a stream into
+# the CSV parser: the decompressed bytes are never held in memory as a whole.
+#
+# CSVs are parsed by one of two engines: "pandas" (the C parser, single-threaded)
+# or "pyarrow" (pyarrow.csv, multithreaded; strings arrive as Arrow-backed
+# strings and `category` hints as dictionary-encoded categoricals). Both keep the
+# delimiter sniffing fallback and accept schema hints: column -> type, one of
+# HINT_TYPES, with an optional strptime format for datetimes.
+#
+# A load can be narrowed before the full parse (the upload page previews the
+# first PREVIEW_ROWS rows to choose): `usecols` converts only those columns,
+# `nrows` stops after that many rows and `fraction` keeps a seeded Bernoulli
+# sample of them, drawn chunk by chunk so only the kept rows are ever held.
+# Every reader takes these as keyword options next to `engine` and `hints`.
+
+COMPRESSIONS = {".gz": "gzip", ".gzip": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd", ".zip": "zip"}
+EXCEL_SUFFIXES = (".xlsx", ".xls")
+DATASET_SUFFIXES = (".csv",) + EXCEL_SUFFIXES
+PARSE_ENGINES = ("pandas", "pyarrow")
+HINT_TYPES = ("int", "float", "str", "category", "bool", "datetime")
+_PANDAS_HINT_DTYPES = {"int": "Int64", "float": "float64", "str": "str", "category": "category", "bool": "boolean"}
+PREVIEW_ROWS = 1000              # rows parsed to show the schema before the full load
+SAMPLE_SEED = 0
+SAMPLE_CHUNK_ROWS = 200_000      # pandas parses in chunks of this size when sampling
+
+
+def _sniff_delimiter(head: str) -> str:
+    try:
+        return csv.Sniffer().sniff(head, delimiters=[",", ";", "|", "\t"]).delimiter
+    except Exception:
+        return ","
+
+
+# -------- schema hints --------
+def parse_schema_hints(text: str) -> dict[str, str]:
+    """
+    Hints from lines of `column: type` (type in HINT_TYPES; datetimes may add a
+    strptime format, e.g. `date: datetime %d/%m/%Y`). Raises ValueError on bad lines.
+    """
+    hints = {}
+    for n, line in enumerate(text.splitlines(), start=1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        col, sep, spec = line.partition(":")
+        kind, _, fmt = spec.strip().partition(" ")
+        if not sep or not col.strip() or kind not in HINT_TYPES:
+            raise ValueError(f"Line {n}: expected `column: type` with type one of {', '.join(HINT_TYPES)}")
+        if fmt.strip() and kind != "datetime":
+            raise ValueError(f"Line {n}: only datetime hints take a format")
+        hints[col.strip()] = f"{kind} {fmt.strip()}".strip()
+    return hints
+
+
+def parse_options_tag(engine: str = "pandas", hints: dict[str, str] | None = None, *,
+                      usecols: list[str] | None = None, nrows: int | None = None, fraction: float | None = None) -> str:
+    """Suffix for dataset keys: frames parsed with other options must not be shared ("" for the defaults)."""
+    if engine == "pandas" and not hints and usecols is None and nrows is None and fraction is None:
+        return ""
+    options = repr((engine, sorted((hints or {}).items()), usecols, nrows, fraction)).encode()
+    return "-" + hashlib.blake2b(options, digest_size=6).hexdigest()
+
+
+def apply_schema_hints(df: pd.DataFrame, hints: dict[str, str] | None) -> pd.DataFrame:
+    """Convert the hinted columns of an already parsed frame (Excel, Parquet, Arrow) in place."""
+    for col, spec in (hints or {}).items():
+        if col not in df.columns:
+            continue
+        kind, _, fmt = spec.partition(" ")
+        if kind == "datetime":
+            df[col] = pd.to_datetime(df[col], format=fmt or None)
+        elif kind in ("int", "float"):
+            df[col] = pd.to_numeric(df[col]).astype(_PANDAS_HINT_DTYPES[kind])
+        else:
+            df[col] = df[col].astype(_PANDAS_HINT_DTYPES[kind])
+    return df
+
+
+# -------- row limits and sampling --------
+def sample_batches(batches, schema, *, nrows: int | None = None, fraction: float | None = None,
+                   seed: int = SAMPLE_SEED):
+    """
+    Arrow table of the first `nrows` rows of the record `batches`, then a seeded
+    `fraction` of those (stops pulling batches once `nrows` are read).
+    """
+    import pyarrow as pa
+
+    rng = np.random.default_rng(seed)
+    kept, seen = [], 0
+    for batch in batches:
+        if nrows is not None:
+            batch = batch.slice(0, nrows - seen)
+        seen += batch.num_rows
+        if fraction is not None:
+            batch = batch.filter(pa.array(rng.random(batch.num_rows) < fraction))
+        kept.append(batch)
+        if nrows is not None and seen >= nrows:
+            break
+    return pa.Table.from_batches(kept, schema=schema)
+
+
+def take_rows(df: pd.DataFrame, *, nrows: int | None = None, fraction: float | None = None,
+              seed: int = SAMPLE_SEED) -> pd.DataFrame:
+    """`sample_batches` for a parsed frame (the same rows for the same options)."""
+    if nrows is not None:
+        df = df.iloc[:nrows]
+    if fraction is not None:
+        df = df[np.random.default_rng(seed).random(len(df)) < fraction].reset_index(drop=True)
+    return df
+
+
+def _pandas_options(hints: dict[str, str] | None) -> dict:
+    dtype, dates, formats = {}, [], {}
+    for col, spec in (hints or {}).items():
+        kind, _, fmt = spec.partition(" ")
+        if kind == "datetime":
+            dates.append(col)
+            if fmt:
+                formats[col] = fmt
+        else:
+            dtype[col] = _PANDAS_HINT_DTYPES[kind]
+    options = {"dtype": dtype} if dtype else {}
+    if dates:
+        options["parse_dates"] = dates
+    if formats:
+        options["date_format"] = formats
+    return options
+
+
+def _arrow_options(hints: dict[str, str] | None, sep: str):
+    import pyarrow as pa
+
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "bool": pa.bool_(),
+             "category": pa.dictionary(pa.int32(), pa.string()), "datetime": pa.timestamp("us")}
+    column_types, formats = {}, []
+    for col, spec in (hints or {}).items():
+        kind, _, fmt = spec.partition(" ")
+        column_types[col] = types[kind]
+        if fmt:
+            formats.append(fmt)
+    convert = pa_csv.ConvertOptions(
+        column_types=column_types,
+        timestamp_parsers=[pa_csv.ISO8601, *dict.fromkeys(formats)] if formats else None,
+        strings_can_be_null=True,
+    )
+    return pa_csv.ReadOptions(use_threads=True), pa_csv.ParseOptions(delimiter=sep), convert
+
+
+def _parse_csv(source, *, sep: str | None = None, engine: str = "pandas", hints: dict[str, str] | None = None,
+               memory_map: bool = False, usecols: list[str] | None = None, nrows: int | None = None,
+               fraction: float | None = None, seed: int = SAMPLE_SEED) -> pd.DataFrame:
+    """
+    One CSV parse of `source` (bytes stream, binary file object or, with `memory_map`, a path).
+    Only `usecols` are converted (default: all); `nrows` stops after that many rows and
+    `fraction` keeps a seeded sample of them (the same rows with either engine).
+    """
+    if usecols is not None:
+        usecols = list(usecols)
+        hints = {c: h for c, h in (hints or {}).items() if c in usecols}
+    if engine == "pyarrow":
+        if pa_csv is None:
+            raise RuntimeError("pyarrow is not installed. Run: pip install pyarrow")
+        import pyarrow as pa
+        if memory_map:
+            source = pa.memory_map(source)
+        read, parse, convert = _arrow_options(hints, sep or ",")
+        if usecols is not None:
+            convert.include_columns = usecols
+        if nrows is not None or fraction is not None:
+            # streaming reader: blocks are sampled as they are parsed (only the kept rows are
+            # held), and with `nrows` only the blocks holding the first rows are parsed
+            try:
+                reader = pa_csv.open_csv(source, read_options=read, parse_options=parse, convert_options=convert)
+                table = sample_batches(reader, reader.schema, nrows=nrows, fraction=fraction, seed=seed)
+            except pa.ArrowInvalid:
+                # the streaming reader infers types from the first block only; a later block
+                # can contradict them (e.g. ints, then a float), which read_csv reconciles
+                if not (hasattr(source, "seekable") and source.seekable()):
+                    raise
+                source.seek(0)
+                table = pa_csv.read_csv(source, read_options=read, parse_options=parse, convert_options=convert)
+                table = sample_batches(table.to_batches(), table.schema, nrows=nrows, fraction=fraction, seed=seed)
+        else:
+            table = pa_csv.read_csv(source, read_options=read, parse_options=parse, convert_options=convert)
+        for i, field in enumerate(table.schema):
+            if pa.types.is_timestamp(field.type) and field.type.unit != "us":  # same unit as pandas' parser
+                table = table.set_column(i, field.name, table.column(i).cast(pa.timestamp("us", field.type.tz)))
+            elif pa.types.is_date(field.type):  # inferred dates would convert to datetime64[ms]
+                table = table.set_column(i, field.name, table.column(i).cast(pa.timestamp("us")))
+        df = table.to_pandas(date_as_object=False)
+        # nullable dtypes for int/bool hints, as the pandas parser gives (Arrow converts columns with nulls to float/object)
+        for col, spec in (hints or {}).items():
+            kind = spec.partition(" ")[0]
+            if kind in ("int", "bool") and col in df.columns:
+                df[col] = df[col].astype(_PANDAS_HINT_DTYPES[kind])
+        return df
+    if engine != "pandas":
+        raise ValueError(f"Unknown parse engine {engine!r}; expected one of {PARSE_ENGINES}")
+    options = _pandas_options(hints)
+    if sep is not None:
+        options["sep"] = sep
+    if memory_map:
+        options["memory_map"] = True
+    if usecols is not None:
+        options["usecols"] = usecols
+    if nrows is not None:
+        options["nrows"] = nrows
+    if fraction is None:
+        return pd.read_csv(source, **options)
+    # sample chunk by chunk: only the kept rows of each chunk are held
+    rng = np.random.default_rng(seed)
+    with pd.read_csv(source, chunksize=SAMPLE_CHUNK_ROWS, **options) as reader:
+        df = pd.concat([chunk[rng.random(len(chunk)) < fraction] for chunk in reader], ignore_index=True)
+    for col, dtype in options.get("dtype", {}).items():
+        if dtype == "category":  # chunks carry their own category sets
+            df[col] = df[col].astype("category")
+    return df
+
+
+def read_csv_with_sniff(file_bytes: bytes, **options) -> pd.DataFrame:
+    """Try reading CSV with delimiter sniffing fallback (`options`: see `_parse_csv`)."""
+    bio = io.BytesIO(file_bytes)
+    try:
+        return _parse_csv(bio, **options)
+    except Exception:
+        pass
+
+    bio.seek(0)
+    delim = _sniff_delimiter(bio.read(4096).decode(errors="ignore"))
+    bio.seek(0)
+    return _parse_csv(bio, sep=delim, **options)
+
+
+def read_csv_path(path: str, **options) -> pd.DataFrame:
+    """Like `read_csv_with_sniff` for a file on disk, memory-mapped instead of read into memory first."""
+    try:
+        return _parse_csv(path, memory_map=True, **options)
+    except Exception:
+        pass
+
+    with open(path, "rb") as fh:
+        delim = _sniff_delimiter(fh.read(4096).decode(errors="ignore"))
+    return _parse_csv(path, sep=delim, memory_map=True, **options)
+
+
+def read_excel(source, *, hints: dict[str, str] | None = None, usecols: list[str] | None = None,
+               nrows: int | None = None, fraction: float | None = None, seed: int = SAMPLE_SEED,
+               engine: str | None = None) -> pd.DataFrame:
+    """Parse an Excel workbook with the CSV parse options (`engine` does not apply)."""
+    df = pd.read_excel(source, usecols=usecols, nrows=nrows)
+    return apply_schema_hints(take_rows(df, fraction=fraction, seed=seed), hints)
+
+
+def read_dataset_bytes(file_bytes: bytes, *, is_csv: bool, **options) -> pd.DataFrame:
+    """Parse an uploaded CSV or Excel file (`options`: see `_parse_csv`)."""
+    if is_csv:
+        return read_csv_with_sniff(file_bytes, **options)
+    return read_excel(io.BytesIO(file_bytes), **options)
+
+
+# -------- compressed uploads --------
+def split_compression(name: str) -> tuple[str, str | None]:
+    """("data.csv", "gzip") for "data.csv.gz"; (name, None) if the name has no compression suffix."""
+    stem, ext = os.path.splitext(name)
+    compression = COMPRESSIONS.get(ext.lower())
+    return (stem, compression) if compression else (name, None)
+
+
+def zip_dataset_members(fileobj: BinaryIO) -> list[str]:
+    """CSV/Excel members of a zip archive (in archive order)."""
+    fileobj.seek(0)
+    with zipfile.ZipFile(fileobj) as archive:
+        return [
+            info.filename for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(DATASET_SUFFIXES)
+            and not os.path.basename(info.filename).startswith(("._", "~$"))
+        ]
+
+
+def open_decompressed(fileobj: BinaryIO, compression: str, member: str | None = None) -> BinaryIO:
+    """A stream of the decompressed content of `fileobj` (rewound first; left open when the stream closes)."""
+    fileobj.seek(0)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if compression == "bz2":
+        return bz2.BZ2File(fileobj, mode="rb")
+    if compression == "xz":
+        return lzma.LZMAFile(fileobj, mode="rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed. Run: pip install zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+    if compression == "zip":
+        if member is None:
+            raise ValueError("Pick the archive member to load.")
+        return zipfile.ZipFile(fileobj).open(member)
+    raise ValueError(f"Unsupported compression: {compression!r}")
+
+
+def read_csv_stream(open_stream: Callable[[], BinaryIO], **options) -> pd.DataFrame:
+    """
+    Like `read_csv_with_sniff` for a stream (opened by `open_stream`, called again
+    for each attempt): the parser pulls decompressed chunks as it goes.
+    """
+    with open_stream() as fh:
+        try:
+            return _parse_csv(fh, **options)
+        except Exception:
+            pass
+
+    with open_stream() as fh:
+        delim = _sniff_delimiter(fh.read(4096).decode(errors="ignore"))
+    with open_stream() as fh:
+        return _parse_csv(fh, sep=delim, **options)
+
+
+def read_compressed(fileobj: BinaryIO, compression: str, name: str, **options) -> pd.DataFrame:
+    """
+    Parse a compressed upload; `name` is the zip member to load, or the file name
+    without its compression suffix (Excel if it ends in .xlsx/.xls, CSV otherwise).
+    """
+    member = name if compression == "zip" else None
+
+    def open_stream() -> BinaryIO:
+        return open_decompressed(fileobj, compression, member)
+
+    if not name.lower().endswith(EXCEL_SUFFIXES):
+        return read_csv_stream(open_stream, **options)
+    with open_stream() as fh:
+        # Excel readers need random access: zip members seek in place, other streams are buffered
+        return read_excel(fh if compression == "zip" else io.BytesIO(fh.read()), **options)
+
+
+def estimate_frame_bytes(preview: pd.DataFrame, source_bytes: int, *, usecols: list[str] | None = None,
+                         nrows: int | None = None, fraction: float | None = None) -> int:
+    """
+    Rough in-memory size of the full load of a CSV of `source_bytes`, from its
+    preview parse: rows estimated from the preview's size as CSV text, times the
+    preview's memory per row of the kept columns.
+    """
+    n = max(len(preview), 1)
+    text_per_row = max(len(preview.to_csv(index=False).encode()) / n, 1.0)
+    rows = source_bytes / text_per_row
+    if nrows is not None:
+        rows = min(rows, nrows)
+    if fraction is not None:
+        rows *= fraction
+    per_row = preview.memory_usage(deep=True, index=False) / n
+    return int(rows * (per_row if usecols is None else per_row[list(usecols)]).sum())
+
+
+def infer_datetime_columns(df: pd.DataFrame, exclude=()) -> list[str]:
+    """
+    Light datetime inference: text columns whose values all parse as datetimes
+    are converted in place (except `exclude`, e.g. columns with schema hints).
+    Returns the converted column names.
+    """
+    converted = []
+    for col in df.columns:
+        if col in exclude:
+            continue
+        s = df[col]
+        if not (pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)):
+            continue
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)  # "could not infer format" fallback
+                parsed = pd.to_datetime(s)
+        except Exception:
+            continue
+        if getattr(parsed.dtype, "kind", "") == "M":
+            df[col] = parsed
+            converted.append(col)
+    return converted
+
+
+def _empty_like(col: pd.Series, index: pd.Index) -> pd.Series:
+    """
+    All-null column like `col`: same dtype where it can hold nulls, else the type
+    pandas upcasts it to (int -> float, bool -> object), never a filled-in value.
+    """
+    return col.iloc[:0].reindex(index)
+
+
+def _convert_like(values: pd.Series, target: pd.Series) -> pd.Series | None:
+    """`values` converted to `target`'s kind (datetime or numeric) if every non-null value converts."""
+    try:
+        if pd.api.types.is_datetime64_any_dtype(target):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                converted = pd.to_datetime(values, errors="coerce")
+        elif pd.api.types.is_numeric_dtype(target) and not pd.api.types.is_bool_dtype(target):
+            converted = pd.to_numeric(values, errors="coerce")
+        else:
+            return None
+    except (TypeError, ValueError):
+        return None
+    if (converted.isna() & values.notna()).any():
+        return None
+    return converted
+
+
+def append_rows(base: pd.DataFrame, new: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
+    """
+    Append the rows of `new` (a parsed slice) to `base`. Columns are matched by
+    name (new columns are added, missing ones left null); slice columns parsed
+    as text where `base` has datetimes/numbers are converted when every value
+    converts, and categoricals get the union of both category sets. Returns the
+    combined frame and notes on what had to be reconciled. `base` is unchanged.
+    """
+    notes = []
+    extra = [c for c in new.columns if c not in base.columns]
+    missing = [c for c in base.columns if c not in new.columns]
+    if extra:
+        notes.append(f"New columns (empty in earlier rows): {', '.join(map(str, extra))}")
+    if missing:
+        notes.append(f"Columns missing from the new file (left empty): {', '.join(map(str, missing))}")
+
+    aligned = {}
+    for c in base.columns:
+        if c not in new.columns:
+            aligned[c] = _empty_like(base[c], new.index)
+            continue
+        col = new[c]
+        if col.dtype != base[c].dtype and not isinstance(base[c].dtype, pd.CategoricalDtype):
+            converted = _convert_like(col, base[c])
+            if converted is not None:
+                col = converted
+        aligned[c] = col
+    for c in extra:
+        aligned[c] = new[c]
+    combined = pd.concat([base, pd.DataFrame(aligned, index=new.index)], ignore_index=True)
+
+    for c in base.columns:
+        if isinstance(base[c].dtype, pd.CategoricalDtype) and c in new.columns:
+            try:
+                combined[c] = pd.api.types.union_categoricals(
+                    [base[c].array, pd.Categorical(aligned[c])], ignore_order=False
+                )
+            except TypeError:  # ordered with different categories
+                pass
+        if combined[c].dtype != base[c].dtype:
+            notes.append(f"{c}: {base[c].dtype} → {combined[c].dtype}")
+    return combined, notes
+
+
+# -------- Streamlit UI --------
+def load_options_form(preview: pd.DataFrame, *, hints: dict[str, str], key: str) -> dict | None:
+    """
+    Schema of a preview parse plus the choices for the full load: columns to keep,
+    type overrides, a row limit and a sample fraction. Returns the parse options
+    (hints, usecols, nrows, fraction; None where the whole file applies), or None
+    when no column is kept.
+    """
+    import streamlit as st
+
+    per_row = preview.memory_usage(deep=True, index=False) / max(len(preview), 1)
+    examples = [preview[c].dropna() for c in preview.columns]
+    schema = pd.DataFrame({
+        "load": True,
+        "column": [str(c) for c in preview.columns],
+        "parsed as": preview.dtypes.astype(str).to_numpy(),
+        "type": [hints.get(c, "auto").partition(" ")[0] for c in preview.columns],
+        "missing": preview.isna().sum().to_numpy(),
+        "bytes/row": per_row.round(1).to_numpy(),
+        "example": [str(s.iloc[0])[:60] if len(s) else "" for s in examples],
+    })
+    edited = st.data_editor(
+        schema,
+        key=f"{key}_schema",
+        hide_index=True,
+        use_container_width=True,
+        disabled=["column", "parsed as", "missing", "bytes/row", "example"],
+        column_config={
+            "load": st.column_config.CheckboxColumn("load", help="Untick to skip the column in the full parse."),
+            "type": st.column_config.SelectboxColumn(
+                "type", options=["auto", *HINT_TYPES], required=True,
+                help="auto keeps the parser's inference; datetime formats go in the schema hints."),
+            "missing": st.column_config.NumberColumn("missing", help=f"In the first {len(preview):,} rows."),
+        },
+    )
+    c1, c2 = st.columns(2)
+    limit = c1.number_input("Row limit (0 = all rows)", min_value=0, value=0, step=10_000, key=f"{key}_limit")
+    fraction = c2.slider("Sample fraction", min_value=0.01, max_value=1.0, value=1.0, step=0.01,
+                         key=f"{key}_fraction",
+                         help="Keeps each row with this probability (seeded: reloading keeps the same rows), "
+                              "within the row limit.")
+
+    keep = [c for c, on in zip(preview.columns, edited["load"]) if on]
+    if not keep:
+        st.warning("Keep at least one column.")
+        return None
+    chosen = {}
+    for c, kind in zip(preview.columns, edited["type"]):
+        if kind != "auto" and c in keep:
+            hinted = hints.get(c, "")
+            chosen[c] = hinted if hinted.partition(" ")[0] == kind else kind  # keeps a hinted datetime format
+    if len(keep) < len(preview.columns):
+        share = per_row[keep].sum() / max(per_row.sum(), 1e-9)
+        st.caption(f"Loading **{len(keep)} of {len(preview.columns)} columns** "
+                   f"(about {share:.0%} of the preview's memory per row).")
+    return {
+        "hints": chosen,
+        "usecols": keep if len(keep) < len(preview.columns) else None,
+        "nrows": int(limit) or None,
+        "fraction": fraction if fraction < 1 else None,
+    }
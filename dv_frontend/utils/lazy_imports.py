@@ -0,0 +1,100 @@
+# utils/lazy_imports.py
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+from types import ModuleType
+
+# Deferred imports of heavy optional libraries.
+#
+# Cold imports of altair, pyarrow, reportlab, polars, duckdb … take from tens to
+# hundreds of milliseconds each. `lazy_import` returns a stand-in that imports the
+# module on first attribute access (or None if it is not installed, matching the
+# `try: import x except: x = None` pattern), so a page only pays for what it uses.
+# `prewarm` imports the usual suspects on a background thread while the dashboard
+# renders, so the first chart page finds them already in `sys.modules`.
+# First-import durations are recorded and available from `import_timings()`.
+
+PREWARM_MODULES = ("altair", "pyarrow", "vl_convert", "reportlab.platypus", "reportlab.lib.styles")
+
+_timings: dict[str, dict] = {}
+_timings_lock = threading.Lock()
+_prewarm_thread: threading.Thread | None = None
+
+
+def _import(name: str) -> ModuleType:
+    # import_module (not a sys.modules lookup) waits for an import in progress on another thread
+    cold = name not in sys.modules
+    t0 = time.perf_counter()
+    module = importlib.import_module(name)
+    if cold:
+        with _timings_lock:
+            _timings.setdefault(name, _entry(name, time.perf_counter() - t0))
+    return module
+
+
+def _entry(step: str, seconds: float) -> dict:
+    return {"step": step, "seconds": round(seconds, 4), "thread": threading.current_thread().name}
+
+
+class LazyModule:
+    """Stand-in for a module; the real import happens on first attribute access."""
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+
+    def _load(self) -> ModuleType:
+        return _import(self._name)
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}>"
+
+
+def is_installed(name: str) -> bool:
+    """Whether `name` can be imported (checked without importing it)."""
+    try:
+        return importlib.util.find_spec(name.partition(".")[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def lazy_import(name: str) -> LazyModule | None:
+    """A lazily imported module, or None if it is not installed."""
+    return LazyModule(name) if is_installed(name) else None
+
+
+def prewarm(modules=PREWARM_MODULES) -> None:
+    """Import `modules` on a daemon thread (once per process); failures are ignored."""
+    global _prewarm_thread
+    with _timings_lock:
+        if _prewarm_thread is not None:
+            return
+
+        def run():
+            for name in modules:
+                if is_installed(name):
+                    try:
+                        _import(name)
+                    except Exception:
+                        pass
+
+        _prewarm_thread = threading.Thread(target=run, name="dv-prewarm", daemon=True)
+    _prewarm_thread.start()
+
+
+def record_timing(label: str, seconds: float) -> None:
+    """Record a startup step (kept from the first, cold run only)."""
+    with _timings_lock:
+        _timings.setdefault(label, _entry(label, seconds))
+
+
+def import_timings() -> list[dict]:
+    """Recorded first-import and startup durations: step, seconds, thread."""
+    with _timings_lock:
+        return list(_timings.values())
@@ -0,0 +1,156 @@
+# utils/line_prep.py
+from __future__ import annotations
+
+import pandas as pd
+
+from utils.column_access import column_view, parsed_datetime
+from utils.compute_engine import compute_engine
+from utils.null_index import null_index
+from utils.perf import timer
+from utils.time_index import time_index
+
+# Line-chart data pipeline: select rows -> resample -> fill -> rolling -> normalize.
+# The line page runs the steps separately (the on-disk backend replaces the first
+# two with SQL); `prepare_line_data` runs them all for benchmarks and batch jobs.
+
+NO_RESAMPLE = "Auto (no resample)"
+
+
+def select_line_rows(
+    data: pd.DataFrame,
+    x_col: str,
+    y_cols: list[str],
+    *,
+    group_col: str | None = None,
+    is_time: bool = False,
+    missing: str = "ffill",
+    top_n_groups: int | None = None,
+    time_range: tuple | None = None,
+) -> pd.DataFrame:
+    """
+    Selected columns (X parsed as datetime), missing rows dropped, top-N groups kept.
+    Time X: rows come in time order from the dataset's sorted index (rows without
+    a time are dropped), restricted to `time_range` (start, end) if given.
+    """
+    # Read-only view of the selected columns; only columns replaced below get new memory
+    work = column_view(data, [x_col] + y_cols + ([group_col] if group_col else []))
+
+    # Handle missing X or Y rows (from the dataset's null bitmaps; the time index already
+    # leaves out rows without a time); other modes fill after sorting/grouping
+    valid = null_index(data).valid_mask(y_cols + ([] if is_time else [x_col])) if missing == "drop" else None
+
+    # Parse/convert X (parsed once per dataset); time windows are a slice of the sorted index
+    if is_time:
+        rows = time_index(data, x_col).window(*(time_range or (None, None)))
+        if valid is not None:
+            rows = rows[valid[rows]]
+        work = work.iloc[rows]
+        work[x_col] = parsed_datetime(data, x_col).array[rows]
+    elif valid is not None:
+        work = work[valid]
+
+    # For grouped lines, keep top-N groups by aggregate on first Y column
+    if group_col and top_n_groups:
+        totals = work.groupby(group_col, dropna=False)[y_cols[0]].sum(numeric_only=True)
+        keep = totals.sort_values(ascending=False).head(int(top_n_groups)).index
+        work = work[work[group_col].isin(keep)]
+    return work
+
+
+def resample_if_needed(
+    d: pd.DataFrame,
+    x_col: str,
+    y_cols: list[str],
+    *,
+    is_time: bool,
+    freq: str,
+    agg: str,
+    group_col: str | None = None,
+) -> pd.DataFrame:
+    if not is_time or freq == NO_RESAMPLE:
+        return d
+    with timer("resample", rows=len(d)):
+        return compute_engine().resample(d, x_col, y_cols, freq, agg, group_col)
+
+
+def sort_by_x(work: pd.DataFrame, x_col: str, group_col: str | None = None) -> pd.DataFrame:
+    """Rows ordered by (group, X); presorted X (time index) only needs a stable sort by group."""
+    if work[x_col].is_monotonic_increasing:
+        return work.sort_values(group_col, kind="stable") if group_col else work
+    return work.sort_values(([group_col] if group_col else []) + [x_col])
+
+
+def finish_line_data(
+    work: pd.DataFrame,
+    x_col: str,
+    y_cols: list[str],
+    *,
+    group_col: str | None = None,
+    is_time: bool = False,
+    missing: str = "ffill",
+    rolling: int = 0,
+    normalize: bool = False,
+) -> pd.DataFrame:
+    """Fill/interpolate, rolling smoothing and normalization (after resampling)."""
+    # Fill/interpolate after resample/sort
+    if missing in ("ffill", "interpolate"):
+        work = sort_by_x(work, x_col, group_col)
+        if missing == "ffill":
+            work[y_cols] = work.groupby(group_col)[y_cols].ffill() if group_col else work[y_cols].ffill()
+        elif missing == "interpolate":
+            # time-aware interpolation if datetime
+            if is_time:
+                if group_col:
+                    work[y_cols] = work.groupby(group_col)[y_cols].apply(lambda g: g.set_index(work.loc[g.index, x_col]).interpolate(method="time").reset_index(drop=True))
+                else:
+                    work = work.set_index(x_col)
+                    work[y_cols] = work[y_cols].interpolate(method="time")
+                    work = work.reset_index()
+            else:
+                work[y_cols] = work.groupby(group_col)[y_cols].interpolate() if group_col else work[y_cols].interpolate()
+
+    # Rolling smoothing
+    if rolling and rolling > 0:
+        if group_col:
+            work[y_cols] = work.groupby(group_col, group_keys=False)[y_cols].apply(lambda s: s.rolling(int(rolling), min_periods=1).mean())
+        else:
+            work[y_cols] = work[y_cols].rolling(int(rolling), min_periods=1).mean()
+
+    # Normalize to 100 per series (use first non-null per series)
+    if normalize:
+        if group_col:
+            for g in work[group_col].dropna().unique():
+                mask = work[group_col] == g
+                for y in y_cols:
+                    first = work.loc[mask & work[y].notna(), y].iloc[:1]
+                    if not first.empty and first.values[0] != 0:
+                        work.loc[mask, y] = work.loc[mask, y] / first.values[0] * 100.0
+        else:
+            for y in y_cols:
+                first = work.loc[work[y].notna(), y].iloc[:1]
+                if not first.empty and first.values[0] != 0:
+                    work[y] = work[y] / first.values[0] * 100.0
+    return work
+
+
+def prepare_line_data(
+    data: pd.DataFrame,
+    x_col: str,
+    y_cols: list[str],
+    *,
+    group_col: str | None = None,
+    is_time: bool = False,
+    freq: str = NO_RESAMPLE,
+    agg: str = "sum",
+    missing: str = "ffill",
+    rolling: int = 0,
+    normalize: bool = False,
+    top_n_groups: int | None = 10,
+    time_range: tuple | None = None,
+) -> pd.DataFrame:
+    """The full line pipeline on an in-memory frame."""
+    work = select_line_rows(data, x_col, y_cols, group_col=group_col, is_time=is_time,
+                            missing=missing, top_n_groups=top_n_groups, time_range=time_range)
+    work = resample_if_needed(work, x_col, y_cols, is_time=is_time, freq=freq, agg=agg, group_col=group_col)
+    return finish_line_data(work, x_col, y_cols, group_col=group_col, is_time=is_time,
+                            missing=missing, rolling=rolling, normalize=normalize)
@@ -0,0 +1,221 @@
+# utils/local_files.py
+from __future__ import annotations
+
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from utils.dataset_store import content_key
+from utils.ingest import SAMPLE_SEED, apply_schema_hints, read_csv_path, read_excel, sample_batches, take_rows
+from utils.lazy_imports import lazy_import
+
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+
+# Ingest of files that already sit on the server's disk.
+#
+# Files are read straight from allow-listed directories (DV_DATA_DIRS, separated
+# by os.pathsep; the feature is off when unset) instead of streaming through the
+# browser and the websocket into an in-memory upload. CSV, Parquet and Arrow
+# files are memory-mapped by their parsers, so no copy of the raw file is held
+# in Python. Several files are parsed in parallel (the parsers release the GIL)
+# and concatenated. Paths are resolved (symlinks included) and must stay inside
+# an allowed directory. Dataset keys come from path, size and modification time,
+# so sessions loading the same unchanged files share one frame.
+
+DATA_DIRS_ENV = "DV_DATA_DIRS"
+LOCAL_EXTENSIONS = {
+    ".csv": "csv", ".tsv": "csv", ".txt": "csv",
+    ".parquet": "parquet", ".pq": "parquet",
+    ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow",
+    ".xlsx": "excel", ".xls": "excel",
+}
+MAX_LISTED_ENTRIES = 500
+MAX_PARALLEL_READS = 8
+
+
+def allowed_roots() -> list[str]:
+    """The allow-listed data directories that exist (resolved)."""
+    raw = os.environ.get(DATA_DIRS_ENV, "")
+    roots = [os.path.realpath(os.path.expanduser(p)) for p in raw.split(os.pathsep) if p.strip()]
+    return [r for r in dict.fromkeys(roots) if os.path.isdir(r)]
+
+
+def resolve_local_path(path: str) -> str:
+    """`path` resolved; raises PermissionError if it is outside every allowed directory."""
+    real = os.path.realpath(os.path.expanduser(path))
+    for root in allowed_roots():
+        if os.path.commonpath([real, root]) == root:
+            return real
+    raise PermissionError(f"{path} is not inside an allowed data directory ({DATA_DIRS_ENV}).")
+
+
+def file_kind(path: str) -> str | None:
+    """"csv", "parquet", "arrow" or "excel" from the extension; None if not a dataset file."""
+    return LOCAL_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def list_directory(path: str) -> pd.DataFrame:
+    """Subdirectories and dataset files of an allowed directory: name, type, size_mb, modified, path."""
+    real = resolve_local_path(path)
+    rows = []
+    with os.scandir(real) as entries:
+        for e in entries:
+            if e.name.startswith("."):
+                continue
+            try:
+                resolve_local_path(e.path)  # symlinks must not lead out of the allowed directories
+            except PermissionError:
+                continue
+            try:
+                is_dir = e.is_dir()
+                if not is_dir and file_kind(e.name) is None:
+                    continue
+                st = e.stat()
+            except OSError:
+                continue
+            rows.append({
+                "name": e.name + ("/" if is_dir else ""),
+                "type": "directory" if is_dir else file_kind(e.name),
+                "size_mb": None if is_dir else round(st.st_size / 1024 ** 2, 2),
+                "modified": datetime.fromtimestamp(st.st_mtime),
+                "path": e.path,
+            })
+    rows.sort(key=lambda r: (r["type"] != "directory", r["name"].lower()))  # folders first
+    return pd.DataFrame(rows[:MAX_LISTED_ENTRIES], columns=["name", "type", "size_mb", "modified", "path"])
+
+
+def local_files_key(paths: list[str], *, kind: str = "local") -> str:
+    """Dataset key for files on disk (path, size and modification time of each)."""
+    stamp = [(p, os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in paths]
+    return content_key(repr(stamp).encode(), kind=kind)
+
+
+def read_local_file(path: str, **options) -> pd.DataFrame:
+    """
+    Parse one dataset file from disk (memory-mapped for CSV, Parquet and Arrow).
+    `options` are the CSV parse options (see `utils.ingest`); `engine` applies to CSV only.
+    """
+    kind = file_kind(path)
+    if kind == "csv":
+        return read_csv_path(path, **options)
+    if kind == "excel":
+        return read_excel(path, **options)
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed. Run: pip install pyarrow")
+    usecols, nrows, fraction = options.get("usecols"), options.get("nrows"), options.get("fraction")
+    if kind == "parquet":
+        source = pq.ParquetFile(path, memory_map=True)
+        if nrows is not None:  # only the leading row groups are decoded
+            schema = source.schema_arrow
+            if usecols is not None:
+                schema = pa.schema([schema.field(c) for c in usecols], metadata=schema.metadata)
+            table = sample_batches(source.iter_batches(columns=usecols), schema, nrows=nrows)
+        else:
+            table = source.read(columns=usecols, use_pandas_metadata=True)
+    elif kind == "arrow":
+        with pa.memory_map(path) as source:
+            try:
+                table = pa.ipc.open_file(source).read_all()
+            except pa.ArrowInvalid:  # IPC stream format
+                source.seek(0)
+                table = pa.ipc.open_stream(source).read_all()
+        if usecols is not None:
+            table = table.select(usecols)
+        if nrows is not None:
+            table = table.slice(0, nrows)
+    else:
+        raise ValueError(f"Unsupported file type: {os.path.basename(path)}")
+    if fraction is not None:
+        table = sample_batches(table.to_batches(), table.schema, fraction=fraction,
+                               seed=options.get("seed", SAMPLE_SEED))
+    return apply_schema_hints(table.to_pandas(), options.get("hints"))
+
+
+def read_local_files(paths: list[str], *, max_workers: int | None = None, **options) -> tuple[pd.DataFrame, list[str]]:
+    """
+    Parse `paths` in parallel and concatenate them in the given order. Returns the
+    frame and notes on columns not present in every file (left empty there).
+    `options` apply to every file; a row limit also caps the combined rows. A
+    sample fraction uses a different seed per file, so files with the same
+    layout do not keep the same row offsets.
+    """
+    paths = [resolve_local_path(p) for p in paths]
+    if not paths:
+        raise ValueError("No files selected.")
+    workers = max_workers or min(len(paths), MAX_PARALLEL_READS, os.cpu_count() or 1)
+    nrows, fraction = options.get("nrows"), options.get("fraction")
+    combined_sample = len(paths) > 1 and nrows is not None and fraction is not None
+    # a limit over several files is taken on the combined rows, then sampled
+    file_options = dict(options, fraction=None) if combined_sample else options
+    seed = options.get("seed", SAMPLE_SEED)
+    reads = [functools.partial(read_local_file, p, **dict(file_options, seed=seed + i))
+             for i, p in enumerate(paths)]
+    if len(paths) == 1 or workers <= 1:
+        frames = [read() for read in reads]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dv-local-read") as pool:
+            frames = list(pool.map(lambda read: read(), reads))
+    if len(frames) == 1:
+        return frames[0], []
+    notes = []
+    columns = list(dict.fromkeys(c for f in frames for c in f.columns))
+    partial = [c for c in columns if not all(c in f.columns for f in frames)]
+    if partial:
+        notes.append(f"Columns missing from some files (left empty there): {', '.join(map(str, partial))}")
+    df = pd.concat(frames, ignore_index=True)
+    if nrows is not None:
+        df = take_rows(df, nrows=nrows, fraction=fraction if combined_sample else None, seed=seed)
+    return df, notes
+
+
+# -------- Streamlit UI --------
+def local_file_picker(*, key: str) -> list[str]:
+    """
+    Browse the allowed data directories and pick dataset files; returns the
+    selected paths (possibly several, loaded in the listed order).
+    """
+    import streamlit as st
+
+    roots = allowed_roots()
+    dir_key = f"{key}_dir"
+    current = st.session_state.get(dir_key)
+    try:
+        current = resolve_local_path(current) if current else roots[0]
+    except PermissionError:
+        current = roots[0]
+    if len(roots) > 1:
+        root = st.selectbox("Data directory", roots, index=next(
+            (i for i, r in enumerate(roots) if os.path.commonpath([current, r]) == r), 0), key=f"{key}_root")
+        if os.path.commonpath([current, root]) != root:
+            current = root
+    else:
+        root = roots[0]
+    st.session_state[dir_key] = current
+
+    c1, c2 = st.columns([1, 6])
+    if c1.button("⬆️ Up", key=f"{key}_up", disabled=current == root):
+        st.session_state[dir_key] = os.path.dirname(current)
+        st.rerun()
+    c2.caption(f"📁 `{current}`")
+
+    listing = list_directory(current)
+    subdirs = listing[listing["type"] == "directory"]
+    if not subdirs.empty:
+        pick = st.selectbox("Open folder", ["—"] + subdirs["name"].tolist(), key=f"{key}_open_{current}")
+        if pick != "—":
+            st.session_state[dir_key] = subdirs.loc[subdirs["name"] == pick, "path"].iloc[0]
+            del st.session_state[f"{key}_open_{current}"]
+            st.rerun()
+    files = listing[listing["type"] != "directory"]
+    if files.empty:
+        st.caption("No CSV, Parquet, Arrow or Excel files in this directory.")
+        return []
+    st.dataframe(files.drop(columns="path"), use_container_width=True, hide_index=True,
+                 column_config={"modified": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm")})
+    chosen = st.multiselect("Files to load (concatenated in this order)", files["name"].tolist(),
+                            key=f"{key}_files_{current}")
+    return [os.path.join(current, name) for name in chosen]
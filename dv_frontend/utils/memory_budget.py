@@ -0,0 +1,429 @@
+# utils/memory_budget.py
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import types
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Hashable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from utils.chart_data import chart_data_cache_bytes, clear_chart_data_cache
+from utils.dataset_cache import dataset_caches
+from utils.dataset_store import dataset_store
+from utils.ingest import take_rows
+
+# Memory accounting and budgets for session state and shared caches.
+#
+# Every session-state value and cache entry is sized deeply (frames with their
+# string payloads, arrays and Arrow data by buffer, containers and object
+# attributes recursively). Artifacts that can be regenerated on demand (PDF
+# reports, upload previews) are kept in a per-session LRU registry instead of
+# bare session-state keys. Two budgets apply: per session (DV_SESSION_MEMORY_MB)
+# and for the whole server process (DV_PROCESS_MEMORY_MB); 0 disables one.
+# When a budget is exceeded, regenerable memory is evicted least recently used
+# first: the session's own artifacts for the session budget; idle shared
+# datasets, the chart data cache, artifacts of all sessions and per-dataset
+# derived caches for the process budget. Datasets in use are never evicted;
+# instead, new loads go through admission control: a load that would not fit
+# is downsampled to a seeded random sample that does (DV_ADMISSION=downsample,
+# the default) or rejected (DV_ADMISSION=reject).
+
+SESSION_BUDGET_ENV = "DV_SESSION_MEMORY_MB"
+PROCESS_BUDGET_ENV = "DV_PROCESS_MEMORY_MB"
+ADMISSION_ENV = "DV_ADMISSION"
+DEFAULT_SESSION_BUDGET_MB = 2048
+DEFAULT_PROCESS_BUDGET_MB = 8192
+ADMISSION_POLICIES = ("downsample", "reject")
+ARTIFACTS_KEY = "memory_artifacts"
+MIN_SAMPLE_FRACTION = 0.01
+ADMISSION_HEADROOM = 0.95        # downsampled loads aim below the available memory
+MAX_SIZE_DEPTH = 64
+LISTED_STATE_BYTES = 64 * 1024   # smaller session-state values are summed into one row
+MAX_EVICTION_NOTES = 10
+
+
+class BudgetExceeded(MemoryError):
+    """A load was rejected by admission control."""
+
+
+def _env_bytes(name: str, default_mb: int) -> int | None:
+    try:
+        mb = float(os.environ.get(name, default_mb))
+    except ValueError:
+        mb = default_mb
+    return int(mb * 1024 ** 2) if mb > 0 else None
+
+
+def session_budget() -> int | None:
+    """Per-session budget in bytes (None: unlimited)."""
+    return _env_bytes(SESSION_BUDGET_ENV, DEFAULT_SESSION_BUDGET_MB)
+
+
+def process_budget() -> int | None:
+    """Process-wide budget in bytes (None: unlimited)."""
+    return _env_bytes(PROCESS_BUDGET_ENV, DEFAULT_PROCESS_BUDGET_MB)
+
+
+def admission_policy() -> str:
+    policy = os.environ.get(ADMISSION_ENV, "downsample").strip().lower()
+    return policy if policy in ADMISSION_POLICIES else "downsample"
+
+
+def _mb(nbytes: int | float) -> str:
+    return f"{nbytes / 1024 ** 2:,.1f} MB"
+
+
+# -------- sizing --------
+def deep_sizeof(obj: Any, _seen: set[int] | None = None, _depth: int = 0) -> int:
+    """
+    Approximate bytes held by `obj`: frames deep, arrays and Arrow/Polars data by
+    buffer, containers and object attributes recursively (each object counted
+    once; weak references, functions, classes and modules are not followed).
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return int(pd.Series(obj.ravel()).memory_usage(deep=True, index=False))
+        return int(obj.nbytes)
+    if isinstance(obj, memoryview):
+        return int(obj.nbytes)
+    module = type(obj).__module__ or ""
+    if module.startswith("pyarrow") and hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if module.startswith("polars") and hasattr(obj, "estimated_size"):
+        return int(obj.estimated_size())
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))) or _depth >= MAX_SIZE_DEPTH:
+        return size
+    if isinstance(obj, (weakref.ref, weakref.finalize, type, types.ModuleType, types.FunctionType,
+                        types.BuiltinFunctionType, types.MethodType)):
+        return size
+    if isinstance(obj, Future):
+        done = obj.done() and not obj.cancelled() and obj.exception() is None
+        return size + (deep_sizeof(obj.result(), seen, _depth + 1) if done else 0)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen, _depth + 1) + deep_sizeof(v, seen, _depth + 1) for k, v in list(obj.items()))
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(v, seen, _depth + 1) for v in list(obj))
+    attrs = getattr(obj, "__dict__", None)
+    if isinstance(attrs, dict):
+        size += deep_sizeof(attrs, seen, _depth + 1)
+    return size
+
+
+# -------- regenerable session artifacts --------
+_registries: "weakref.WeakSet[SessionArtifacts]" = weakref.WeakSet()
+
+
+class SessionArtifacts:
+    """A session's regenerable artifacts with their sizes, least recently used first."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, dict[str, Any]]" = OrderedDict()
+        self.evicted: list[str] = []   # labels of recently evicted artifacts (newest last)
+        _registries.add(self)
+
+    def put(self, key: Hashable, value: Any, *, label: str) -> Any:
+        nbytes = deep_sizeof(value)
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = {"value": value, "bytes": nbytes, "label": label, "last_used": time.monotonic()}
+        return value
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            item["last_used"] = time.monotonic()
+            self._items.move_to_end(key)
+            return item["value"]
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> int:
+        with self._lock:
+            freed = sum(i["bytes"] for i in self._items.values())
+            self._items.clear()
+        return freed
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(i["bytes"] for i in self._items.values())
+
+    def oldest(self) -> tuple[Hashable, float] | None:
+        """Key and last-use time of the least recently used artifact."""
+        with self._lock:
+            if not self._items:
+                return None
+            key = next(iter(self._items))
+            return key, self._items[key]["last_used"]
+
+    def evict(self, key: Hashable) -> int:
+        """Drop `key`, noting it as evicted; returns the bytes freed."""
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return 0
+            self.evicted.append(item["label"])
+            del self.evicted[:-MAX_EVICTION_NOTES]
+            return item["bytes"]
+
+    def rows(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [{"item": i["label"], "kind": "artifact", "bytes": i["bytes"], "regenerable": True,
+                     "note": f"used {now - i['last_used']:,.0f} s ago"} for i in self._items.values()]
+
+
+def session_artifacts(session_state) -> SessionArtifacts:
+    arts = session_state.get(ARTIFACTS_KEY)
+    if arts is None:
+        arts = session_state[ARTIFACTS_KEY] = SessionArtifacts()
+    return arts
+
+
+def remember(session_state, key: Hashable, value: Any, *, label: str) -> Any:
+    """Keep a regenerable artifact in the session (evictable under the budgets); returns `value`."""
+    session_artifacts(session_state).put(key, value, label=label)
+    enforce_budgets(session_state)
+    return value
+
+
+def recall(session_state, key: Hashable) -> Any:
+    """A remembered artifact, or None if it was never made or has been evicted."""
+    return session_artifacts(session_state).get(key)
+
+
+def forget(session_state, key: Hashable) -> None:
+    session_artifacts(session_state).pop(key)
+
+
+# -------- accounting --------
+def session_usage(session_state) -> pd.DataFrame:
+    """Memory held by one session: item, kind, bytes, regenerable, note (largest first)."""
+    store = dataset_store().usage()
+    rows, small, small_bytes = [], 0, 0
+    df = session_state.get("uploaded_df")
+    seen = {id(df)}  # objects reachable from several keys are counted once
+    for key in list(session_state.keys()):
+        value = session_state.get(key)
+        if key == ARTIFACTS_KEY:
+            rows += value.rows()
+            continue
+        if key == "uploaded_df" and value is not None:
+            nbytes, refs = store.get(session_state.get("dataset_key"), (None, 1))
+            note = f"shared with {refs - 1} other session(s)" if refs > 1 else ""
+            rows.append({"item": "dataset", "kind": "dataset", "bytes": nbytes if nbytes is not None
+                         else deep_sizeof(value), "regenerable": False, "note": note})
+            continue
+        nbytes = deep_sizeof(value, seen)
+        if nbytes >= LISTED_STATE_BYTES:
+            rows.append({"item": str(key), "kind": "state", "bytes": nbytes, "regenerable": False, "note": ""})
+        else:
+            small, small_bytes = small + 1, small_bytes + nbytes
+    if small:
+        rows.append({"item": f"other state ({small} keys)", "kind": "state", "bytes": small_bytes,
+                     "regenerable": False, "note": ""})
+    usage = pd.DataFrame(rows, columns=["item", "kind", "bytes", "regenerable", "note"])
+    return usage.sort_values("bytes", ascending=False, ignore_index=True)
+
+
+def process_usage() -> dict[str, int]:
+    """Memory held by the shared caches and all sessions' artifacts, by part (bytes)."""
+    store = dataset_store().usage().values()
+    derived = 0
+    for cache in dataset_caches():
+        for _, value, _ in cache.entries():
+            derived += deep_sizeof(value)
+    return {
+        "datasets in use": sum(b for b, refs in store if refs),
+        "idle datasets": sum(b for b, refs in store if not refs),
+        "derived caches": derived,
+        "chart data": chart_data_cache_bytes(),
+        "session artifacts": sum(r.nbytes for r in list(_registries)),
+    }
+
+
+# -------- eviction --------
+def _evict_artifacts(nbytes: int, registries: list[SessionArtifacts]) -> int:
+    """Evict artifacts of `registries`, least recently used first, until `nbytes` are freed."""
+    freed = 0
+    while freed < nbytes:
+        oldest = [(o[1], r, o[0]) for r in registries if (o := r.oldest()) is not None]
+        if not oldest:
+            break
+        _, registry, key = min(oldest, key=lambda t: t[0])
+        freed += registry.evict(key)
+    return freed
+
+
+def _clear_chart_data(nbytes: int) -> int:
+    freed = chart_data_cache_bytes()
+    clear_chart_data_cache()
+    return freed
+
+
+def _evict_derived(nbytes: int) -> int:
+    """Drop per-dataset derived artifacts, least recently used first (pending ones are kept)."""
+    entries = [(used, cache, key, value) for cache in dataset_caches() for key, value, used in cache.entries()
+               if not (isinstance(value, Future) and not value.done())]
+    freed = 0
+    for _, cache, key, value in sorted(entries, key=lambda t: t[0]):
+        if freed >= nbytes:
+            break
+        freed += deep_sizeof(value)
+        cache.pop(key)
+    return freed
+
+
+def enforce_budgets(session_state) -> list[str]:
+    """Evict regenerable memory until the session and the process are within budget; returns what was freed."""
+    notes = []
+    budget = session_budget()
+    arts = session_artifacts(session_state)
+    if budget is not None:
+        over = int(session_usage(session_state)["bytes"].sum()) - budget
+        if over > 0:
+            freed = _evict_artifacts(over, [arts])
+            if freed:
+                notes.append(f"Session over budget: freed {_mb(freed)} of cached artifacts")
+    budget = process_budget()
+    if budget is not None:
+        over = sum(process_usage().values()) - budget
+        steps = (
+            ("idle datasets", lambda n: dataset_store().shrink(n)),
+            ("chart data", _clear_chart_data),
+            ("session artifacts", lambda n: _evict_artifacts(n, list(_registries))),
+            ("derived caches", _evict_derived),
+        )
+        for part, evict in steps:
+            if over <= 0:
+                break
+            freed = evict(over)
+            if freed:
+                notes.append(f"Server over budget: freed {_mb(freed)} of {part}")
+            over -= freed
+    return notes
+
+
+# -------- admission control --------
+class Admission(NamedTuple):
+    allowed: bool
+    fraction: float | None   # sample of the rows to keep to fit (None: everything fits)
+    available: int | None    # bytes a new dataset may take (None: unlimited)
+    message: str
+
+
+def available_bytes(session_state, *, replacing: bool = True) -> int | None:
+    """
+    Memory a new dataset may take within both budgets, counting only what cannot
+    be evicted (regenerable memory is freed after the load). With `replacing`,
+    the session's current dataset is about to be released and does not count.
+    """
+    limits = []
+    budget = session_budget()
+    if budget is not None:
+        usage = session_usage(session_state)
+        fixed = usage[~usage["regenerable"] & ~((usage["kind"] == "dataset") & replacing)]
+        limits.append(budget - int(fixed["bytes"].sum()))
+    budget = process_budget()
+    if budget is not None:
+        own = session_state.get("dataset_key") if replacing else None
+        in_use = sum(b for k, (b, refs) in dataset_store().usage().items()
+                     if refs and not (k == own and refs == 1))
+        limits.append(budget - in_use)
+    return max(0, min(limits)) if limits else None
+
+
+def _dataset_bytes(session_state) -> int:
+    """Size of the session's current dataset (as sized by the dataset store when stored there)."""
+    df = session_state.get("uploaded_df")
+    if df is None:
+        return 0
+    nbytes, _ = dataset_store().usage().get(session_state.get("dataset_key"), (None, 0))
+    return nbytes if nbytes is not None else deep_sizeof(df)
+
+
+def admit(session_state, nbytes: int, *, replacing: bool = True) -> Admission:
+    """
+    Whether a dataset of `nbytes` fits the budgets, and if not, the sample fraction
+    that would. Without `replacing` the rows are appended: the combined frame copies
+    the current dataset (still held while it is built), so that copy counts as well.
+    """
+    available = available_bytes(session_state, replacing=replacing)
+    copied = 0 if replacing else _dataset_bytes(session_state)
+    if available is None or copied + nbytes <= available:
+        return Admission(True, None, available, "")
+    what = (f"Appending needs about {_mb(copied + nbytes)} ({_mb(copied)} to copy the current dataset)"
+            if copied else f"The dataset needs about {_mb(nbytes)}")
+    need = f"{what} but {_mb(available)} is available within the memory budget"
+    fraction = max(available - copied, 0) / max(nbytes, 1) * ADMISSION_HEADROOM
+    if admission_policy() == "downsample" and fraction >= MIN_SAMPLE_FRACTION:
+        return Admission(True, fraction, available, f"{need}: keeping a random {fraction:.1%} of the rows.")
+    return Admission(False, None, available, f"{need}. Drop columns, set a row limit or a sample fraction.")
+
+
+def admit_frame(session_state, df: pd.DataFrame, *, replacing: bool = True) -> tuple[pd.DataFrame, Admission]:
+    """
+    Admission control for a parsed frame: returns it (downsampled to `fraction`
+    of its rows if needed) with the decision; raises BudgetExceeded if rejected.
+    """
+    admission = admit(session_state, int(df.memory_usage(deep=True).sum()), replacing=replacing)
+    if not admission.allowed:
+        raise BudgetExceeded(admission.message)
+    if admission.fraction is None:
+        return df, admission
+    return take_rows(df, fraction=admission.fraction), admission
+
+
+# -------- Streamlit UI --------
+def render_memory_panel(session_state) -> None:
+    """Collapsible memory usage of this session and the server process against their budgets."""
+    import streamlit as st
+
+    with st.expander("🧠 Memory", expanded=False):
+        usage = session_usage(session_state)
+        shared = process_usage()
+        used, total = int(usage["bytes"].sum()), sum(shared.values())
+        s_budget, p_budget = session_budget(), process_budget()
+        c1, c2 = st.columns(2)
+        for col, label, value, budget in ((c1, "This session", used, s_budget),
+                                          (c2, "Server process", total, p_budget)):
+            col.metric(label, _mb(value), help=f"Budget: {_mb(budget) if budget else 'unlimited'}")
+            if budget:
+                col.progress(min(value / budget, 1.0))
+        if not usage.empty:
+            table = usage.assign(mb=(usage["bytes"] / 1024 ** 2).round(2)).drop(columns="bytes")
+            st.dataframe(table[["item", "kind", "mb", "regenerable", "note"]], use_container_width=True,
+                         hide_index=True)
+        st.dataframe(pd.DataFrame({"part": list(shared), "mb": [round(b / 1024 ** 2, 2) for b in shared.values()]}),
+                     use_container_width=True, hide_index=True)
+        arts = session_artifacts(session_state)
+        if arts.evicted:
+            st.caption("Evicted to stay within budget: " + ", ".join(reversed(arts.evicted)))
+        if st.button("Free cached artifacts", key="memory_free", disabled=arts.nbytes == 0,
+                     help="Drops this session's regenerable artifacts (reports, previews); they are rebuilt on demand."):
+            arts.clear()
+            st.rerun()
+        st.caption(f"Budgets: {SESSION_BUDGET_ENV} / {PROCESS_BUDGET_ENV} (MB, 0 = unlimited); "
+                   f"loads over budget are {'downsampled' if admission_policy() == 'downsample' else 'rejected'} "
+                   f"({ADMISSION_ENV}).")
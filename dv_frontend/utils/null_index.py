@@ -0,0 +1,146 @@
+# utils/null_index.py
+from __future__ import annotations
+
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Hashable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset_cache import dataset_cache
+from utils.perf import timer
+
+# Packed null bitmaps: one scan per dataset for every missing-value question.
+#
+# Each column's missing values are kept as a bitmap packed with `np.packbits`
+# (n/8 bytes per column). Per-column and total null counts are popcounts, the
+# rows valid in a set of columns are the complement of the OR of their bitmaps
+# (what `dropna(subset=...)` / `notna() & notna()` recompute otherwise), and
+# co-missingness (rows missing in both of two columns) is a popcount of an AND.
+# Columns are indexed on first use, so only the columns pages touch are scanned.
+
+MAX_CACHED_MASKS = 32
+MAX_PATTERN_COLUMNS = 64     # row patterns are encoded as one uint64 per row
+
+# set bits per byte value (np.bitwise_count needs NumPy 2)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(bits: np.ndarray) -> int:
+    return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+
+class NullIndex:
+    """Packed per-column null bitmaps of one DataFrame (see `null_index`)."""
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = weakref.ref(df)
+        self.n_rows = len(df)
+        self._lock = threading.Lock()
+        self._bits: dict[Hashable, np.ndarray] = {}
+        self._counts: dict[Hashable, int] = {}
+        self._masks: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+
+    def _frame(self) -> pd.DataFrame:
+        df = self._df()
+        if df is None:
+            raise RuntimeError("Dataset is no longer available.")
+        return df
+
+    # -------- bitmaps --------
+    def bitmap(self, col: Hashable) -> np.ndarray:
+        """Packed bitmap of the missing values of `col`."""
+        with self._lock:
+            if col in self._bits:
+                return self._bits[col]
+        bits = np.packbits(self._frame()[col].isna().to_numpy())
+        count = _popcount(bits)
+        with self._lock:
+            self._counts.setdefault(col, count)
+            return self._bits.setdefault(col, bits)
+
+    def build(self, columns: Sequence[Hashable] | None = None) -> "NullIndex":
+        """Index `columns` (default: all) now."""
+        cols = [c for c in (self._frame().columns if columns is None else columns) if c not in self._bits]
+        if cols:
+            with timer("null index", rows=self.n_rows):
+                for c in cols:
+                    self.bitmap(c)
+        return self
+
+    def _unpack(self, bits: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bits, count=self.n_rows).astype(bool)
+
+    # -------- counts --------
+    def null_count(self, col: Hashable) -> int:
+        self.bitmap(col)
+        return self._counts[col]
+
+    def null_counts(self, columns: Sequence[Hashable] | None = None) -> pd.Series:
+        """Missing values per column (like `df.isnull().sum()`)."""
+        cols = list(self._frame().columns if columns is None else columns)
+        self.build(cols)
+        return pd.Series([self._counts[c] for c in cols], index=pd.Index(cols), dtype="int64")
+
+    def total_nulls(self) -> int:
+        return int(self.null_counts().sum())
+
+    # -------- masks --------
+    def missing_mask(self, columns: Sequence[Hashable]) -> np.ndarray:
+        """Rows missing a value in any of `columns`."""
+        return ~self.valid_mask(columns)
+
+    def valid_mask(self, columns: Sequence[Hashable]) -> np.ndarray:
+        """Rows with a value in every one of `columns` (like `notna().all(axis=1)`)."""
+        cols = tuple(dict.fromkeys(columns))
+        with self._lock:
+            if cols in self._masks:
+                self._masks.move_to_end(cols)
+                return self._masks[cols]
+        if not cols or all(self.null_count(c) == 0 for c in cols):
+            mask = np.ones(self.n_rows, dtype=bool)
+        else:
+            mask = ~self._unpack(np.bitwise_or.reduce([self.bitmap(c) for c in cols]))
+        with self._lock:
+            mask = self._masks.setdefault(cols, mask)
+            while len(self._masks) > MAX_CACHED_MASKS:
+                self._masks.popitem(last=False)
+        return mask
+
+    # -------- co-missingness --------
+    def co_missing(self, columns: Sequence[Hashable] | None = None) -> pd.DataFrame:
+        """Rows missing in both columns, for every pair of `columns` (default: those with nulls)."""
+        counts = self.null_counts(columns)
+        cols = list(counts.index if columns is not None else counts[counts > 0].index)
+        bits = [self.bitmap(c) for c in cols]
+        out = np.zeros((len(cols), len(cols)), dtype=np.int64)
+        for i in range(len(cols)):
+            for j in range(i, len(cols)):
+                out[i, j] = out[j, i] = _popcount(bits[i] & bits[j])
+        return pd.DataFrame(out, index=pd.Index(cols), columns=pd.Index(cols))
+
+    def patterns(self, top: int = 20) -> tuple[pd.DataFrame, list[Hashable]]:
+        """
+        Most frequent missingness patterns over the columns with nulls (the
+        MAX_PATTERN_COLUMNS with most nulls): one boolean column per data column
+        (True = missing) plus "rows". Returns the table and the columns used.
+        """
+        counts = self.null_counts()
+        cols = list(counts[counts > 0].sort_values(ascending=False).index[:MAX_PATTERN_COLUMNS])
+        if not cols:
+            return pd.DataFrame({"rows": [self.n_rows]}), cols
+        code = np.zeros(self.n_rows, dtype=np.uint64)
+        for i, c in enumerate(cols):
+            code |= self._unpack(self.bitmap(c)).astype(np.uint64) << np.uint64(i)
+        uniq, n = np.unique(code, return_counts=True)
+        order = np.argsort(-n, kind="stable")[:top]
+        table = pd.DataFrame({str(c): (uniq[order] >> np.uint64(i)) & np.uint64(1) == 1 for i, c in enumerate(cols)})
+        table["rows"] = n[order]
+        return table, cols
+
+
+def null_index(df: pd.DataFrame) -> NullIndex:
+    """Null bitmaps of `df`, shared by all sessions and released with the frame."""
+    return dataset_cache(df).get("null_index", lambda: NullIndex(df))
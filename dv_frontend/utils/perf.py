@@ -0,0 +1,162 @@
+# utils/perf.py
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+# Hot-path timing instrumentation.
+#
+# A *run* is one execution of a page script (one Streamlit rerun). app.py opens a
+# run around `pg.run()`; code on the hot paths wraps its stages with `timer(...)`
+# (or `@timed(...)`) and may attach row/byte counts to the stage. Each session
+# runs on its own script thread, so the current run is thread-local and helpers
+# never need the session state. Finished runs are appended to the JSON-lines
+# file named by DV_PERF_LOG (unset: no log) and the last few are kept for the page's
+# "Performance" panel. With DV_PERF_TRACEMALLOC=1 stages also record their
+# peak traced memory (slows Python). The tracer's peak is process-wide, so only
+# one stage at a time measures it: the outermost stage of the first session to
+# start one. Stages nested in it or running meanwhile in other sessions get no
+# peak (a reset would wipe the measuring stage's); allocations of concurrent
+# sessions still count towards it.
+#
+# Outside a run (scripts, benchmarks) timers still time but record nothing.
+
+LOG_ENV = "DV_PERF_LOG"
+TRACEMALLOC_ENV = "DV_PERF_TRACEMALLOC"
+HISTORY_KEY = "perf_runs"
+MAX_HISTORY = 5
+
+_local = threading.local()
+_log_lock = threading.Lock()
+_peak_lock = threading.Lock()  # held by the stage measuring the tracemalloc peak
+
+
+def log_path() -> str | None:
+    """The run log, if enabled with DV_PERF_LOG."""
+    return os.environ.get(LOG_ENV, "").strip() or None
+
+
+def tracemalloc_enabled() -> bool:
+    return os.environ.get(TRACEMALLOC_ENV, "").strip().lower() in ("1", "true", "yes")
+
+
+class PerfRun:
+    """Stages recorded during one page run."""
+
+    def __init__(self, page: str):
+        self.page = page
+        self.started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.stages: list[dict[str, Any]] = []
+        self.seconds: float | None = None
+        self.outcome = "running"
+        self._t0 = time.perf_counter()
+
+    def finish(self, outcome: str) -> None:
+        self.seconds = round(time.perf_counter() - self._t0, 4)
+        self.outcome = outcome
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"page": self.page, "started": self.started, "seconds": self.seconds,
+                "outcome": self.outcome, "stages": self.stages}
+
+
+def current_run() -> PerfRun | None:
+    return getattr(_local, "run", None)
+
+
+def begin_run(page: str) -> PerfRun:
+    run = PerfRun(page)
+    _local.run = run
+    if tracemalloc_enabled() and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return run
+
+
+def end_run(run: PerfRun, outcome: str = "ok", history: list | None = None) -> None:
+    """Close `run`, append it to the JSON-lines log and to `history` (newest first)."""
+    if current_run() is run:
+        _local.run = None
+    run.finish(outcome)
+    if history is not None:
+        history.insert(0, run)
+        del history[MAX_HISTORY:]
+    path = log_path()
+    if path:
+        line = json.dumps(run.to_dict(), default=str)
+        with _log_lock:
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+
+
+@contextmanager
+def timer(stage: str, *, rows: int | None = None, nbytes: int | None = None) -> Iterator[dict[str, Any]]:
+    """
+    Time the block as `stage` of the current run. Yields the stage record, so the
+    block can fill in counts it only knows at the end (`rec["rows"] = len(out)`).
+    """
+    rec: dict[str, Any] = {"stage": stage, "seconds": None, "rows": rows, "bytes": nbytes}
+    trace = tracemalloc.is_tracing() and _peak_lock.acquire(blocking=False)
+    if trace:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["seconds"] = round(time.perf_counter() - t0, 4)
+        if trace:
+            rec["peak_mb"] = round((tracemalloc.get_traced_memory()[1] - base) / 1024 ** 2, 2)
+            _peak_lock.release()
+        run = current_run()
+        if run is not None:
+            run.stages.append(rec)
+
+
+def timed(stage: str | None = None):
+    """Decorator form of `timer` (stage defaults to the function name)."""
+    def decorate(fn):
+        name = stage or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def render_perf_panel(history: list[PerfRun]) -> None:
+    """Collapsible per-stage timings for the latest runs of this session."""
+    import pandas as pd
+    import streamlit as st
+
+    with st.expander("⏱️ Performance", expanded=False):
+        if not history:
+            st.caption("No runs recorded yet.")
+            return
+        for i, run in enumerate(history):
+            total = f"{run.seconds:.3f} s" if run.seconds is not None else "running"
+            label = "This run" if i == 0 else f"Earlier run ({run.outcome})"
+            st.markdown(f"**{label}** · {run.page} · {total}")
+            if run.stages:
+                st.dataframe(pd.DataFrame(run.stages), use_container_width=True, hide_index=True)
+        from utils.lazy_imports import import_timings
+        from utils.render_pool import render_pool_metrics
+
+        startup = import_timings()
+        if startup:
+            st.markdown("**Process startup & first imports**")
+            st.dataframe(pd.DataFrame(startup), use_container_width=True, hide_index=True)
+        renderer = render_pool_metrics()
+        if renderer:
+            st.markdown("**PNG renderer pool** (process-wide)")
+            st.dataframe(pd.DataFrame([renderer]), use_container_width=True, hide_index=True)
+        path = log_path()
+        st.caption(f"Runs are appended to `{path}`." if path else "Set DV_PERF_LOG to a file path to log every run as JSON lines.")
@@ -0,0 +1,65 @@
+# utils/reactive.py
+from __future__ import annotations
+
+from typing import Any, Callable, Hashable, NamedTuple, Sequence
+
+# Dependency-tracked recomputation for chart configs.
+#
+# A chart is a small pipeline of stages (e.g. aggregate → sort/top-N → chart →
+# exports). Each stage declares the config keys it reads and the stages it
+# consumes; `StageGraph.run` recomputes a stage only when one of those inputs
+# changed since the last run with the same memo, and reuses its stored value
+# otherwise. Editing a title therefore rebuilds the chart but not the
+# aggregation. Memos are plain dicts the page keeps per chart in session state.
+
+
+class Stage(NamedTuple):
+    name: str
+    keys: tuple[str, ...]           # config keys the stage reads
+    deps: tuple[str, ...]           # upstream stages, passed to `fn` in this order
+    fn: Callable[..., Any]          # fn(cfg, *upstream values) -> value
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class StageGraph:
+    """Stages in dependency order; see module comment."""
+
+    def __init__(self, stages: Sequence[Stage]):
+        seen: set[str] = set()
+        for stage in stages:
+            missing = [d for d in stage.deps if d not in seen]
+            if missing:
+                raise ValueError(f"stage {stage.name!r} depends on {missing}, which must come before it")
+            seen.add(stage.name)
+        self.stages = list(stages)
+
+    def run(self, memo: dict, cfg: dict, *, token: Hashable = None) -> tuple[dict[str, Any], list[str]]:
+        """
+        Values of all stages for `cfg`, and the names of the stages that were
+        recomputed. `token` identifies everything outside `cfg` the stages read
+        (e.g. the dataset); a new token invalidates the whole memo.
+        """
+        if memo.get("_token", token) != token:
+            memo.clear()
+        memo["_token"] = token
+
+        values: dict[str, Any] = {}
+        versions: dict[str, int] = {}
+        recomputed: list[str] = []
+        for stage in self.stages:
+            inputs = (tuple(_freeze(cfg.get(k)) for k in stage.keys), tuple(versions[d] for d in stage.deps))
+            entry = memo.get(stage.name)
+            if entry is None or entry[0] != inputs:
+                value = stage.fn(cfg, *(values[d] for d in stage.deps))
+                entry = memo[stage.name] = (inputs, value, (entry[2] + 1) if entry else 0)
+                recomputed.append(stage.name)
+            values[stage.name] = entry[1]
+            versions[stage.name] = entry[2]
+        return values, recomputed
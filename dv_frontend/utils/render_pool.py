@@ -0,0 +1,252 @@
+# utils/render_pool.py
+from __future__ import annotations
+
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Iterator, Sequence
+
+import numpy as np
+
+# Pool of persistent vl-convert worker processes for PNG rendering.
+#
+# A vl-convert render runs on the calling thread and holds it for the whole
+# conversion (seconds for a large, high-scale export), and the first render of a
+# process also pays for starting the converter's JavaScript runtime. The pool
+# keeps DV_RENDER_WORKERS processes (default: up to 4, one per core) with the
+# converter warmed up at start, takes single specs or batches and returns
+# futures of PNG bytes. It is process-wide: interactive exports of all sessions
+# and batch report jobs share it. DV_RENDER_WORKERS=0 renders inline instead
+# (futures are then already resolved when returned).
+#
+# Workers are started with "spawn": forking the multithreaded Streamlit server
+# is unsafe. Spawn re-imports the parent's __main__ in each worker, and
+# Streamlit runs the page script as __main__, so the script is hidden from it
+# while workers start. That swap of the process-global __main__ happens once per
+# pool, on a dedicated start thread that spawns all workers up front; `submit`
+# never starts a process (a new pool is only started after a worker crash).
+
+WORKERS_ENV = "DV_RENDER_WORKERS"
+LATENCY_WINDOW = 500  # renders kept for the latency percentiles
+START_TIMEOUT_S = 120  # for all workers to start and warm up
+
+_siblings = None  # worker side: barrier of all workers of the pool
+
+_WARMUP_SPEC = {"data": {"values": [{"x": 0}]}, "mark": "point",
+                "encoding": {"x": {"field": "x", "type": "quantitative"}}}
+
+
+def _warm_up() -> None:
+    import vl_convert
+
+    vl_convert.vegalite_to_png(_WARMUP_SPEC, scale=1.0)
+
+
+def _init_worker(siblings) -> None:
+    global _siblings
+    _siblings = siblings
+    _warm_up()
+
+
+def _await_siblings() -> None:
+    # Holding every worker until all have started keeps the executor from
+    # reusing an idle one, so one start task per worker spawns all of them
+    _siblings.wait(timeout=START_TIMEOUT_S)
+
+
+def _render(spec: dict, scale: float) -> tuple[bytes, float]:
+    import vl_convert
+
+    t0 = time.perf_counter()
+    png = vl_convert.vegalite_to_png(spec, scale=scale)
+    return png, time.perf_counter() - t0
+
+
+@contextmanager
+def _plain_main() -> Iterator[None]:
+    """Swap in an empty __main__ so spawned workers do not re-run the caller's script."""
+    main = sys.modules.get("__main__")
+    plain = sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        # a script run that started meanwhile installed its own __main__: keep it
+        if sys.modules.get("__main__") is plain:
+            sys.modules["__main__"] = main
+
+
+def default_workers() -> int:
+    value = os.environ.get(WORKERS_ENV)
+    if value is not None and value.strip():
+        return max(0, int(value))
+    return min(4, os.cpu_count() or 1)
+
+
+class RenderPool:
+    """Renders Vega-Lite specs to PNG on worker processes; see module comment."""
+
+    def __init__(self, workers: int | None = None):
+        self.workers = default_workers() if workers is None else max(0, int(workers))
+        self._lock = threading.Lock()
+        self._executor: Future | None = None  # of the started ProcessPoolExecutor
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._render_s: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._latency_s: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def _start(self, started: Future) -> None:
+        """Create the executor and spawn all its workers (runs on the start thread)."""
+        try:
+            ctx = multiprocessing.get_context("spawn")
+            executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx,
+                                           initializer=_init_worker, initargs=(ctx.Barrier(self.workers),))
+            with _plain_main():
+                for _ in range(self.workers):
+                    executor.submit(_await_siblings)
+        except BaseException as e:
+            started.set_exception(e)
+        else:
+            started.set_result(executor)
+
+    def _starting(self) -> Future:
+        """Future of the executor; starts it on a dedicated thread on first use. Call with the lock held."""
+        if self._executor is None:
+            self._executor = Future()
+            threading.Thread(target=self._start, args=(self._executor,), name="render-pool-start",
+                             daemon=True).start()
+        return self._executor
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            starting = self._starting()
+        try:
+            return starting.result()
+        except BaseException:
+            with self._lock:
+                if self._executor is starting:
+                    self._executor = None  # retry on the next submit
+            raise
+
+    def warm(self) -> None:
+        """Start the worker processes now (each warms its converter) instead of on the first export."""
+        if self.workers == 0:
+            return
+        with self._lock:
+            self._starting()
+
+    # -------- submit --------
+    def submit(self, spec: dict, *, scale: float = 2.0) -> Future:
+        """Future of the PNG bytes of `spec` (a standalone Vega-Lite spec)."""
+        out: Future = Future()
+        t0 = time.perf_counter()
+        with self._lock:
+            self._pending += 1
+        if self.workers == 0:
+            try:
+                self._finish(out, t0, _render(spec, scale), None)
+            except Exception as e:
+                self._finish(out, t0, None, e)
+            return out
+
+        try:
+            pool = self._pool()
+            try:
+                inner = pool.submit(_render, spec, scale)
+            except BrokenProcessPool:
+                # a worker died (e.g. out of memory): start a fresh pool
+                with self._lock:
+                    if self._executor is not None and self._executor.done() and self._executor.result() is pool:
+                        self._executor = None
+                inner = self._pool().submit(_render, spec, scale)
+        except Exception as e:
+            self._finish(out, t0, None, e)
+            return out
+
+        def done(f: Future) -> None:
+            try:
+                result = f.result()
+            except BaseException as e:
+                self._finish(out, t0, None, e)
+            else:
+                self._finish(out, t0, result, None)
+
+        inner.add_done_callback(done)
+        return out
+
+    def submit_batch(self, specs: Sequence[dict], *, scale: float = 2.0) -> list[Future]:
+        """Futures of the PNG bytes of `specs`, rendered concurrently, in input order."""
+        return [self.submit(spec, scale=scale) for spec in specs]
+
+    def render(self, spec: dict, *, scale: float = 2.0) -> bytes:
+        return self.submit(spec, scale=scale).result()
+
+    def _finish(self, out: Future, t0: float, result: tuple[bytes, float] | None, error: BaseException | None) -> None:
+        with self._lock:
+            self._pending -= 1
+            if error is None:
+                self._completed += 1
+                self._render_s.append(result[1])
+                self._latency_s.append(time.perf_counter() - t0)
+            else:
+                self._failed += 1
+        if error is None:
+            out.set_result(result[0])
+        else:
+            out.set_exception(error)
+
+    # -------- metrics --------
+    def metrics(self) -> dict[str, Any]:
+        """
+        Queue depth and latencies: `queued` renders wait for a worker, `running`
+        are being rendered; `render_*` is the conversion time in the worker,
+        `latency_*` adds queueing and transfer (seconds, over the last renders).
+        """
+        with self._lock:
+            running = min(self._pending, max(self.workers, 1))
+            out = {
+                "workers": self.workers,
+                "queued": self._pending - running,
+                "running": running,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+            render, latency = list(self._render_s), list(self._latency_s)
+        for name, values in (("render", render), ("latency", latency)):
+            p50, p95 = np.percentile(values, [50, 95]) if values else (None, None)
+            out[f"{name}_p50_s"] = None if p50 is None else round(float(p50), 4)
+            out[f"{name}_p95_s"] = None if p95 is None else round(float(p95), 4)
+        return out
+
+    def shutdown(self) -> None:
+        with self._lock:
+            starting, self._executor = self._executor, None
+        if starting is not None and starting.exception() is None:
+            starting.result().shutdown(wait=True, cancel_futures=True)
+
+
+_pool: RenderPool | None = None
+_pool_lock = threading.Lock()
+
+
+def render_pool() -> RenderPool:
+    """The process-wide renderer pool (created on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderPool()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def render_pool_metrics() -> dict[str, Any] | None:
+    """Metrics of the renderer pool, or None if nothing has been rendered yet."""
+    return _pool.metrics() if _pool is not None else None
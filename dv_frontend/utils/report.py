@@ -0,0 +1,211 @@
+# utils/report.py
+from __future__ import annotations
+
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from utils.compute_engine import compute_engine
+from utils.perf import timed
+
+# Dataset profile PDF report (reportlab), shared by the view page and batch jobs.
+
+DEFAULT_SECTIONS = {
+    "quick_stats": True,
+    "columns_by_type": True,
+    "missing": True,
+    "preview": True,
+    "describe_numeric": True,
+    "describe_categorical": True,
+    "unique_values": True,
+    "correlations": True,
+    "duplicates": True,
+}
+
+
+def column_type_map(df: pd.DataFrame) -> dict[str, list[str]]:
+    """Column names bucketed by kind: Numeric, Categorical, Datetime, Boolean, Other."""
+    dtype_map = {
+        "Numeric": df.select_dtypes(include=[np.number]).columns.tolist(),
+        "Categorical": df.select_dtypes(include=["object", "category"]).columns.tolist(),
+        "Datetime": df.select_dtypes(include=["datetime64[ns]", "datetime64[ns, UTC]"]).columns.tolist(),
+        "Boolean": df.select_dtypes(include=["bool"]).columns.tolist(),
+    }
+    other_cols = [c for c in df.columns if c not in sum(dtype_map.values(), [])]
+    dtype_map["Other"] = other_cols
+    return dtype_map
+
+
+# -------- formatting helpers (readable & fixed) --------
+def format_df_for_pdf(
+    df: pd.DataFrame,
+    *,
+    max_rows: int = 30,
+    max_cols: int = 12,
+    str_maxlen: int = 60,
+) -> pd.DataFrame:
+    """
+    Make a DataFrame readable for PDF:
+    - keep at most max_rows x max_cols
+    - round numeric columns to 2 decimals
+    - truncate long strings with ellipsis
+    - stringify everything (reportlab-friendly)
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    d = df.copy()
+
+    # limit rows/cols
+    if d.shape[0] > max_rows:
+        d = d.head(max_rows)
+    if d.shape[1] > max_cols:
+        keep = list(d.columns[:max_cols])
+        d = d[keep]
+
+    # round numeric to 2 decimals
+    num_cols = d.select_dtypes(include=[np.number]).columns
+    if len(num_cols) > 0:
+        d[num_cols] = d[num_cols].round(2)
+
+    # truncate long strings (columns and values)
+    def _trunc(x):
+        if pd.isna(x):
+            return ""
+        s = str(x)
+        return (s[:str_maxlen - 1] + "…") if len(s) > str_maxlen else s
+
+    d.columns = [_trunc(c) for c in d.columns]
+    d = d.map(_trunc)
+
+    # ensure string type
+    return d.astype(str)
+
+
+def table_from_df(df: pd.DataFrame, style, repeat_header=True):
+    """Basic reportlab Table from DataFrame; lets reportlab handle widths."""
+    from reportlab.platypus import Table
+    if df is None or df.empty:
+        df = pd.DataFrame({"info": ["(no data)"]})
+
+    # add index as first column
+    data = [["#"] + list(df.columns)]
+    for idx, row in df.iterrows():
+        data.append([str(idx)] + [str(v) for v in row.tolist()])
+
+    tbl = Table(data, repeatRows=1 if repeat_header else 0)
+    tbl.setStyle(style)
+    return tbl
+
+
+@timed()
+def create_pdf_report(df: pd.DataFrame, sections: dict, title: str = "Dataset Profile Report") -> bytes:
+    """Profile report of `df` as PDF bytes; `sections` switches parts on/off (see DEFAULT_SECTIONS)."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, TableStyle, PageBreak
+
+    buf = BytesIO()
+    doc = SimpleDocTemplate(
+        buf,
+        pagesize=A4,
+        leftMargin=28, rightMargin=28, topMargin=30, bottomMargin=28,
+        title=title,
+    )
+
+    styles = getSampleStyleSheet()
+    h1 = styles["Heading1"]
+    h2 = styles["Heading2"]
+    p  = styles["BodyText"]
+    p.fontSize = 9
+    p.leading = 11
+
+    tstyle = TableStyle([
+        ("FONTNAME", (0,0), (-1,-1), "Helvetica"),
+        ("FONTSIZE", (0,0), (-1,-1), 8),
+        ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
+        ("ALIGN", (0,0), (-1,0), "CENTER"),
+        ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#F5F5F5")),
+        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
+        ("LEFTPADDING", (0,0), (-1,-1), 4),
+        ("RIGHTPADDING", (0,0), (-1,-1), 4),
+        ("TOPPADDING", (0,0), (-1,-1), 2),
+        ("BOTTOMPADDING", (0,0), (-1,-1), 2),
+    ])
+
+    story = []
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    story += [Paragraph(title, h1), Paragraph(f"Generated: {now}", p), Spacer(1, 8)]
+
+    # dtype buckets once
+    dtype_map = column_type_map(df)
+    engine = compute_engine()
+
+    # Quick stats
+    if sections.get("quick_stats", True):
+        n_rows, n_cols = df.shape
+        mem_mb = round(df.memory_usage(deep=True).sum() / (1024**2), 2)
+        dup_rows = engine.duplicated_count(df)
+        qs = pd.DataFrame({
+            "Metric": ["Rows", "Columns", "Memory (MB)", "Duplicated Rows"],
+            "Value": [f"{n_rows:,}", f"{n_cols:,}", f"{mem_mb:,.2f}", f"{dup_rows:,}"]
+        }).set_index("Metric")
+        story += [Paragraph("Quick Stats", h2), table_from_df(format_df_for_pdf(qs), tstyle), Spacer(1, 10)]
+
+    # Columns by Type
+    if sections.get("columns_by_type", True):
+        dtypes_df = pd.DataFrame(
+            [(k, len(v), ", ".join(v[:50])) for k, v in dtype_map.items()],
+            columns=["Type", "Count", "Columns (first 50)"]
+        ).set_index("Type")
+        story += [Paragraph("Columns by Type", h2), table_from_df(format_df_for_pdf(dtypes_df), tstyle), Spacer(1, 10)]
+
+    # Missing values
+    if sections.get("missing", True):
+        null_counts = engine.null_counts(df)
+        null_pct = (null_counts / len(df) * 100).round(2)
+        missing_df = pd.DataFrame({"missing_count": null_counts, "missing_pct": null_pct}) \
+                        .sort_values("missing_pct", ascending=False)
+        story += [Paragraph("Missing & Null Values", h2), table_from_df(format_df_for_pdf(missing_df), tstyle), Spacer(1, 10)]
+
+    # Preview head / tail
+    if sections.get("preview", True):
+        story += [
+            Paragraph("Preview (Head 10)", h2), table_from_df(format_df_for_pdf(df.head(10)), tstyle), Spacer(1, 6),
+            Paragraph("Preview (Tail 10)", h2), table_from_df(format_df_for_pdf(df.tail(10)), tstyle),
+            PageBreak()
+        ]
+
+    # Describe numeric
+    if sections.get("describe_numeric", True) and len(dtype_map["Numeric"]) > 0:
+        num_desc = engine.describe_numeric(df, dtype_map["Numeric"]).round(2)
+        story += [Paragraph("Descriptive Statistics (Numeric)", h2), table_from_df(format_df_for_pdf(num_desc), tstyle), Spacer(1, 10)]
+
+    # Describe categorical
+    if sections.get("describe_categorical", True) and len(dtype_map["Categorical"]) > 0:
+        cat_desc = df[dtype_map["Categorical"]].describe(include=["object", "category"]).T
+        story += [Paragraph("Descriptive Statistics (Categorical)", h2), table_from_df(format_df_for_pdf(cat_desc), tstyle), Spacer(1, 10)]
+
+    # Unique values
+    if sections.get("unique_values", True):
+        uni = engine.nunique(df).rename("unique_values").to_frame().sort_values("unique_values", ascending=False)
+        story += [Paragraph("Unique Values per Column", h2), table_from_df(format_df_for_pdf(uni), tstyle), Spacer(1, 10)]
+
+    # Correlations (numeric)
+    if sections.get("correlations", True) and len(dtype_map["Numeric"]) >= 2:
+        corr = df[dtype_map["Numeric"]].corr(numeric_only=True).round(2)
+        story += [Paragraph("Correlations (Numeric-Only)", h2), table_from_df(format_df_for_pdf(corr), tstyle), Spacer(1, 10)]
+
+    # Duplicates sample
+    if sections.get("duplicates", True):
+        dup_count = engine.duplicated_count(df)
+        if dup_count > 0:
+            dups_sample = df[df.duplicated(keep=False)].head(30)
+            story += [Paragraph(f"Duplicated Rows (showing first 30 of {dup_count:,})", h2),
+                      table_from_df(format_df_for_pdf(dups_sample), tstyle), Spacer(1, 10)]
+
+    doc.build(story)
+    return buf.getvalue()
@@ -0,0 +1,167 @@
+# utils/sampling.py
+from __future__ import annotations
+
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset_cache import dataset_cache
+from utils.null_index import null_index
+
+# Shared, deterministic row sampling for the visualization pages.
+#
+# Samples are row *positions* into the session frame, so pages can take just
+# the rows they need (`take_rows`) instead of copying and filtering the whole
+# frame first. Every row gets a seeded random priority and a sample of k is
+# the k rows with the smallest priorities (bottom-k / one-pass reservoir), so:
+#   - the same request on the same dataset always returns the same rows,
+#   - a larger sample is a superset of a smaller one,
+#   - stratified samples are the bottom-k within each stratum.
+# Results are cached per dataset and dropped when the frame is released.
+
+DEFAULT_SEED = 1
+MAX_CACHED_RESULTS = 32
+
+MISSING_LABEL = "(missing)"
+
+
+class DatasetSampler:
+    """Sampling state for one DataFrame (see `dataset_sampler`)."""
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = weakref.ref(df)
+        self.n_rows = len(df)
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[tuple, object]" = OrderedDict()
+
+    # -------- cache --------
+    def _cached(self, key: tuple, compute):
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        value = compute()
+        with self._lock:
+            self._results[key] = value
+            while len(self._results) > MAX_CACHED_RESULTS:
+                self._results.popitem(last=False)
+        return value
+
+    def _frame(self) -> pd.DataFrame:
+        df = self._df()
+        if df is None:
+            raise RuntimeError("Dataset is no longer available.")
+        return df
+
+    # -------- masks & strata --------
+    def valid_mask(self, columns: Sequence[str] = ()) -> np.ndarray:
+        """Rows where every column in `columns` is non-null."""
+        cols = tuple(dict.fromkeys(columns))
+
+        def compute():
+            return null_index(self._frame()).valid_mask(cols)
+
+        return self._cached(("valid", cols), compute)
+
+    def valid_positions(self, columns: Sequence[str] = ()) -> np.ndarray:
+        cols = tuple(dict.fromkeys(columns))
+        return self._cached(("valid_pos", cols), lambda: np.flatnonzero(self.valid_mask(cols)))
+
+    def strata(self, column: str) -> tuple[np.ndarray, list[str], np.ndarray]:
+        """Stratum code per row (0 = missing), stratum labels, and rows per stratum."""
+        def compute():
+            cat = self._frame()[column].astype("category")
+            codes = cat.cat.codes.to_numpy().astype(np.int64) + 1
+            labels = [MISSING_LABEL] + [str(c) for c in cat.cat.categories]
+            return codes, labels, np.bincount(codes, minlength=len(labels))
+
+        return self._cached(("strata", column), compute)
+
+    def capped_strata(self, column: str, max_strata: int) -> tuple[np.ndarray, list[str]]:
+        """
+        Like `strata`, but only the largest (max_strata - 1) categories keep their own
+        code; the rest share one trailing "Other (N more)" stratum.
+        """
+        def compute():
+            codes, labels, counts = self.strata(column)
+            order = np.argsort(-counts, kind="stable")
+            order = order[counts[order] > 0]
+
+            keep = order if len(order) <= max_strata else order[: max(max_strata - 1, 1)]
+            capped = [labels[i] for i in keep]
+            if len(keep) < len(order):
+                capped.append(f"Other ({len(order) - len(keep)} more)")
+            remap = np.full(len(labels), len(keep), dtype=np.int64)
+            remap[keep] = np.arange(len(keep))
+            return remap[codes], capped
+
+        return self._cached(("capped", column, int(max_strata)), compute)
+
+    # -------- sampling --------
+    def _priorities(self, seed: int) -> np.ndarray:
+        # regenerated (not cached) on a result-cache miss: O(n) and cheaper than holding n floats
+        return np.random.default_rng(seed).random(self.n_rows)
+
+    def positions(
+        self,
+        k: int,
+        *,
+        valid: Sequence[str] = (),
+        by: str | None = None,
+        max_strata: int | None = None,
+        seed: int = DEFAULT_SEED,
+    ) -> np.ndarray:
+        """
+        Sorted row positions of a deterministic sample.
+
+        - `valid`: only rows non-null in these columns are eligible
+        - `by`: stratify by this column; `k` is then the budget *per stratum*
+        - `max_strata`: with `by`, fold small strata into one "Other" stratum first
+        - `k <= 0` returns every eligible row
+        """
+        valid = tuple(dict.fromkeys(valid))
+        key = ("sample", int(k), valid, by, max_strata, int(seed))
+
+        def compute():
+            idx = self.valid_positions(valid)
+            if k <= 0:
+                return idx
+            if by is None:
+                if len(idx) <= k:
+                    return idx
+                u = self._priorities(seed)[idx]
+                return np.sort(idx[np.argpartition(u, k)[:k]])
+
+            codes = self.capped_strata(by, max_strata)[0] if max_strata else self.strata(by)[0]
+            c = codes[idx]
+            u = self._priorities(seed)[idx]
+            order = np.lexsort((u, c))
+            cs = c[order]
+            # rank of each row within its stratum (rows are grouped by stratum, then by priority)
+            first = np.r_[0, np.flatnonzero(np.diff(cs)) + 1]
+            sizes = np.diff(np.r_[first, len(cs)])
+            rank = np.arange(len(cs)) - np.repeat(first, sizes)
+            return np.sort(idx[order[rank < k]])
+
+        return self._cached(key, compute)
+
+
+def dataset_sampler(df: pd.DataFrame) -> DatasetSampler:
+    """Shared sampler for `df`; created on first use and released with the frame."""
+    return dataset_cache(df).get("sampler", lambda: DatasetSampler(df))
+
+
+def sample_positions(df: pd.DataFrame, k: int, **kwargs) -> np.ndarray:
+    """Shortcut for `dataset_sampler(df).positions(k, **kwargs)`."""
+    return dataset_sampler(df).positions(k, **kwargs)
+
+
+def take_rows(df: pd.DataFrame, positions: np.ndarray, columns: Sequence[str]) -> pd.DataFrame:
+    """Gather only `positions` x `columns` from `df` (no full-frame copy)."""
+    cols = list(dict.fromkeys(columns))
+    # shallow copy detaches the result from `df`, so pages can add/replace columns on it
+    return df.iloc[positions, [df.columns.get_loc(c) for c in cols]].copy(deep=False)
@@ -0,0 +1,132 @@
+# utils/scatter_prep.py
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.perf import timer
+from utils.sampling import dataset_sampler, take_rows
+
+# Scatter-plot data preparation: sample rows, facet panels, datetime X, jitter
+# and optional per-facet 2D binning (shared by the scatter page, benchmarks and
+# batch jobs).
+
+
+def maybe_parse_datetime(s: pd.Series, force_parse: bool) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    if force_parse:
+        return pd.to_datetime(s, errors="coerce")
+    return s
+
+
+def bin_per_facet(data: pd.DataFrame, x: str, y: str, facet: str, bins: int) -> pd.DataFrame:
+    """
+    Server-side 2D binning per facet: one row per non-empty (facet, x-bin, y-bin)
+    with a row count. Rows missing X or Y are left out, and so are facets without
+    any rows (an empty input gives an empty frame).
+    """
+    def _bin(v: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        edges = np.linspace(v.min(), v.max(), bins + 1)
+        idx = np.clip(np.searchsorted(edges, v, side="right") - 1, 0, bins - 1)
+        return idx, (edges[:-1] + edges[1:]) / 2
+
+    xv = data[x].to_numpy(dtype=float, na_value=np.nan)
+    yv = data[y].to_numpy(dtype=float, na_value=np.nan)
+    keep = ~(np.isnan(xv) | np.isnan(yv))
+    if not keep.any():
+        return pd.DataFrame({facet: data[facet].array[:0], x: xv[:0], y: yv[:0],
+                             "count": np.zeros(0, dtype="int64")})
+
+    xi, xc = _bin(xv[keep])
+    yi, yc = _bin(yv[keep])
+    g = (
+        pd.DataFrame({facet: data[facet].array[keep], "_xi": xi, "_yi": yi})
+        .groupby([facet, "_xi", "_yi"], observed=True)
+        .size()
+        .reset_index(name="count")
+    )
+    g[x] = xc[g["_xi"].to_numpy()]
+    g[y] = yc[g["_yi"].to_numpy()]
+    return g[[facet, x, y, "count"]]
+
+
+def prepare_scatter_data(
+    df: pd.DataFrame,
+    x_col: str,
+    y_col: str,
+    *,
+    columns: Sequence[str] = (),
+    essential: Sequence[str] = (),
+    parse_x_time: bool = False,
+    sample_n: int = 0,
+    facet_col: str | None = None,
+    max_facets: int = 12,
+    facet_budget: int = 1000,
+    facet_agg: bool = False,
+    facet_bins: int = 30,
+    jitter: bool = False,
+) -> tuple[pd.DataFrame, str, str, str | None]:
+    """
+    Rows to plot and the field names to encode: (frame, x_field, y_field, facet_field).
+
+    - `columns`: extra columns to carry (color/size); `essential`: rows must be non-null here
+      (X and Y always are)
+    - with `facet_col`: per-facet sample of `facet_budget` rows (capped at `max_facets`
+      panels), or every row binned per panel with `facet_agg`; else a global sample of
+      `sample_n` rows (0 = all)
+    """
+    work_cols = [x_col, y_col] + list(columns) + ([facet_col] if facet_col else [])
+    essential = list(dict.fromkeys([x_col, y_col] + list(essential)))
+    sampler = dataset_sampler(df)
+
+    # Row positions to plot (shared, cached sampler): per-facet budget, global sample, or all valid rows
+    if facet_col:
+        panel_codes, panel_labels = sampler.capped_strata(facet_col, int(max_facets))
+        positions = sampler.positions(0 if facet_agg else int(facet_budget),
+                                      valid=essential, by=facet_col, max_strata=int(max_facets))
+    elif sample_n and sample_n > 0:
+        positions = sampler.positions(int(sample_n), valid=essential)
+    else:
+        positions = sampler.valid_positions(essential)
+
+    # Only the selected rows are materialized
+    with timer("take rows", rows=len(positions)):
+        work = take_rows(df, positions, work_cols)
+
+    # Facet panels: capped categories ("Other" for the tail)
+    facet_field = None
+    if facet_col:
+        facet_field = "_facet"
+        work[facet_field] = pd.Categorical.from_codes(panel_codes[positions], categories=panel_labels)
+
+    # Parse datetime X if asked (coercion can introduce new nulls)
+    work[x_col] = maybe_parse_datetime(work[x_col], parse_x_time)
+    work = work.dropna(subset=essential)
+
+    # Optional jitter (small random noise) — only for numeric axes
+    if jitter:
+        rng = np.random.default_rng(42)
+        # Add jitter of ~0.5% of std for numeric columns involved
+        if pd.api.types.is_numeric_dtype(work[x_col]):
+            jx = float(work[x_col].std(ddof=0) or 0)
+            work["_xj"] = work[x_col] + (rng.normal(0, jx * 0.005, size=len(work)) if jx > 0 else 0)
+        else:
+            work["_xj"] = work[x_col]
+        jy = float(work[y_col].std(ddof=0) or 0)
+        work["_yj"] = work[y_col] + (rng.normal(0, jy * 0.005, size=len(work)) if jy > 0 else 0)
+        x_field = "_xj"
+        y_field = "_yj"
+    else:
+        x_field = x_col
+        y_field = y_col
+
+    # Optional server-side binning per facet panel
+    if facet_col and facet_agg:
+        with timer("bin per facet", rows=len(work)):
+            work = bin_per_facet(work, x_col, y_col, facet_field, int(facet_bins))
+        x_field, y_field = x_col, y_col
+
+    return work, x_field, y_field, facet_field
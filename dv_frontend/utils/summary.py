@@ -0,0 +1,192 @@
+# utils/summary.py
+from __future__ import annotations
+
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Hashable
+
+import numpy as np
+import pandas as pd
+
+from dv_core.charts import default_bins, histogram_bins, with_percent
+from utils.dataset_cache import dataset_cache
+from utils.incremental import dataset_profile
+from utils.perf import timer
+from utils.time_index import time_index
+
+# Materialized dataset summary behind the Dashboard.
+#
+# Right after a dataset is stored, `materialize_summary` computes everything the
+# Dashboard shows on a background thread: key metrics, per-column health, the top
+# values of categorical columns, histogram bins of numeric columns and row counts
+# over time. The Dashboard only reads the finished `DatasetSummary` (a few small
+# frames), so rendering it never scans the dataset. The work goes through the
+# shared per-dataset caches (profile stats, null bitmaps, time indexes), so the
+# View and chart pages later find those already built. On-disk (DuckDB) datasets
+# are summarized with SQL over the full table; timelines are skipped for them.
+
+SUMMARY_KEY = "summary"
+MAX_SUMMARY_COLUMNS = 50     # columns given top values / histograms (in column order)
+TOP_VALUES = 10
+MAX_TIMELINE_POINTS = 400
+TIMELINE_FREQS = (("D", "day"), ("W", "week"), ("MS", "month"), ("QS", "quarter"), ("YS", "year"))
+CATEGORY_CHART_MAX_UNIQUE = 30
+MAX_AUTO_CHARTS = 4
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="dv-summary")
+
+
+class DatasetSummary:
+    """Precomputed Dashboard content for one dataset (small frames only)."""
+
+    def __init__(self, *, n_rows: int, n_cols: int, memory_bytes: int, on_disk: bool, duplicated: int,
+                 health: pd.DataFrame, numeric: pd.DataFrame, top_values: dict, histograms: dict,
+                 timelines: dict, seconds: float):
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.memory_bytes = memory_bytes
+        self.on_disk = on_disk
+        self.duplicated = duplicated
+        self.health = health              # column, kind, dtype, missing, missing_pct, unique, status
+        self.numeric = numeric            # describe-like stats of numeric columns
+        self.top_values = top_values      # col -> [col, count, percent] (missing included)
+        self.histograms = histograms      # col -> [bin_start, bin_end, count]
+        self.timelines = timelines        # col -> ([period, rows], unit)
+        self.seconds = seconds
+
+    @property
+    def total_missing(self) -> int:
+        return int(self.health["missing"].sum())
+
+    def auto_charts(self) -> list[tuple[str, Hashable]]:
+        """(kind, column) of the charts worth showing: a timeline, low-cardinality bars, histograms."""
+        h = self.health.set_index("column")
+        usable = h[(h["status"] != "empty") & (h["status"] != "constant")]
+        charts: list[tuple[str, Hashable]] = [("timeline", c) for c in list(self.timelines)[:1]]
+        cats = [c for c in self.top_values if c in usable.index and usable.at[c, "unique"] <= CATEGORY_CHART_MAX_UNIQUE]
+        nums = [c for c in self.histograms if c in usable.index]
+        by_missing = lambda cols: sorted(cols, key=lambda c: usable.at[c, "missing"])  # stable: column order
+        charts += [("categories", c) for c in by_missing(cats)[:2]]
+        charts += [("histogram", c) for c in by_missing(nums)[:2]]
+        return charts[:MAX_AUTO_CHARTS]
+
+
+def _kind(s: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(s):
+        return "Boolean"
+    if pd.api.types.is_numeric_dtype(s):
+        return "Numeric"
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return "Datetime"
+    return "Categorical"
+
+
+def _health(dtypes: pd.Series, kinds: dict, nulls: pd.Series, unique: pd.Series, n_rows: int) -> pd.DataFrame:
+    health = pd.DataFrame({
+        "column": list(dtypes.index),
+        "kind": [kinds[c] for c in dtypes.index],
+        "dtype": dtypes.astype(str).to_numpy(),
+        "missing": nulls.reindex(dtypes.index).fillna(0).astype("int64").to_numpy(),
+        "unique": unique.reindex(dtypes.index).fillna(0).astype("int64").to_numpy(),
+    })
+    health["missing_pct"] = (health["missing"] / max(n_rows, 1) * 100).round(2)
+    health["status"] = np.select(
+        [health["missing"] >= n_rows, health["unique"] <= 1, health["missing_pct"] > 50,
+         (health["unique"] == n_rows) & (health["kind"] == "Categorical")],
+        ["empty", "constant", "mostly missing", "unique id"],
+        default="ok",
+    )
+    return health[["column", "kind", "dtype", "missing", "missing_pct", "unique", "status"]]
+
+
+def _timeline(df: pd.DataFrame, col: Hashable) -> tuple[pd.DataFrame, str] | None:
+    """Rows per period of a datetime column, at the finest period giving at most MAX_TIMELINE_POINTS."""
+    index = time_index(df, col)
+    bounds = index.bounds()
+    if bounds is None or bounds[0] == bounds[1]:
+        return None
+    for freq, unit in TIMELINE_FREQS:
+        if len(pd.date_range(bounds[0], bounds[1], freq=freq)) <= MAX_TIMELINE_POINTS:
+            break
+    rows = pd.Series(1, index=index.values).resample(freq).size()
+    return rows.rename_axis("period").reset_index(name="rows"), unit
+
+
+def _build(df: pd.DataFrame, backend=None) -> DatasetSummary:
+    t0 = time.perf_counter()
+    cols = list(df.columns)
+    kinds = {c: _kind(df[c]) for c in cols}
+    wide = cols[:MAX_SUMMARY_COLUMNS]
+    num_cols = [c for c in cols if kinds[c] == "Numeric"]
+    top_values, histograms, timelines = {}, {}, {}
+
+    if backend is not None:
+        n_rows, nulls, unique = backend.n_rows, backend.null_counts(), backend.nunique()
+        duplicated = backend.duplicated_count()
+        numeric = backend.describe_numeric(num_cols) if num_cols else pd.DataFrame()
+        memory = backend.disk_bytes()
+        for c in wide:
+            if kinds[c] in ("Categorical", "Boolean"):
+                top_values[c] = with_percent(backend.value_counts(c, dropna=False)).head(TOP_VALUES)
+            elif kinds[c] == "Numeric" and backend.is_numeric(c) and unique.get(c, 0) > 1:
+                histograms[c] = backend.histogram(c, default_bins(int(unique[c])))
+    else:
+        profile = dataset_profile(df)
+        n_rows, nulls, unique = len(df), profile.null_counts(), profile.nunique()
+        duplicated = profile.duplicated_count()
+        numeric = profile.describe_numeric(df, num_cols) if num_cols else pd.DataFrame()
+        memory = int(df.memory_usage(deep=True).sum())
+        for c in wide:
+            if kinds[c] in ("Categorical", "Boolean"):
+                counts = df[c].value_counts(dropna=False).head(TOP_VALUES)
+                top = counts.rename_axis(c).reset_index(name="count")
+                top["percent"] = (top["count"] / max(n_rows, 1) * 100).round(2)
+                top_values[c] = top
+            elif kinds[c] == "Numeric" and unique.get(c, 0) > 1:
+                histograms[c] = histogram_bins(df[c], default_bins(int(unique[c])))
+            elif kinds[c] == "Datetime":
+                line = _timeline(df, c)
+                if line is not None:
+                    timelines[c] = line
+
+    return DatasetSummary(
+        n_rows=int(n_rows), n_cols=len(cols), memory_bytes=int(memory), on_disk=backend is not None,
+        duplicated=int(duplicated), health=_health(df.dtypes, kinds, nulls, unique, int(n_rows)),
+        numeric=numeric, top_values=top_values, histograms=histograms, timelines=timelines,
+        seconds=round(time.perf_counter() - t0, 3),
+    )
+
+
+def _materialize(ref: weakref.ref, backend) -> DatasetSummary:
+    df = ref()
+    if df is None:
+        raise RuntimeError("Dataset is no longer available.")
+    try:
+        with timer("materialize summary", rows=len(df)):
+            return _build(df, backend)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    del df  # the stored exception must not keep the dataset alive
+    raise RuntimeError(f"Could not summarize the dataset ({error}).")
+
+
+def materialize_summary(df: pd.DataFrame, backend=None) -> Future:
+    """Start (once per dataset) computing its summary in the background; returns its future."""
+    return dataset_cache(df).get(SUMMARY_KEY, lambda: _executor.submit(_materialize, weakref.ref(df), backend))
+
+
+def dataset_summary(df: pd.DataFrame, backend=None) -> DatasetSummary | None:
+    """
+    The materialized summary of `df`, or None while it is still being computed
+    (never blocks). Raises the error of a failed summary, which is dropped from
+    the dataset's cache so the next call starts over.
+    """
+    future = materialize_summary(df, backend)
+    if not future.done():
+        return None
+    if future.exception() is not None:
+        cache = dataset_cache(df)
+        if any(key == SUMMARY_KEY and value is future for key, value, _ in cache.entries()):
+            cache.pop(SUMMARY_KEY)
+    return future.result()
@@ -0,0 +1,115 @@
+# utils/time_index.py
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from utils.column_access import parsed_datetime
+from utils.dataset_cache import dataset_cache
+from utils.perf import timer
+
+# Sorted datetime indexes for time-range slicing.
+#
+# The sort permutation of a datetime column (missing values excluded) is
+# computed once per dataset; a time window is then two binary searches
+# (`searchsorted`, O(log n)) and a slice of that permutation, and its rows come
+# out already in time order, so downstream resampling and filling can skip
+# their sorts. Window frames are memoized per (column, start, end), so reruns
+# with the same window reuse one frame object and every per-dataset cache on it.
+
+MAX_CACHED_WINDOWS = 4
+
+
+class TimeIndex:
+    """Time-ordered row positions and sorted values of one datetime column."""
+
+    def __init__(self, values: pd.Series):
+        valid = np.flatnonzero(values.notna().to_numpy())
+        order = np.argsort(values.to_numpy()[valid], kind="stable")
+        self.positions = valid[order]                      # row positions in time order
+        self.values = pd.DatetimeIndex(values.iloc[self.positions])
+        self._lock = threading.Lock()
+        self._windows: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def bounds(self) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+        """Earliest and latest time, or None if the column has no values."""
+        return (self.values[0], self.values[-1]) if len(self) else None
+
+    def _slice(self, start: Any = None, end: Any = None) -> slice:
+        tz = self.values.tz
+        i = 0 if start is None else self.values.searchsorted(_localize(start, tz), side="left")
+        j = len(self) if end is None else self.values.searchsorted(_localize(end, tz), side="right")
+        return slice(int(i), int(j))
+
+    def window(self, start: Any = None, end: Any = None) -> np.ndarray:
+        """Positions of the rows with `start <= time <= end` (inclusive, None = open), in time order."""
+        return self.positions[self._slice(start, end)]
+
+    def window_frame(self, df: pd.DataFrame, start: Any = None, end: Any = None) -> pd.DataFrame:
+        """Rows of `df` in the window, in time order (memoized per window)."""
+        window = self._slice(start, end)
+        key = (window.start, window.stop)
+        with self._lock:
+            if key in self._windows:
+                self._windows.move_to_end(key)
+                return self._windows[key]
+        with timer("time window", rows=window.stop - window.start):
+            frame = df.iloc[self.positions[window]]
+        with self._lock:
+            frame = self._windows.setdefault(key, frame)
+            while len(self._windows) > MAX_CACHED_WINDOWS:
+                self._windows.popitem(last=False)
+        return frame
+
+
+def _localize(value: Any, tz) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    if tz is not None and ts.tzinfo is None:
+        return ts.tz_localize(tz)
+    if tz is None and ts.tzinfo is not None:
+        return ts.tz_convert(None)
+    return ts
+
+
+def time_index(df: pd.DataFrame, column: str) -> TimeIndex:
+    """Sorted index of `df[column]` (parsed as datetime), built once per dataset."""
+    def build():
+        values = parsed_datetime(df, column)
+        with timer("time index", rows=len(values)):
+            return TimeIndex(values)
+    return dataset_cache(df).get(("time_index", column), build)
+
+
+def time_window(df: pd.DataFrame, column: str, start: Any = None, end: Any = None) -> pd.DataFrame:
+    """Rows of `df` whose `column` falls in [start, end], in time order (missing times excluded)."""
+    return time_index(df, column).window_frame(df, start, end)
+
+
+# -------- Streamlit UI --------
+def time_range_slider(df: pd.DataFrame, column: str, *, key: str, label: str = "Time range") -> tuple | None:
+    """
+    A range slider over the span of `column`; returns (start, end) when narrowed,
+    None when it covers the whole span (or the column has no values).
+    """
+    import streamlit as st
+
+    bounds = time_index(df, column).bounds()
+    if bounds is None or bounds[0] == bounds[1]:
+        return None
+    lo, hi = (b.tz_localize(None).to_pydatetime() for b in bounds)
+    # keep the selection while the span is unchanged; reset it when the column or data changes
+    span_key = f"{key}_span"
+    if st.session_state.get(span_key) != (column, lo, hi):
+        st.session_state[span_key] = (column, lo, hi)
+        st.session_state.pop(key, None)
+    start, end = st.slider(label, min_value=lo, max_value=hi, value=(lo, hi), key=key, format="YYYY-MM-DD HH:mm")
+    if (start, end) == (lo, hi):
+        return None
+    return start, end
@@ -1,8 +1,25 @@
 # utils/visual_components.py
 from __future__ import annotations
+import logging
 import streamlit as st
+from packaging.version import Version
 from typing import Optional
 from utils.image_export import altair_to_png
+from utils.chart_data import altair_chart_spec
+from utils.perf import timer
+
+logger = logging.getLogger(__name__)
+
+# st.download_button takes a callable `data` (rendered on click) from Streamlit 1.52
+DEFERRED_DOWNLOADS = Version(st.__version__) >= Version("1.52.0")
+EXPORT_ERRORS_KEY = "png_export_errors"
+
+def render_altair_chart(chart, *, use_container_width: bool = True):
+    """st.altair_chart replacement: data goes out as cached, hash-named Arrow datasets."""
+    with timer("chart spec"):
+        spec = altair_chart_spec(chart, dataset_format="arrow", default_theme=False)
+    with timer("chart send"):
+        return st.vega_lite_chart(spec=spec, use_container_width=use_container_width)
 
 def export_controls_altair_png(chart, *, key_suffix: str, default_scale: float = 2.0):
     c1, c2 = st.columns([1, 1])
@@ -18,20 +35,40 @@ def export_controls_altair_png(chart, *, key_suffix: str, default_scale: float =
         st.info("No chart to export.")
         return
 
-    try:
-        data = altair_to_png(
+    def render_png() -> bytes:
+        return altair_to_png(
             chart,
             scale=float(scale),
             width=int(w) if w > 0 else None,
             height=int(h) if h > 0 else None,
             background=None if bg == "transparent" else bg,
         )
-        st.download_button(
-            "⬇️ Download PNG",
-            data=data,
-            file_name=f"visual_{key_suffix}.png",
-            mime="image/png",
-            key=f"dl_png_{key_suffix}",
-        )
-    except Exception as e:
-        st.exception(e)
+
+    # A failed click-time render (on a server thread, the download just fails) is shown on the next rerun
+    errors = st.session_state.setdefault(EXPORT_ERRORS_KEY, {})
+    if key_suffix in errors:
+        st.exception(errors.pop(key_suffix))
+
+    if DEFERRED_DOWNLOADS:
+        # Rendered when the button is clicked: no PNG bytes are held per chart between reruns
+        def data():
+            try:
+                return render_png()
+            except Exception as e:
+                logger.exception("PNG export failed")
+                errors[key_suffix] = e
+                raise
+    else:
+        try:
+            data = render_png()
+        except Exception as e:
+            st.exception(e)
+            return
+
+    st.download_button(
+        "⬇️ Download PNG",
+        data=data,
+        file_name=f"visual_{key_suffix}.png",
+        mime="image/png",
+        key=f"dl_png_{key_suffix}",
+    )